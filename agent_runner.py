@@ -0,0 +1,107 @@
+import sys
+import json
+import asyncio
+import argparse
+import traceback
+from dotenv import load_dotenv
+from logger import client_logger
+from llm_backend import make_backend
+from session_pool import SessionPool, make_server_params
+from talk2mcp import run_agent, fetch_server_metrics, METRICS_FILE
+import metrics
+
+load_dotenv()
+
+
+def read_queries(source):
+    """Read one query per line from a file path or '-' for stdin.
+    Lines may also be JSON objects with a "query" key."""
+    f = sys.stdin if source == "-" else open(source, encoding="utf-8")
+    try:
+        queries = []
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                line = json.loads(line)["query"]
+            queries.append(line)
+        return queries
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+class AgentRunner:
+    """Runs a batch of queries concurrently over a pool of MCP server processes"""
+
+    def __init__(self, backend, pool_size=4, server_command="python", server_args=None, pool=None):
+        self.backend = backend
+        # Pass an already started pool to keep sessions warm across batches
+        self.pool = pool or SessionPool(
+            size=pool_size,
+            server_params=make_server_params(server_command, server_args)
+        )
+        self.owns_pool = pool is None
+
+    async def _run_one(self, run_id, query):
+        try:
+            # Borrow a session for the whole run, the pool takes it back afterwards
+            async with self.pool.session() as pooled:
+                return await run_agent(pooled.session, pooled.registry, query,
+                                       self.backend.fork(), run_id=run_id)
+        except Exception as e:
+            client_logger.info("[run %s] Failed: %s", run_id, e)
+            traceback.print_exc()
+            return {"run_id": run_id, "query": query, "status": "failed", "error": str(e)}
+
+    async def dump_metrics(self, path):
+        """Client metrics plus the metrics of every server process in the pool"""
+        sections = [("client", metrics.render())]
+        for slot, pooled in sorted(self.pool.slots.items()):
+            try:
+                sections.append((f"server session {slot}", await fetch_server_metrics(pooled.session)))
+            except Exception as e:
+                client_logger.info("Could not read metrics of session %s: %s", slot, e)
+        metrics.dump(path, sections)
+        client_logger.info("Metrics written to %s", path)
+
+    async def run(self, queries, output=None, metrics_file=None):
+        """Run all queries and write one JSON line per result in query order"""
+        if self.owns_pool:
+            client_logger.info("Starting %s MCP sessions...", self.pool.size)
+            await self.pool.start()
+        try:
+            runs = await asyncio.gather(*(self._run_one(i, q) for i, q in enumerate(queries)))
+            if metrics_file:
+                await self.dump_metrics(metrics_file)
+        finally:
+            if self.owns_pool:
+                await self.pool.close()
+        client_logger.info("Session pool stats: %s", self.pool.stats())
+
+        results = [r if isinstance(r, dict) else r.to_dict() for r in runs]
+        if output:
+            out = sys.stdout if output == "-" else open(output, "w", encoding="utf-8")
+            try:
+                for result in results:
+                    out.write(json.dumps(result, default=str) + "\n")
+            finally:
+                if out is not sys.stdout:
+                    out.close()
+        return results
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Run many agent queries concurrently")
+    parser.add_argument("queries", help="file with one query per line, or - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="JSONL results file, - for stdout")
+    parser.add_argument("-p", "--pool-size", type=int, default=4, help="number of MCP server processes")
+    parser.add_argument("-m", "--metrics", default=METRICS_FILE, help="file for client and server metrics")
+    args = parser.parse_args()
+
+    runner = AgentRunner(make_backend(), pool_size=args.pool_size)
+    await runner.run(read_queries(args.queries), output=args.output, metrics_file=args.metrics)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,168 @@
+import base64
+import numpy as np
+
+# One tool call may replace hundreds of scalar calls, but not unbounded work
+MAX_ELEMENTS = 1_000_000
+# Results with more elements than this are returned base64 encoded
+INLINE_LIMIT = 1_000
+
+BINARY_OPS = {
+    "add": np.add,
+    "subtract": np.subtract,
+    "multiply": np.multiply,
+    "divide": np.true_divide,
+    "power": np.power,
+    "remainder": np.remainder,
+    "minimum": np.minimum,
+    "maximum": np.maximum,
+}
+
+UNARY_OPS = {
+    "sqrt": np.sqrt,
+    "cbrt": np.cbrt,
+    "log": np.log,
+    "exp": np.exp,
+    "sin": np.sin,
+    "cos": np.cos,
+    "tan": np.tan,
+    "abs": np.abs,
+    "negative": np.negative,
+    "square": np.square,
+}
+
+REDUCTIONS = {
+    "sum": np.sum,
+    "prod": np.prod,
+    "mean": np.mean,
+    "min": np.min,
+    "max": np.max,
+    "std": np.std,
+}
+
+
+def _check_size(size):
+    if size > MAX_ELEMENTS:
+        raise ValueError(f"Array has {size} elements, the limit is {MAX_ELEMENTS}")
+
+
+def decode_array(value):
+    """Accept a number, a (nested) list or {"dtype", "shape", "data": base64} and return an ndarray"""
+    if isinstance(value, dict):
+        dtype = np.dtype(value.get("dtype", "float64"))
+        shape = tuple(value.get("shape", ()))
+        _check_size(int(np.prod(shape)) if shape else 1)
+        raw = base64.b64decode(value["data"])
+        return np.frombuffer(raw, dtype=dtype).reshape(shape)
+    arr = np.asarray(value)
+    _check_size(arr.size)
+    if arr.dtype == object or arr.dtype.kind == "u":
+        # NumPy keeps integers past int64 as uint64 or as Python objects
+        for item in arr.flat:
+            if isinstance(item, (int, np.integer)) and not -2**63 <= int(item) < 2**63:
+                raise ValueError(f"An integer of {int(item).bit_length()} bits is outside the int64 range, pass it as a float")
+    if arr.dtype == object or arr.dtype.kind in "USV":
+        raise ValueError("Arrays must contain only numbers")
+    return arr
+
+
+def encode_array(arr, inline_limit=INLINE_LIMIT):
+    """Small results go back as plain lists, large ones as compact base64"""
+    arr = np.asarray(arr)
+    if arr.ndim == 0:
+        return arr.item()
+    if arr.size <= inline_limit:
+        return arr.tolist()
+    arr = np.ascontiguousarray(arr)
+    return {
+        "dtype": arr.dtype.str,
+        "shape": list(arr.shape),
+        "data": base64.b64encode(arr.tobytes()).decode("ascii"),
+    }
+
+
+def _int_bound(arr):
+    """Largest absolute value in an integer array, as a Python int"""
+    if not arr.size:
+        return 0
+    return max(abs(int(arr.min())), abs(int(arr.max())))
+
+
+def _pow_bound(base, exp):
+    """base ** exp, or 2**63 once it is certainly past int64"""
+    if exp <= 0:
+        return 1
+    if base <= 1:
+        return base
+    if (base.bit_length() - 1) * exp >= 63:
+        return 2**63
+    return base ** exp
+
+
+def _overflows(dtype, bound, low=0):
+    """True when results up to bound in absolute value, or as low as low, do not fit dtype"""
+    info = np.iinfo(dtype)
+    return bound > int(info.max) or low < int(info.min)
+
+
+def _binary_overflows(op, x, y):
+    dtype = np.result_type(x, y)
+    if op == "add":
+        return _overflows(dtype, _int_bound(x) + _int_bound(y), int(x.min()) + int(y.min()))
+    if op == "subtract":
+        return _overflows(dtype, _int_bound(x) + _int_bound(y), int(x.min()) - int(y.max()))
+    if op == "multiply":
+        bound = _int_bound(x) * _int_bound(y)
+        return _overflows(dtype, bound, -bound if dtype.kind == "i" else 0)
+    if op == "power":
+        # Negative integer powers are an error in NumPy, floats give 1 / x**n
+        return y.min() < 0 or _overflows(dtype, _pow_bound(_int_bound(x), int(y.max())), int(x.min()))
+    return False
+
+
+def _is_int(arr):
+    return arr.dtype.kind in "iu"
+
+
+def _lookup(table, op):
+    if op not in table:
+        raise ValueError(f"Unknown operation '{op}', choose one of {sorted(table)}")
+    return table[op]
+
+
+def batch_apply(op, a, b):
+    """Elementwise binary operation with NumPy broadcasting"""
+    func = _lookup(BINARY_OPS, op)
+    x, y = decode_array(a), decode_array(b)
+    _check_size(int(np.prod(np.broadcast_shapes(x.shape, y.shape))))
+    if _is_int(x) and _is_int(y) and x.size and y.size and _binary_overflows(op, x, y):
+        # Integer results wrap around silently in int64, use float64 when they could
+        x = x.astype(np.float64)
+    with np.errstate(all="ignore"):
+        return encode_array(func(x, y))
+
+
+def batch_unary(op, a):
+    """Elementwise unary operation"""
+    func = _lookup(UNARY_OPS, op)
+    x = decode_array(a)
+    if op in ("square", "abs", "negative") and _is_int(x) and x.size:
+        bound = _int_bound(x)
+        if op == "square":
+            bound = bound * bound
+        if _overflows(x.dtype, bound, -bound if op == "negative" else 0):
+            x = x.astype(np.float64)
+    with np.errstate(all="ignore"):
+        return encode_array(func(x))
+
+
+def batch_reduce(op, a, axis=None):
+    """Reduce an array to a scalar, or along one axis"""
+    func = _lookup(REDUCTIONS, op)
+    x = decode_array(a)
+    if op in ("sum", "prod") and _is_int(x) and x.size:
+        count = x.size if axis is None else x.shape[axis]
+        bound = _int_bound(x) * count if op == "sum" else _pow_bound(_int_bound(x), count)
+        # NumPy sums and multiplies small integer types in int64 or uint64
+        if _overflows(np.int64 if x.dtype.kind == "i" else np.uint64, bound, -bound if x.min() < 0 else 0):
+            x = x.astype(np.float64)
+    return encode_array(func(x, axis=axis))
@@ -0,0 +1,337 @@
+import io
+import os
+import sys
+import inspect
+import threading
+from abc import ABC, abstractmethod
+from logger import mcp_server_logger
+from ui_wait import wait_until, pixels_changed
+
+# Where add_text_in_paint writes, just inside the default 607, 425 rectangle
+TEXT_POSITION = (627, 435)
+
+# Op arguments that must be integers, the ones that must be positive, and colors
+COORD_ARGS = {"x1", "y1", "x2", "y2", "x", "y"}
+SIZE_ARGS = {"width", "size"}
+COLOR_ARGS = {"color", "fill"}
+
+
+def check_arg(name, value):
+    """Raise ValueError if an op argument cannot be drawn, so a batch fails before its first op"""
+    if value is None:
+        return
+    if name in COORD_ARGS | SIZE_ARGS:
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise ValueError(f"{name} must be an integer, got {value!r}")
+        if name in SIZE_ARGS and value < 1:
+            raise ValueError(f"{name} must be at least 1, got {value}")
+    elif name in COLOR_ARGS:
+        from PIL import ImageColor
+        if isinstance(value, str):
+            ImageColor.getrgb(value)
+        elif not (isinstance(value, (list, tuple)) and len(value) in (3, 4)
+                  and all(isinstance(c, int) and 0 <= c <= 255 for c in value)):
+            raise ValueError(f"{name} must be a color name, #rrggbb or [r, g, b], got {value!r}")
+    elif name == "text" and not isinstance(value, (str, int, float)):
+        raise ValueError(f"text must be a string, got {value!r}")
+
+
+class CanvasBackend(ABC):
+    """Something the Paint tools can draw on"""
+
+    name = "base"
+    # Ops of apply() this backend can draw
+    supported_ops = ("rect", "text", "line", "fill")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+
+    @abstractmethod
+    def open(self):
+        ...
+
+    @abstractmethod
+    def is_open(self):
+        ...
+
+    @abstractmethod
+    def rectangle(self, x1, y1, x2, y2, color="black", width=2, fill=None):
+        ...
+
+    @abstractmethod
+    def text(self, text, x=None, y=None, color="black", size=24):
+        ...
+
+    @abstractmethod
+    def line(self, x1, y1, x2, y2, color="black", width=2):
+        ...
+
+    @abstractmethod
+    def fill(self, color, x=None, y=None):
+        ...
+
+    def snapshot(self):
+        """PNG bytes of the current canvas, or None if the backend cannot capture it"""
+        return None
+
+    def apply(self, ops):
+        """Run a list of drawing ops, e.g. {"op": "rect", "x1": 1, "y1": 2, "x2": 3, "y2": 4}.
+        Every op's arguments and values are checked first, so an invalid op leaves the canvas untouched."""
+        handlers = {"rect": self.rectangle, "text": self.text, "line": self.line, "fill": self.fill}
+        calls = []
+        for i, op in enumerate(ops):
+            args = dict(op)
+            kind = args.pop("op", None)
+            if kind not in handlers:
+                raise ValueError(f"Op {i}: unknown op {kind!r}, use one of {sorted(handlers)}")
+            if kind not in self.supported_ops:
+                raise ValueError(f"Op {i}: operation {kind} is not supported by the {self.name} backend")
+            try:
+                inspect.signature(handlers[kind]).bind(**args)
+                for name, value in args.items():
+                    check_arg(name, value)
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"Op {i} ({kind}): {e}") from None
+            calls.append((handlers[kind], args))
+        with self.lock:
+            self._draw(calls)
+        return len(ops)
+
+    def _draw(self, calls):
+        for handler, args in calls:
+            handler(**args)
+
+
+class PillowCanvas(CanvasBackend):
+    """In-memory canvas, renders in milliseconds and works on headless servers"""
+
+    name = "pillow"
+
+    def __init__(self, width=1280, height=720, background="white"):
+        super().__init__()
+        self.size = (width, height)
+        self.background = background
+        self.image = None
+        self.draw = None
+
+    def open(self):
+        from PIL import Image as PILImage, ImageDraw
+        self.image = PILImage.new("RGB", self.size, self.background)
+        self.draw = ImageDraw.Draw(self.image)
+
+    def is_open(self):
+        return self.image is not None
+
+    def rectangle(self, x1, y1, x2, y2, color="black", width=2, fill=None):
+        self.draw.rectangle([min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)],
+                            outline=self._rgb(color), width=width, fill=self._rgb(fill))
+
+    def text(self, text, x=None, y=None, color="black", size=24):
+        from PIL import ImageFont
+        if x is None or y is None:
+            x, y = TEXT_POSITION
+        try:
+            font = ImageFont.load_default(size=size)
+        except TypeError:
+            # Pillow < 10.1 has no sized default font
+            font = ImageFont.load_default()
+        self.draw.text((x, y), str(text), fill=self._rgb(color), font=font)
+
+    def line(self, x1, y1, x2, y2, color="black", width=2):
+        self.draw.line([x1, y1, x2, y2], fill=self._rgb(color), width=width)
+
+    def fill(self, color, x=None, y=None):
+        if x is None or y is None:
+            self.draw.rectangle([0, 0, self.size[0], self.size[1]], fill=self._rgb(color))
+        else:
+            from PIL import ImageDraw
+            ImageDraw.floodfill(self.image, (x, y), self._rgb(color))
+
+    def _draw(self, calls):
+        # Draw on a copy and keep it only if every op succeeded
+        from PIL import ImageDraw
+        image, draw = self.image, self.draw
+        self.image = image.copy()
+        self.draw = ImageDraw.Draw(self.image)
+        try:
+            super()._draw(calls)
+        except BaseException:
+            self.image, self.draw = image, draw
+            raise
+
+    def _rgb(self, color):
+        # JSON sends colors as lists, Pillow takes names or tuples
+        from PIL import ImageColor
+        if color is None:
+            return None
+        return ImageColor.getrgb(color) if isinstance(color, str) else tuple(color)
+
+    def snapshot(self):
+        buffer = io.BytesIO()
+        self.image.save(buffer, format="PNG")
+        return buffer.getvalue()
+
+
+class PywinautoDriver:
+    """Starts and positions the real mspaint.exe window and reads its UI state"""
+
+    # Ribbon items of the tools the canvas selects, by their UI Automation names
+    TOOL_NAMES = {"rectangle": "Rectangle", "text": "Text"}
+
+    def start(self):
+        from pywinauto.application import Application
+        self.app = Application().start('mspaint.exe')
+        return self.app
+
+    def tool_selected(self, paint_window, tool):
+        """True once the ribbon shows tool as the selected one (gallery item selected or button toggled on)"""
+        from pywinauto import Desktop
+        ribbon = Desktop(backend="uia").window(handle=paint_window.handle)
+        item = ribbon.child_window(title=self.TOOL_NAMES[tool], found_index=0).wrapper_object()
+        if hasattr(item, "is_selected"):
+            return item.is_selected()
+        return item.get_toggle_state() == 1
+
+    def input_idle(self, paint_window):
+        """True once Paint's UI thread answers a message sent now, so it is back in its message loop.
+        WaitForInputIdle cannot be used, it only reports the first idle after the process started."""
+        import pywintypes
+        import win32con
+        import win32gui
+        try:
+            win32gui.SendMessageTimeout(paint_window.handle, win32con.WM_NULL, 0, 0,
+                                        win32con.SMTO_ABORTIFHUNG, 100)
+        except pywintypes.error:
+            # Timed out or hung, still busy with the input
+            return False
+        return True
+
+    def place_window(self, paint_window):
+        import win32gui
+        import win32con
+
+        # Get primary monitor width
+        # primary_width = GetSystemMetrics(0)
+        primary_width = 0
+
+        # First move to secondary monitor without specifying size
+        win32gui.SetWindowPos(
+            paint_window.handle,
+            win32con.HWND_TOP,
+            primary_width + 1, 0,  # Position it on secondary monitor
+            0, 0,  # Let Windows handle the size
+            win32con.SWP_NOSIZE  # Don't change the size
+        )
+
+        # Now maximize the window
+        win32gui.ShowWindow(paint_window.handle, win32con.SW_MAXIMIZE)
+
+
+class MSPaintCanvas(CanvasBackend):
+    """Drives Microsoft Paint through pywinauto, coordinates are hardcoded for the author's screen.
+    Every step waits for the window state or canvas pixels to change instead of sleeping.
+    Paint keeps its own color, width and font size, so rectangle and text take no such arguments."""
+
+    name = "mspaint"
+    supported_ops = ("rect", "text")
+
+    def __init__(self, driver=None, timeout=10.0):
+        super().__init__()
+        self.driver = driver or PywinautoDriver()
+        self.timeout = timeout
+        self.app = None
+
+    def open(self):
+        self.app = self.driver.start()
+
+        # Get the Paint window
+        paint_window = self.app.window(class_name='MSPaintApp')
+        wait_until(lambda: paint_window.exists() and paint_window.is_visible(),
+                   "window_ready", timeout=self.timeout)
+
+        self.driver.place_window(paint_window)
+        wait_until(paint_window.is_maximized, "window_maximized", timeout=self.timeout)
+
+    def is_open(self):
+        return self.app is not None
+
+    def _focused_window(self):
+        paint_window = self.app.window(class_name='MSPaintApp')
+
+        # Ensure Paint window is active
+        if not paint_window.has_focus():
+            paint_window.set_focus()
+            wait_until(paint_window.has_focus, "focus", timeout=self.timeout)
+        return paint_window
+
+    def _canvas(self, paint_window):
+        canvas = paint_window.child_window(class_name='MSPaintView')
+        wait_until(canvas.exists, "canvas_ready", timeout=self.timeout)
+        return canvas
+
+    def _wait_redraw(self, canvas, before, step):
+        wait_until(pixels_changed(canvas.capture_as_image, before), step, timeout=self.timeout)
+
+    def rectangle(self, x1, y1, x2, y2):
+        paint_window = self._focused_window()
+
+        # Click on the Rectangle tool using the correct coordinates for secondary screen
+        paint_window.click_input(coords=(661, 102))
+        wait_until(lambda: self.driver.tool_selected(paint_window, "rectangle"), "rectangle_tool",
+                   timeout=self.timeout)
+
+        # Get the canvas area
+        canvas = self._canvas(paint_window)
+        before = canvas.capture_as_image().tobytes()
+
+        # Use relative coordinates within canvas
+        canvas.press_mouse_input(coords=(x1, y1))
+        canvas.move_mouse_input(coords=(x2, y2))
+        canvas.release_mouse_input(coords=(x2, y2))
+        self._wait_redraw(canvas, before, "rectangle_drawn")
+
+    def text(self, text, x=None, y=None):
+        if x is None or y is None:
+            x, y = TEXT_POSITION
+        paint_window = self._focused_window()
+        canvas = self._canvas(paint_window)
+
+        # Select text tool using keyboard shortcuts, the second key only counts once Paint took the first
+        paint_window.type_keys('t')
+        wait_until(lambda: self.driver.input_idle(paint_window), "shortcut_key", timeout=self.timeout)
+        paint_window.type_keys('x')
+        wait_until(lambda: self.driver.tool_selected(paint_window, "text"), "text_tool", timeout=self.timeout)
+
+        # Click where to start typing, the text box border shows up once it is ready
+        before = canvas.capture_as_image().tobytes()
+        canvas.click_input(coords=(x, y))
+        self._wait_redraw(canvas, before, "text_box_open")
+
+        # Type the text passed from client
+        before = canvas.capture_as_image().tobytes()
+        paint_window.type_keys(text)
+        self._wait_redraw(canvas, before, "text_typed")
+
+        # Click to exit text mode, the text box border disappears
+        before = canvas.capture_as_image().tobytes()
+        canvas.click_input(coords=(x + 200, y))
+        self._wait_redraw(canvas, before, "text_committed")
+
+    def line(self, x1, y1, x2, y2, color="black", width=2):
+        raise ValueError("operation line is not supported by the mspaint backend")
+
+    def fill(self, color, x=None, y=None):
+        raise ValueError("operation fill is not supported by the mspaint backend")
+
+
+def make_canvas():
+    """CANVAS_BACKEND=mspaint|mspaint-sim|pillow, mspaint by default on Windows and pillow elsewhere"""
+    kind = os.getenv("CANVAS_BACKEND", "mspaint" if sys.platform == "win32" else "pillow")
+    mcp_server_logger.info("Using %s canvas backend", kind)
+    if kind == "mspaint":
+        return MSPaintCanvas()
+    if kind == "mspaint-sim":
+        # Same UI automation steps against a simulated Paint window
+        from paint_sim import SimulatedPaintDriver
+        return MSPaintCanvas(driver=SimulatedPaintDriver())
+    return PillowCanvas()
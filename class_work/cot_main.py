@@ -1,43 +1,31 @@
-import os
 from dotenv import load_dotenv
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
-from google import genai
 import asyncio
 from rich.console import Console
 from rich.panel import Panel
 from logger import mcp_server_logger, client_logger
+from llm_backend import make_backend
+from json_extract import loads_lenient
 console = Console()
 
-# Load environment variables and setup Gemini
+# Load environment variables and setup the LLM backend
 load_dotenv()
-api_key = os.getenv("GEMINI_API_KEY")
-client = genai.Client(api_key=api_key)
+backend = make_backend()
 
-async def generate_with_timeout(client, prompt, timeout=10):
-    """Generate content with a timeout"""
+async def generate_with_timeout(backend, prompt):
+    """Generate content, the backend's limiter times the call out after LLM_TIMEOUT once it has a slot"""
     try:
-        loop = asyncio.get_event_loop()
-        response = await asyncio.wait_for(
-            loop.run_in_executor(
-                None, 
-                lambda: client.models.generate_content(
-                    model="gemini-2.0-flash",
-                    contents=prompt
-                )
-            ),
-            timeout=timeout
-        )
-        return response
+        return await backend.generate(prompt)
     except Exception as e:
         console.print(f"[red]Error: {e}[/red]")
         return None
 
-async def get_llm_response(client, prompt):
+async def get_llm_response(backend, prompt):
     """Get response from LLM with timeout"""
-    response = await generate_with_timeout(client, prompt)
-    if response and response.text:
-        return response.text.strip()
+    response = await generate_with_timeout(backend, prompt)
+    if response:
+        return response.strip()
     return None
 
 async def main():
@@ -87,33 +75,39 @@ Assistant: FINAL_ANSWER: [20]"""
                 conversation_history = []
                 count = 1
                 while True:
-                    response = await generate_with_timeout(client, prompt)
-                    if not response or not response.text:
+                    response = await generate_with_timeout(backend, prompt)
+                    if not response:
                         break
 
-                    result = response.text.strip()
+                    result = response.strip()
                     console.print(f"response {count} - {result}")
 
                     console.print(f"\n[yellow]Assistant:[/yellow] {count} {result}")
 
                     if result.startswith("FUNCTION_CALL:"):
                         _, function_info = result.split(":", 1)
-                        parts = [p.strip() for p in function_info.split("|")]
-                        func_name = parts[0]
-                        
+                        # Only split off the name, the steps list may contain '|' itself
+                        func_name, _, rest = (p.strip() for p in function_info.partition("|"))
+
                         if func_name == "show_reasoning":
-                            steps = eval(parts[1])
+                            try:
+                                steps = loads_lenient(rest)
+                            except ValueError as e:
+                                console.print(f"[red]Could not parse reasoning steps: {e}[/red]")
+                                prompt += "\nUser: The steps must be a JSON list of strings, try again."
+                                count += 1
+                                continue
                             await session.call_tool("show_reasoning", arguments={"steps": steps})
                             console.print(f"call funct {count} - {func_name}")
                             prompt += f"\nUser: Next step?"
                             
                         elif func_name == "calculate":
-                            expression = parts[1]
+                            expression = rest
                             calc_result = await session.call_tool("calculate", arguments={"expression": expression})
                             console.print(f"call funct {count} - {func_name}")
                             if calc_result.content:
                                 value = calc_result.content[0].text
-                                client_logger.info(f"Calculated {expression} = {value}")
+                                client_logger.info("Calculated %s = %s", expression, value)
                                 prompt += f"\nUser: Result is {value}. Let's verify this step."
                                 if value is not None:
                                     conversation_history.append((expression, float(value)))
@@ -122,7 +116,8 @@ Assistant: FINAL_ANSWER: [20]"""
                                 console.print(f"call funct {count} - {func_name}")
                                 
                         elif func_name == "verify":
-                            expression, expected = parts[1], float(parts[2])
+                            expression, _, expected = (p.strip() for p in rest.rpartition("|"))
+                            expected = float(expected)
                             await session.call_tool("verify", arguments={
                                 "expression": expression,
                                 "expected": expected
@@ -146,8 +141,7 @@ Assistant: FINAL_ANSWER: [20]"""
                 console.print("\n[green]Calculation completed![/green]")
 
     except Exception as e:
-        import traceback
-        traceback.mcp_server_logger.info_exc()
+        client_logger.exception("Error in main execution")
         console.print(f"[red]Error: {e}[/red]")
 
 if __name__ == "__main__":
@@ -6,6 +6,12 @@ from rich.table import Table
 from rich import box
 import math
 import re
+import os
+import sys
+
+# safe_eval lives in the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from safe_eval import safe_eval
 
 console = Console()
 mcp = FastMCP("CoTCalculator")
@@ -31,7 +37,7 @@ def calculate(expression: str) -> TextContent:
     console.print("[blue]FUNCTION CALL:[/blue] calculate()")
     console.print(f"[blue]Expression:[/blue] {expression}")
     try:
-        result = eval(expression)
+        result = safe_eval(expression)
         console.print(f"[green]Result:[/green] {result}")
         return TextContent(
             type="text",
@@ -50,7 +56,7 @@ def verify(expression: str, expected: float) -> TextContent:
     console.print("[blue]FUNCTION CALL:[/blue] verify()")
     console.print(f"[blue]Verifying:[/blue] {expression} = {expected}")
     try:
-        actual = float(eval(expression))
+        actual = float(safe_eval(expression))
         is_correct = abs(actual - float(expected)) < 1e-10
         
         if is_correct:
@@ -97,7 +103,7 @@ def check_consistency(steps: list) -> TextContent:
             
             # 1. Basic Calculation Verification
             try:
-                expected = eval(expression)
+                expected = safe_eval(expression)
                 if abs(float(expected) - float(result)) < 1e-10:
                     checks.append("[green]✓ Calculation verified[/green]")
                 else:
@@ -207,7 +213,6 @@ def check_consistency(steps: list) -> TextContent:
         )
 
 if __name__ == "__main__":
-    import sys
     if len(sys.argv) > 1 and sys.argv[1] == "dev":
         mcp.run()
     else:
@@ -0,0 +1,71 @@
+from logger import client_logger
+
+
+def estimate_tokens(text):
+    """Rough token count for a piece of text (~4 characters per token)"""
+    return max(1, len(text) // 4)
+
+
+class ConversationState:
+    """Holds the agent conversation so every tool result is added only once"""
+
+    def __init__(self, system_prompt, query, token_budget=6000, keep_last=4, max_turn_chars=None):
+        # The system prompt and the user query are pinned and always sent
+        self.system_prompt = system_prompt
+        self.query = query
+        self.token_budget = token_budget
+        # Number of most recent turns that are never summarized away
+        self.keep_last = keep_last
+        # Those turns are capped when added, together they take at most half of the budget (~4 chars per token)
+        self.max_turn_chars = max_turn_chars or token_budget * 4 // (2 * keep_last)
+        self.turns = []
+        self.summary = ""
+        self.prompt_sizes = []
+
+    def add_turn(self, text):
+        """Append one iteration result to the history, an oversized one keeps only its head and tail"""
+        self.turns.append(cap_turn(text, self.max_turn_chars))
+        self._enforce_budget()
+
+    def _history_tokens(self):
+        return estimate_tokens(self.summary) + sum(estimate_tokens(t) for t in self.turns)
+
+    def _pinned_tokens(self):
+        return estimate_tokens(self.system_prompt) + estimate_tokens(self.query)
+
+    def _enforce_budget(self):
+        """Fold the oldest turns into a short summary once the token budget is reached"""
+        while (len(self.turns) > self.keep_last
+               and self._pinned_tokens() + self._history_tokens() > self.token_budget):
+            oldest = self.turns.pop(0)
+            # Summary is capped at roughly a quarter of the budget
+            self.summary = summarize_turns(self.summary, oldest, max_summary_chars=self.token_budget)
+            client_logger.info("Token budget reached, summarized turn: %s", oldest[:80])
+
+    def build_prompt(self):
+        """Build the prompt for the next LLM call and record its size"""
+        parts = [self.system_prompt, f"Query: {self.query}"]
+        if self.summary:
+            parts.append(f"Summary of earlier steps: {self.summary}")
+        if self.turns:
+            parts.append("\n".join(self.turns))
+            parts.append("What should I do next?")
+        prompt = "\n\n".join(parts)
+        self.prompt_sizes.append(estimate_tokens(prompt))
+        return prompt
+
+
+def cap_turn(text, max_chars):
+    """text, or its head and tail around a note of how many characters were elided"""
+    if len(text) <= max_chars:
+        return text
+    head = max_chars * 2 // 3
+    tail = max_chars - head
+    return f"{text[:head]} ... {len(text) - head - tail} chars elided ... {text[-tail:]}"
+
+
+def summarize_turns(summary, turn, max_chars=160, max_summary_chars=2000):
+    """Keep only the head of a dropped turn so the summary stays small"""
+    short = turn if len(turn) <= max_chars else turn[:max_chars] + "..."
+    summary = f"{summary} {short}".strip()
+    return summary[-max_summary_chars:]
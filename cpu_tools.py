@@ -0,0 +1,257 @@
+import re
+from mcp.types import TextContent
+from logger import mcp_server_logger
+from safe_eval import safe_eval, check_pow
+from tool_executor import offload
+import batch_math
+import text_pipeline
+import exp_sum
+import sequences
+
+# CPU bound tools, run in the worker processes of tool_executor. Workers import only this module,
+# so it must not set anything up at import time: no canvas, mail queue, cache or MCP server.
+# paint_mcp_server registers them as MCP tools.
+
+
+@offload("cpu", timeout=5)
+def calculate(expression: str) -> TextContent:
+    """Calculate the result of an expression. Integers longer than 4000 digits come back as a digit summary"""
+    mcp_server_logger.info("FUNCTION CALL: calculate()")
+    mcp_server_logger.info("Expression: %s", expression)
+    try:
+        result = safe_eval(expression)
+        # str() refuses ints past 4300 digits, long results come back as a digit summary
+        text = str(sequences.format_big_int(result)) if isinstance(result, int) else str(result)
+        mcp_server_logger.info("Result: %s", text)
+        return TextContent(
+            type="text",
+            text=text
+        )
+    except Exception as e:
+        mcp_server_logger.info("Error: %s", e)
+        return TextContent(
+            type="text",
+            text=f"Error: {str(e)}"
+        )
+
+@offload("cpu", timeout=5)
+def verify(expression: str, expected: float) -> TextContent:
+    """Verify if a calculation is correct"""
+    mcp_server_logger.info("FUNCTION CALL: verify()")
+    mcp_server_logger.info("Verifying: %s = %s", expression, expected)
+    try:
+        actual = float(safe_eval(expression))
+        is_correct = abs(actual - float(expected)) < 1e-10
+        
+        if is_correct:
+            mcp_server_logger.info("✓ Correct! %s = %s", expression, expected)
+        else:
+            mcp_server_logger.info("✗ Incorrect! %s should be %s, got %s", expression, actual, expected)
+            
+        return TextContent(
+            type="text",
+            text=str(is_correct)
+        )
+    except Exception as e:
+        mcp_server_logger.info("Error: %s", e)
+        return TextContent(
+            type="text",
+            text=f"Error: {str(e)}"
+        )
+
+@offload("cpu", timeout=5)
+def check_consistency(steps: list) -> TextContent:
+    """Check if calculation steps are consistent with each other"""
+    mcp_server_logger.info("FUNCTION CALL: check_consistency()")
+    
+    try:
+        # Create a table for step analysis
+        infos = []
+        issues = []
+        warnings = []
+        insights = []
+        previous = None
+        
+        for i, (expression, result) in enumerate(steps, 1):
+            checks = []
+            
+            # 1. Basic Calculation Verification
+            try:
+                expected = safe_eval(expression)
+                if abs(float(expected) - float(result)) < 1e-10:
+                    checks.append("✓ Calculation verified")
+                else:
+                    issues.append(f"Step {i}: Calculation mismatch")
+                    checks.append("✗ Calculation error")
+            except:
+                warnings.append(f"Step {i}: Couldn't verify calculation")
+                checks.append("! Verification failed")
+
+            # 2. Dependency Analysis
+            if previous:
+                prev_expr, prev_result = previous
+                if str(prev_result) in expression:
+                    checks.append("✓ Uses previous result")
+                    insights.append(f"Step {i} builds on step {i-1}")
+                else:
+                    checks.append("○ Independent step")
+
+            # 3. Magnitude Check
+            if previous and result != 0 and previous[1] != 0:
+                ratio = abs(result / previous[1])
+                if ratio > 1000:
+                    warnings.append(f"Step {i}: Large increase ({ratio:.2f}x)")
+                    checks.append("! Large magnitude increase")
+                elif ratio < 0.001:
+                    warnings.append(f"Step {i}: Large decrease ({1/ratio:.2f}x)")
+                    checks.append("! Large magnitude decrease")
+
+            # 4. Pattern Analysis
+            operators = re.findall(r'[\+\-\*\/\(\)]', expression)
+            if '(' in operators and ')' not in operators:
+                warnings.append(f"Step {i}: Mismatched parentheses")
+                checks.append("✗ Invalid parentheses")
+
+            # 5. Result Range Check
+            if abs(result) > 1e6:
+                warnings.append(f"Step {i}: Very large result")
+                checks.append("! Large result")
+            elif abs(result) < 1e-6 and result != 0:
+                warnings.append(f"Step {i}: Very small result")
+                checks.append("! Small result")
+
+            # Add row to table
+            infos.append(
+                f"Step {i}" +
+                expression +
+                f"{result}" +
+                "\n".join(checks)
+            )
+            
+            previous = (expression, result)
+
+        # Display Analysis
+        mcp_server_logger.info("\nConsistency Analysis Report")
+        mcp_server_logger.info("\n".join(infos))
+
+        if issues:
+            mcp_server_logger.info(
+                "\n".join(f"• {issue}" for issue in issues)
+            )
+
+        if warnings:
+            mcp_server_logger.info(
+                "\n".join(f"• {warning}" for warning in warnings),
+            )
+
+        if insights:
+            mcp_server_logger.info(
+                "\n".join(f"• {insight}" for insight in insights),
+            )
+
+        # Final Consistency Score
+        total_checks = len(steps) * 5  # 5 types of checks per step
+        passed_checks = total_checks - (len(issues) * 2 + len(warnings))
+        consistency_score = (passed_checks / total_checks) * 100
+
+        mcp_server_logger.info(
+            f"[bold]Consistency Score: {consistency_score:.1f}%[/bold]\n" +
+            f"Passed Checks: {passed_checks}/{total_checks}\n" +
+            f"Critical Issues: {len(issues)}\n" +
+            f"Warnings: {len(warnings)}\n" +
+            f"Insights: {len(insights)}"
+        )
+
+        return TextContent(
+            type="text",
+            text=str({
+                "consistency_score": consistency_score,
+                "issues": issues,
+                "warnings": warnings,
+                "insights": insights
+            })
+        )
+    except Exception as e:
+        mcp_server_logger.info("Error in consistency check: %s", e)
+        return TextContent(
+            type="text",
+            text=f"Error: {str(e)}"
+        )
+
+@offload("cpu", timeout=10)
+def power(a: int, b: int) -> int | str | dict:
+    """Power of two numbers (limited to 100000 bits). Large results come back as a decimal string, huge ones as a digit count summary"""
+    mcp_server_logger.info("CALLED: power(a: int, b: int) -> int:")
+    # Same size limit as ** in calculate, refused before anything is computed
+    check_pow(a, b)
+    return sequences.format_big_int(int(a ** b))
+
+@offload("cpu", timeout=10)
+def factorial(a: int) -> int | str | dict:
+    """factorial of a number (a <= 100000). Large results come back as a decimal string, huge ones as a digit count summary"""
+    mcp_server_logger.info("CALLED: factorial(a: int) -> int:")
+    return sequences.format_big_int(sequences.factorial(a))
+
+@offload("cpu", timeout=10)
+def int_list_to_exponential_sum(int_list: list, mode: str = "auto") -> dict:
+    """Return sum of exponentials of numbers in a list. mode is auto, float, logsumexp (returns only log_value, the log of the sum) or decimal (the sum to 50 significant digits, as a string)"""
+    mcp_server_logger.info("CALLED: int_list_to_exponential_sum(int_list: list, mode: str) -> dict:")
+    return exp_sum.exponential_sum(int_list, mode=mode)
+
+@offload("cpu", timeout=10)
+def int_list_to_power_sum(int_list: list, power: int = 2) -> int | float | str | dict:
+    """Return sum of powers of numbers in a list (each power limited to 100000 bits). Large results come back as a decimal string, huge ones as a digit count summary"""
+    mcp_server_logger.info("CALLED: int_list_to_power_sum(int_list: list, power: int) -> int:")
+    ints = [i for i in int_list if isinstance(i, int)]
+    if ints:
+        # The largest magnitude gives the largest power, checked before anything is computed
+        check_pow(max(ints, key=abs), power)
+    result = sum(i ** power for i in int_list)
+    return sequences.format_big_int(result) if isinstance(result, int) else result
+
+@offload("cpu", timeout=30)
+def text_to_power_sum(text: str = "", path: str = "", reduction: str = "power_sum", power: int = 2,
+                      mode: str = "unicode", encoding: str = "utf-8", exp_mode: str = "auto") -> dict:
+    """Convert text (inline or from a file path) to code points and return only their power_sum, exponential_sum or sum. mode is unicode (ord of each character) or bytes (byte values in the given encoding). Each power is limited to 100000 bits"""
+    mcp_server_logger.info("CALLED: text_to_power_sum(text, path, reduction, power, mode, encoding) -> dict:")
+    aggregate = text_pipeline.aggregate_text(text=text, path=path or None, reduction=reduction,
+                                             power=power, mode=mode, encoding=encoding, exp_mode=exp_mode)
+    if isinstance(aggregate["result"], int):
+        aggregate["result"] = sequences.format_big_int(aggregate["result"])
+    return aggregate
+
+@offload("cpu", timeout=10)
+def fibonacci_numbers(n: int) -> list:
+    """Return the first n Fibonacci Numbers (n <= 1000, use fibonacci_range for later pages)"""
+    mcp_server_logger.info("CALLED: fibonacci_numbers(n: int) -> list:")
+    return [sequences.format_big_int(v) for v in sequences.fibonacci_range(0, n)]
+
+@offload("cpu", timeout=10)
+def fibonacci_nth(n: int) -> int | str | dict:
+    """Return the n-th Fibonacci Number (n <= 1000000) using fast doubling"""
+    mcp_server_logger.info("CALLED: fibonacci_nth(n: int) -> int:")
+    return sequences.format_big_int(sequences.fibonacci_nth(n))
+
+@offload("cpu", timeout=10)
+def fibonacci_range(start: int, count: int) -> list:
+    """Return one page of the Fibonacci sequence, F(start) to F(start + count - 1), at most 1000 numbers"""
+    mcp_server_logger.info("CALLED: fibonacci_range(start: int, count: int) -> list:")
+    return [sequences.format_big_int(v) for v in sequences.fibonacci_range(start, count)]
+
+@offload("cpu", timeout=10)
+def batch_apply(op: str, a: list | dict | float, b: list | dict | float) -> list | dict | float:
+    """Apply add, subtract, multiply, divide, power, remainder, minimum or maximum elementwise to two arrays (NumPy broadcasting). Arrays can be nested lists or {"dtype", "shape", "data": base64}"""
+    mcp_server_logger.info("CALLED: batch_apply(op: str, a, b) op=%s", op)
+    return batch_math.batch_apply(op, a, b)
+
+@offload("cpu", timeout=10)
+def batch_unary(op: str, a: list | dict | float) -> list | dict | float:
+    """Apply sqrt, cbrt, log, exp, sin, cos, tan, abs, negative or square to every element of an array"""
+    mcp_server_logger.info("CALLED: batch_unary(op: str, a) op=%s", op)
+    return batch_math.batch_unary(op, a)
+
+@offload("cpu", timeout=10)
+def batch_reduce(op: str, a: list | dict, axis: int | None = None) -> list | dict | float:
+    """Reduce an array with sum, prod, mean, min, max or std, over everything or one axis"""
+    mcp_server_logger.info("CALLED: batch_reduce(op: str, a, axis) op=%s", op)
+    return batch_math.batch_reduce(op, a, axis)
@@ -0,0 +1,93 @@
+import math
+from decimal import Decimal, getcontext, localcontext
+import numpy as np
+
+# exp(709.78) is the largest value float64 can hold
+FLOAT_EXP_LIMIT = 709.0
+# Above this many distinct values the decimal path gets slow, use log-sum-exp instead
+DECIMAL_MAX_VALUES = 10_000
+DECIMAL_PRECISION = 50
+# Decimal(v).exp() overflows once the result needs an exponent above the context's Emax (v > ~2.3 million)
+DECIMAL_EXP_LIMIT = getcontext().Emax * math.log(10)
+
+MODES = ("auto", "float", "logsumexp", "decimal")
+
+
+def choose_mode(values, counts):
+    """float64 when the sum cannot overflow, 50-digit decimal for small inputs that fit its context, log-sum-exp otherwise"""
+    if values.size == 0:
+        return "float"
+    log_bound = values.max() + math.log(max(counts.sum(), 1))
+    if log_bound < FLOAT_EXP_LIMIT:
+        return "float"
+    if values.size <= DECIMAL_MAX_VALUES and log_bound < DECIMAL_EXP_LIMIT:
+        return "decimal"
+    return "logsumexp"
+
+
+def exp_sum_float(values, counts):
+    with np.errstate(over="ignore"):
+        return float(np.dot(counts, np.exp(values)))
+
+
+def log_sum_exp(values, counts):
+    """log(sum(count * exp(value))) without ever computing exp(value) directly"""
+    if values.size == 0:
+        return float("-inf")
+    m = float(values.max())
+    return m + math.log(float(np.dot(counts, np.exp(values - m))))
+
+
+def exp_sum_decimal(values, counts, precision=DECIMAL_PRECISION):
+    with localcontext() as ctx:
+        ctx.prec = precision
+        total = Decimal(0)
+        for value, count in zip(values.tolist(), counts.tolist()):
+            total += Decimal(count) * Decimal(value).exp()
+        return total
+
+
+def exponential_sum(values, counts=None, mode="auto"):
+    """Sum of exp(v) over values (optionally weighted by counts) in the requested mode"""
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}")
+    values = np.asarray(values, dtype=np.float64).ravel()
+    if counts is None:
+        # Repeated values are common (ASCII codes), so exponentiate each distinct one once
+        values, counts = np.unique(values, return_counts=True)
+    counts = np.asarray(counts, dtype=np.float64)
+    if mode == "auto":
+        mode = choose_mode(values, counts)
+
+    if mode == "float":
+        value = exp_sum_float(values, counts)
+        if math.isinf(value):
+            raise ValueError(f"The sum overflows float64 (its log is {log_sum_exp(values, counts):.6g}), "
+                             "use mode logsumexp or decimal")
+        return {"mode": mode, "value": value, "log_value": math.log(value) if value > 0 else None}
+    if mode == "logsumexp":
+        return {"mode": mode, "value": None, "log_value": log_sum_exp(values, counts)}
+    if values.size and values.max() + math.log(max(counts.sum(), 1)) >= DECIMAL_EXP_LIMIT:
+        raise ValueError(f"Values above {DECIMAL_EXP_LIMIT:.0f} overflow the decimal context, use mode logsumexp")
+    value = exp_sum_decimal(values, counts)
+    return {"mode": mode, "value": str(value), "log_value": float(value.ln()) if value > 0 else None}
+
+
+if __name__ == "__main__":
+    # Benchmark over 10^6 elements against the old generator based sum
+    import time
+    rng = np.random.default_rng(0)
+    small = rng.integers(0, 128, size=10**6)
+    large = rng.integers(0, 5000, size=10**6)
+
+    start = time.perf_counter()
+    baseline = sum(math.exp(i) for i in small.tolist())
+    print(f"generator sum (0..127):  {time.perf_counter() - start:.3f}s")
+    for mode in ("float", "logsumexp", "decimal"):
+        start = time.perf_counter()
+        result = exponential_sum(small, mode=mode)
+        print(f"{mode:10} (0..127):     {time.perf_counter() - start:.3f}s  {result}")
+    print(f"float matches generator sum: {math.isclose(baseline, exponential_sum(small, mode='float')['value'])}")
+    start = time.perf_counter()
+    result = exponential_sum(large)
+    print(f"auto (0..4999):          {time.perf_counter() - start:.3f}s  {result}")
@@ -0,0 +1,236 @@
+import re
+import json
+
+# Characters that matter inside an object, and the ones that end or escape a string
+_STRUCTURE = re.compile(r"[{}\"']")
+_DOUBLE_QUOTED = re.compile(r"[\"\\]")
+_SINGLE_QUOTED = re.compile(r"['\\]")
+_PY_LITERALS = re.compile(r"\b(True|False|None)\b")
+_PY_JSON = {"True": "true", "False": "false", "None": "null"}
+# Stray opening braces skipped by JSONStreamExtractor.finish(), each one costs a rescan of the rest
+MAX_RESCANS = 8
+
+
+class JSONExtractError(ValueError):
+    """No usable JSON object in a model response, kind is no_object, unbalanced, invalid or missing_key"""
+
+    def __init__(self, kind, message, position=None, snippet=None, candidates=0):
+        super().__init__(message)
+        self.kind = kind
+        self.position = position
+        self.snippet = snippet
+        self.candidates = candidates
+
+    def to_dict(self):
+        return {
+            "kind": self.kind,
+            "message": str(self),
+            "position": self.position,
+            "snippet": self.snippet,
+            "candidates": self.candidates,
+        }
+
+
+class JSONStreamExtractor:
+    """Finds top-level {...} objects in text fed chunk by chunk, e.g. tokens as they stream in.
+    Braces inside strings are ignored, prose and markdown fences around the objects are skipped.
+    Scanning resumes where the last chunk stopped, so the whole response is read once."""
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.depth = 0
+        self.quote = None
+        self.start = None
+        # Absolute position of buffer[0] in the whole response
+        self.offset = 0
+        self.objects = []
+
+    def feed(self, chunk):
+        """Scan more text, returns [(position, object_text)] for the objects completed by it"""
+        buf = self.buffer + chunk
+        i, n = self.pos, len(buf)
+        found = []
+        while i < n:
+            if self.depth == 0:
+                # Outside any object only an opening brace matters
+                j = buf.find("{", i)
+                if j < 0:
+                    i = n
+                    break
+                self.start, self.depth, i = j, 1, j + 1
+                continue
+            if self.quote:
+                m = (_DOUBLE_QUOTED if self.quote == '"' else _SINGLE_QUOTED).search(buf, i)
+                if not m:
+                    i = n
+                    break
+                if m.group() == "\\":
+                    # Skip the escaped character, even if it has not arrived yet
+                    i = m.end() + 1
+                else:
+                    self.quote = None
+                    i = m.end()
+                continue
+            m = _STRUCTURE.search(buf, i)
+            if not m:
+                i = n
+                break
+            ch, i = m.group(), m.end()
+            if ch in "\"'":
+                self.quote = ch
+            elif ch == "{":
+                self.depth += 1
+            else:
+                self.depth -= 1
+                if self.depth == 0:
+                    found.append((self.offset + self.start, buf[self.start:i]))
+
+        # Keep only the unfinished object, everything before it has been scanned
+        keep = self.start if self.depth else min(i, n)
+        self.buffer = buf[keep:]
+        self.pos = i - keep
+        self.offset += keep
+        if self.depth:
+            self.start = 0
+        self.objects.extend(found)
+        return found
+
+    def unfinished(self):
+        """Text of an object that was opened but never closed, or None"""
+        return self.buffer if self.depth else None
+
+    def finish(self, max_rescans=MAX_RESCANS):
+        """(objects, unfinished()) at the end of the response. A brace that is never closed, e.g. "{" in prose
+        before the answer, would hide every object after it, so the text after it is scanned again."""
+        objects, unfinished, offset = list(self.objects), self.unfinished(), self.offset
+        for _ in range(max_rescans):
+            if not unfinished:
+                break
+            rescan = JSONStreamExtractor()
+            rescan.offset = offset + 1
+            rescan.feed(unfinished[1:])
+            objects.extend(rescan.objects)
+            unfinished, offset = rescan.unfinished(), rescan.offset
+        return objects, self.unfinished()
+
+
+def repair(text):
+    """Fix common LLM JSON defects: single-quoted strings, trailing commas and Python True/False/None"""
+    out = []
+    outside = []
+    i, n = 0, len(text)
+
+    def flush_outside():
+        if outside:
+            out.append(_PY_LITERALS.sub(lambda m: _PY_JSON[m.group()], "".join(outside)))
+            outside.clear()
+
+    while i < n:
+        ch = text[i]
+        if ch in "\"'":
+            flush_outside()
+            quote, j = ch, i + 1
+            chars = ['"']
+            while j < n and text[j] != quote:
+                if text[j] == "\\" and j + 1 < n:
+                    # \' is not a JSON escape, every other escape is kept
+                    chars.append("'" if text[j + 1] == "'" else text[j:j + 2])
+                    j += 2
+                    continue
+                chars.append('\\"' if text[j] == '"' else text[j])
+                j += 1
+            chars.append('"')
+            out.append("".join(chars))
+            i = j + 1
+            continue
+        if ch in "}]":
+            # Drop a trailing comma before the closing bracket
+            flush_outside()
+            k = len(out) - 1
+            while k >= 0 and not out[k].strip():
+                k -= 1
+            if k >= 0 and out[k].rstrip().endswith(","):
+                out[k] = out[k].rstrip()[:-1]
+        outside.append(ch)
+        i += 1
+    flush_outside()
+    return "".join(out)
+
+
+def loads_lenient(text):
+    """json.loads, retried once on the repaired text"""
+    try:
+        return json.loads(text)
+    except ValueError as first:
+        try:
+            return json.loads(repair(text))
+        except ValueError:
+            raise first from None
+
+
+def _snippet(text, position=0, width=80):
+    return text[max(0, position - width // 2):position + width // 2]
+
+
+def pick_object(objects, require_key=None, unfinished=None):
+    """Parse candidate (position, text) pairs from the end and return the last object that has require_key"""
+    last_error = None
+    found_other = False
+    for position, text in reversed(objects):
+        try:
+            value = loads_lenient(text)
+        except ValueError as e:
+            if last_error is None:
+                offset = getattr(e, "pos", 0) or 0
+                last_error = JSONExtractError("invalid", f"Invalid JSON at {position + offset}: {e}",
+                                              position + offset, _snippet(text, offset), len(objects))
+            continue
+        if isinstance(value, dict):
+            if require_key is None or require_key in value:
+                return value
+            found_other = True
+    if found_other:
+        raise JSONExtractError("missing_key", f"No JSON object with a '{require_key}' key",
+                               candidates=len(objects))
+    if last_error is not None:
+        raise last_error
+    if unfinished:
+        raise JSONExtractError("unbalanced", "JSON object is not closed", snippet=_snippet(unfinished))
+    raise JSONExtractError("no_object", "No JSON object found in LLM response")
+
+
+def extract_json(text, require_key=None):
+    """The right JSON object in a whole model response, see pick_object"""
+    extractor = JSONStreamExtractor()
+    extractor.feed(text)
+    objects, unfinished = extractor.finish()
+    return pick_object(objects, require_key, unfinished)
+
+
+if __name__ == "__main__":
+    # Throughput on a large response: prose, a fenced example and the real answer at the end
+    import time
+
+    answer = '{"message_type": "FUNCTION_CALL", "name": "verify", "params": {"expression": "73**2", "expected": 5329,}}'
+    text = ("Let me think about this {step} by step. " * 20000 + "```json\n"
+            + '{"example": "not this one", "nested": {"a": [1, 2, {"b": "}"}]}}\n```\n' * 2000 + answer)
+    start = time.perf_counter()
+    value = extract_json(text, require_key="message_type")
+    elapsed = time.perf_counter() - start
+    print(f"{len(text) / 1e6:.1f} MB in {elapsed * 1000:.1f} ms, picked {value['name']}")
+
+    # What talk2mcp did before: one greedy match from the first { to the last }
+    match = re.search(r"\{.*\}", text, re.DOTALL)
+    try:
+        json.loads(match.group(0))
+        print("greedy regex: parsed")
+    except ValueError as e:
+        print(f"greedy regex: failed ({e})")
+
+    start = time.perf_counter()
+    extractor = JSONStreamExtractor()
+    for i in range(0, len(text), 16):
+        extractor.feed(text[i:i + 16])
+    elapsed = time.perf_counter() - start
+    print(f"streamed in 16 character chunks: {elapsed * 1000:.1f} ms, {len(extractor.objects)} objects")
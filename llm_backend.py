@@ -0,0 +1,193 @@
+import os
+import json
+import asyncio
+from typing import AsyncIterator, Protocol
+from logger import client_logger
+
+
+class LLMBackend(Protocol):
+    """Anything that can turn a prompt into the model's response text"""
+
+    async def generate(self, prompt: str) -> str:
+        ...
+
+    def stream(self, prompt: str) -> AsyncIterator[str]:
+        """Optional, the response text chunk by chunk as it is generated"""
+        ...
+
+
+async def iter_chunks(backend, prompt):
+    """Stream a backend's response, a backend without stream() yields its whole response as one chunk"""
+    stream = getattr(backend, "stream", None)
+    if stream is None:
+        yield await backend.generate(prompt)
+        return
+    async for chunk in stream(prompt):
+        yield chunk
+
+
+class GeminiBackend:
+    """Adapter around the google-genai client"""
+
+    def __init__(self, api_key=None, model="gemini-2.0-flash", config=None):
+        self.api_key = api_key
+        self.model = model
+        # Generation config (temperature etc.), part of the response cache key
+        self.config = config
+        self._client = None
+
+    @property
+    def client(self):
+        # Created on first use, so a cache in replay mode never needs google-genai or a key
+        if self._client is None:
+            from google import genai
+            self._client = genai.Client(api_key=self.api_key or os.getenv("GEMINI_API_KEY"))
+        return self._client
+
+    async def generate(self, prompt: str) -> str:
+        # Native async client, so a timeout cancels the request instead of leaking a thread
+        response = await self.client.aio.models.generate_content(
+            model=self.model,
+            contents=prompt,
+            config=self.config
+        )
+        return response.candidates[0].content.parts[0].text.strip()
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        response = await self.client.aio.models.generate_content_stream(
+            model=self.model,
+            contents=prompt,
+            config=self.config
+        )
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+    def cache_identity(self):
+        return {"backend": "gemini", "model": self.model, "config": self.config}
+
+    def fork(self):
+        """The client is stateless per call, so concurrent runs can share it"""
+        return self
+
+
+class ScriptedBackend:
+    """Returns canned responses in order, with a fixed simulated latency.
+    stream() spreads the latency over chunks of chunk_size characters, like tokens arriving."""
+
+    def __init__(self, responses, latency=0.0, chunk_size=16):
+        self.responses = list(responses)
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.calls = 0
+
+    async def generate(self, prompt: str) -> str:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._next_response()
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        response = self._next_response()
+        chunks = [response[i:i + self.chunk_size] for i in range(0, len(response), self.chunk_size)] or [""]
+        for chunk in chunks:
+            if self.latency:
+                await asyncio.sleep(self.latency / len(chunks))
+            yield chunk
+
+    def _next_response(self):
+        if self.calls < len(self.responses):
+            response = self.responses[self.calls]
+        else:
+            # Script ran out, finish the run instead of looping forever
+            response = {"message_type": "FINAL_ANSWER", "name": "result", "params": "script exhausted"}
+        self.calls += 1
+        if not isinstance(response, str):
+            response = json.dumps(response)
+        return response
+
+    def fork(self):
+        """Fresh copy for another run, replaying the script from the start"""
+        return ScriptedBackend(self.responses, latency=self.latency, chunk_size=self.chunk_size)
+
+    @classmethod
+    def from_file(cls, path, latency=0.0):
+        """Load a replay script, one response (JSON object or raw text) per line"""
+        responses = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    responses.append(line)
+        client_logger.info("Loaded %s scripted responses from %s", len(responses), path)
+        return cls(responses, latency=latency)
+
+
+class LimitedBackend:
+    """Caps the number of in-flight LLM calls shared by all agents in the process.
+    timeout (seconds) starts once a call has its slot, so time spent queued never counts against it."""
+
+    def __init__(self, backend, max_concurrency=4, timeout=None):
+        self.backend = backend
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    async def generate(self, prompt: str) -> str:
+        async with self.semaphore:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            try:
+                return await asyncio.wait_for(self.backend.generate(prompt), timeout=self.timeout)
+            finally:
+                self.in_flight -= 1
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        # The slot is held until the last chunk, not just the first one, and the timeout covers the whole stream
+        async with self.semaphore:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            loop = asyncio.get_running_loop()
+            deadline = None if self.timeout is None else loop.time() + self.timeout
+            chunks = iter_chunks(self.backend, prompt)
+            try:
+                while True:
+                    remaining = None if deadline is None else max(deadline - loop.time(), 0)
+                    try:
+                        chunk = await asyncio.wait_for(anext(chunks), timeout=remaining)
+                    except StopAsyncIteration:
+                        break
+                    yield chunk
+            finally:
+                self.in_flight -= 1
+                await chunks.aclose()
+
+    def cache_identity(self):
+        return self.backend.cache_identity()
+
+    def fork(self):
+        """Per-run backend that still shares this limiter's semaphore"""
+        forked = LimitedBackend(self.backend.fork(), self.max_concurrency, self.timeout)
+        forked.semaphore = self.semaphore
+        return forked
+
+
+def make_backend():
+    """Pick the backend from the environment (LLM_BACKEND=gemini|scripted, LLM_CACHE=readwrite|replay|off)"""
+    kind = os.getenv("LLM_BACKEND", "gemini")
+    max_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+    timeout = float(os.getenv("LLM_TIMEOUT", "10"))
+    if kind == "scripted":
+        latency = float(os.getenv("LLM_LATENCY", "0"))
+        backend = ScriptedBackend.from_file(os.getenv("LLM_SCRIPT", "assets/llm_script.jsonl"), latency=latency)
+        # Scripted responses follow the call order, not the prompt, so they are never cached
+        return LimitedBackend(backend, max_concurrency=max_concurrency, timeout=timeout)
+    backend = GeminiBackend(model=os.getenv("LLM_MODEL", "gemini-2.0-flash"))
+    backend = LimitedBackend(backend, max_concurrency=max_concurrency, timeout=timeout)
+    mode = os.getenv("LLM_CACHE", "readwrite")
+    if mode == "off":
+        return backend
+    # Outside the limiter, so cache hits never wait for a free slot
+    from llm_cache import CachedBackend, make_cache
+    return CachedBackend(backend, make_cache(), mode=mode)
@@ -0,0 +1,174 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import hashlib
+import threading
+from logger import client_logger
+from llm_backend import iter_chunks
+import metrics
+
+CACHE_MODES = ("off", "readwrite", "replay")
+
+
+class CacheMissError(LookupError):
+    """Replay mode found no cached response for a prompt"""
+
+
+def cache_key(identity, prompt):
+    """Content address of one LLM call: backend, model and generation config plus the prompt hash"""
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    payload = json.dumps({"identity": identity, "prompt": prompt_hash}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """SQLite table of responses with a TTL and least-recently-used eviction past max_bytes"""
+
+    def __init__(self, path=os.path.join(".cache", "llm_cache.sqlite3"), ttl=7 * 24 * 3600,
+                 max_bytes=100 * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        # WAL lets several agent processes read while one writes
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, model TEXT, response TEXT, size INTEGER, created REAL, last_used REAL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+
+    def get(self, key, ignore_ttl=False):
+        now = time.time()
+        with self.lock:
+            row = self.db.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and not ignore_ttl and self.ttl and now - row[1] > self.ttl:
+                self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, model, response):
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, size, now, now),
+            )
+            self.stores += 1
+            self._evict()
+
+    def _evict(self):
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Drop least recently used rows until the cache fits again
+        for key, size in self.db.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall():
+            self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.evictions += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self):
+        with self.lock:
+            entries, size = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "bytes": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+        }
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+class CachedBackend:
+    """Serves repeated prompts from a ResponseCache. mode="replay" never calls the wrapped backend,
+    a miss raises CacheMissError instead, so CI runs are deterministic and offline."""
+
+    def __init__(self, backend, cache, mode="readwrite"):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"mode must be one of {CACHE_MODES}")
+        self.backend = backend
+        self.cache = cache
+        self.mode = mode
+        self.identity = backend.cache_identity()
+
+    async def generate(self, prompt: str) -> str:
+        if self.mode == "off":
+            return await self.backend.generate(prompt)
+        key = cache_key(self.identity, prompt)
+        # SQLite calls are short but blocking, keep them off the event loop
+        response = await asyncio.to_thread(self.cache.get, key, self.mode == "replay")
+        if response is not None:
+            metrics.inc("llm_cache_total", result="hit")
+            return response
+        metrics.inc("llm_cache_total", result="miss")
+        if self.mode == "replay":
+            raise CacheMissError(f"No cached response for prompt {key[:12]} in replay mode")
+        response = await self.backend.generate(prompt)
+        await asyncio.to_thread(self.cache.put, key, self.identity.get("model"), response)
+        return response
+
+    async def stream(self, prompt: str):
+        """Cache hits arrive as one chunk, a miss streams from the backend and is stored once complete"""
+        if self.mode == "off":
+            async for chunk in iter_chunks(self.backend, prompt):
+                yield chunk
+            return
+        key = cache_key(self.identity, prompt)
+        response = await asyncio.to_thread(self.cache.get, key, self.mode == "replay")
+        if response is not None:
+            metrics.inc("llm_cache_total", result="hit")
+            yield response
+            return
+        metrics.inc("llm_cache_total", result="miss")
+        if self.mode == "replay":
+            raise CacheMissError(f"No cached response for prompt {key[:12]} in replay mode")
+        chunks = []
+        async for chunk in iter_chunks(self.backend, prompt):
+            chunks.append(chunk)
+            yield chunk
+        # Stripped like generate() returns it, so both paths share entries
+        await asyncio.to_thread(self.cache.put, key, self.identity.get("model"), "".join(chunks).strip())
+
+    def cache_identity(self):
+        return self.identity
+
+    def fork(self):
+        """Per-run backend sharing the same cache"""
+        return CachedBackend(self.backend.fork(), self.cache, self.mode)
+
+
+def make_cache():
+    """ResponseCache from LLM_CACHE_PATH, LLM_CACHE_TTL (seconds, 0 keeps forever) and LLM_CACHE_MAX_MB"""
+    cache = ResponseCache(
+        path=os.getenv("LLM_CACHE_PATH", os.path.join(".cache", "llm_cache.sqlite3")),
+        ttl=float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600))),
+        max_bytes=int(float(os.getenv("LLM_CACHE_MAX_MB", "100")) * 1024 * 1024),
+    )
+    client_logger.info("LLM response cache at %s: %s", cache.path, cache.stats())
+    return cache
@@ -0,0 +1,125 @@
+import re
+import time
+import asyncio
+from logger import client_logger
+from llm_backend import iter_chunks
+from json_extract import JSONExtractError, JSONStreamExtractor, loads_lenient, pick_object
+import metrics
+import tracing
+
+# What may follow a message for it to go out before the stream ends: whitespace up to a closing code fence
+_CLOSING_FENCE = re.compile(r"\s*```")
+_UNDECIDED = re.compile(r"\s*`{0,2}")
+
+
+class StreamedResponse:
+    """One streamed generation, started right away in a background task.
+    message() returns the same object extract_json would pick from the whole response: the last JSON object
+    with require_key. It is returned early, while the rest is still arriving, only when whitespace and a closing
+    code fence follow it. Otherwise a later object could still replace it, so it waits for the end of the stream.
+    finish() waits for the whole response text. The backend's limiter applies the timeout."""
+
+    def __init__(self, backend, prompt, require_key="message_type"):
+        self.require_key = require_key
+        self.chunks = []
+        self.started = time.perf_counter()
+        # Seconds from the request to the first chunk and to the first complete message
+        self.first_token = None
+        self.dispatch = None
+        self._message = asyncio.get_running_loop().create_future()
+        self._task = asyncio.ensure_future(self._run(backend, prompt))
+
+    async def _run(self, backend, prompt):
+        with metrics.timer("llm_generate"), tracing.span("llm_generate", kind="client", stream=True) as span:
+            await self._consume(backend, prompt)
+            if self.first_token is not None:
+                span.set("first_token_ms", round(self.first_token * 1000, 1))
+            if self.dispatch is not None:
+                span.set("dispatch_ms", round(self.dispatch * 1000, 1))
+        text = "".join(self.chunks)
+        client_logger.info("LLM stream completed in %.3fs (first token %.3fs, message %s)",
+                           time.perf_counter() - self.started, self.first_token or 0.0,
+                           f"{self.dispatch:.3f}s" if self.dispatch is not None else "not found")
+        return text
+
+    async def _consume(self, backend, prompt):
+        extractor = JSONStreamExtractor()
+        received = 0
+        # The latest object with require_key and the text that followed it so far
+        candidate, tail = None, ""
+        async for chunk in iter_chunks(backend, prompt):
+            if self.first_token is None:
+                self.first_token = time.perf_counter() - self.started
+                metrics.observe("llm_first_token_seconds", self.first_token)
+            self.chunks.append(chunk)
+            if self._message.done():
+                extractor.feed(chunk)
+                continue
+            if candidate is not None:
+                tail += chunk
+            for position, text in extractor.feed(chunk):
+                try:
+                    value = loads_lenient(text)
+                except ValueError:
+                    continue
+                if isinstance(value, dict) and self.require_key in value:
+                    candidate, tail = value, chunk[position + len(text) - received:]
+            received += len(chunk)
+            if candidate is not None and _CLOSING_FENCE.match(tail):
+                self._dispatch(candidate)
+            elif candidate is not None and _UNDECIDED.fullmatch(tail) is None:
+                # Prose after the object, only the end of the response can tell whether it was the last one
+                candidate, tail = None, ""
+        try:
+            objects, unfinished = extractor.finish()
+            last = pick_object(objects, self.require_key, unfinished)
+        except JSONExtractError:
+            # No message, finish() gives the caller the text to report
+            return
+        if not self._message.done():
+            self._dispatch(last)
+        elif last != self._message.result():
+            client_logger.info("Another message followed the one dispatched early and was ignored: %s", last)
+
+    def _dispatch(self, message):
+        self.dispatch = time.perf_counter() - self.started
+        metrics.observe("llm_dispatch_seconds", self.dispatch)
+        self._message.set_result(message)
+
+    async def message(self):
+        """The message, or None if the stream ended without one. Raises the stream's error."""
+        await asyncio.wait({self._message, self._task}, return_when=asyncio.FIRST_COMPLETED)
+        if self._message.done():
+            return self._message.result()
+        # Raises the stream's error, if any
+        self._task.result()
+        return None
+
+    async def finish(self):
+        """The whole response text once the stream has ended"""
+        return await self._task
+
+
+if __name__ == "__main__":
+    # Time to first token and to a dispatchable tool call against the full generation time,
+    # for a scripted model that explains itself after the fenced JSON: python llm_stream.py [latency_seconds]
+    import sys
+    from llm_backend import ScriptedBackend
+
+    latency = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+    answer = '{"message_type": "FUNCTION_CALL", "name": "strings_to_chars_to_int", "params": {"string": "INDIA"}}'
+    explanation = "\nI convert every character of INDIA to its ASCII value first, the squares are summed next." * 3
+    backend = ScriptedBackend(["```json\n" + answer + "\n```" + explanation], latency=latency)
+
+    async def bench():
+        start = time.perf_counter()
+        await backend.fork().generate("")
+        print(f"generate: {time.perf_counter() - start:.3f}s until the tool call can start")
+
+        stream = StreamedResponse(backend.fork(), "")
+        message = await stream.message()
+        print(f"stream: first token {stream.first_token:.3f}s, {message['name']} dispatched after {stream.dispatch:.3f}s")
+        await stream.finish()
+        print(f"stream: completed after {time.perf_counter() - stream.started:.3f}s")
+
+    asyncio.run(bench())
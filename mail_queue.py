@@ -0,0 +1,223 @@
+import os
+import time
+import uuid
+import queue
+import smtplib
+import threading
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from logger import mcp_server_logger
+
+
+class MailConfig:
+    """SMTP settings from the environment (SMTP_HOST, SMTP_PORT, SMTP_SSL, SMTP_USER, SMTP_PASSWORD, MAIL_FROM, MAIL_TO)"""
+
+    def __init__(self, host=None, port=None, use_ssl=None, user=None, password=None,
+                 sender=None, recipients=None, subject="EAG V1 Assignment 5 Result"):
+        self.host = host or os.getenv("SMTP_HOST", "smtp.gmail.com")
+        self.port = int(port or os.getenv("SMTP_PORT", "465"))
+        if use_ssl is None:
+            use_ssl = os.getenv("SMTP_SSL", "1" if self.port == 465 else "0") == "1"
+        self.use_ssl = use_ssl
+        self.user = user if user is not None else os.getenv("SMTP_USER", "")
+        self.password = password if password is not None else os.getenv("SMTP_PASSWORD", os.getenv("G_APP_PASS", ""))
+        self.sender = sender or os.getenv("MAIL_FROM", self.user)
+        if recipients is None:
+            recipients = [r.strip() for r in os.getenv("MAIL_TO", self.sender).split(",") if r.strip()]
+        self.recipients = recipients
+        self.subject = subject
+
+
+class MailMessage:
+    def __init__(self, text, recipients, subject):
+        self.id = uuid.uuid4().hex[:12]
+        self.text = text
+        self.recipients = recipients
+        self.subject = subject
+        self.status = "queued"
+        self.attempts = 0
+        self.error = None
+        self.next_try = 0.0
+        self.sent_at = None
+
+    def to_dict(self):
+        return {
+            "message_id": self.id,
+            "status": self.status,
+            "attempts": self.attempts,
+            "recipients": self.recipients,
+            "error": self.error,
+            "sent_at": self.sent_at,
+        }
+
+
+class MailQueue:
+    """Background worker that keeps one authenticated SMTP connection and sends queued mail in batches"""
+
+    def __init__(self, config=None, batch_size=20, max_attempts=5, backoff=1.0, idle_timeout=60.0, keep=None):
+        self.config = config or MailConfig()
+        # Sent and failed messages kept for status(), the oldest are forgotten first (MAIL_KEEP, 1000)
+        self.keep = keep if keep is not None else int(os.getenv("MAIL_KEEP", "1000"))
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.idle_timeout = idle_timeout
+        self.queue = queue.Queue()
+        self.retries = []
+        self.messages = {}
+        self.connection = None
+        self.last_used = 0.0
+        self.worker = None
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+
+    def start(self):
+        with self.lock:
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self._run, name="mail-queue", daemon=True)
+                self.worker.start()
+
+    def send(self, text, recipients=None, subject=None):
+        """Queue a message and return its id straight away"""
+        recipients = recipients or self.config.recipients
+        if not recipients:
+            raise ValueError("No recipients, set MAIL_TO or pass one")
+        message = MailMessage(text, recipients, subject or self.config.subject)
+        self.messages[message.id] = message
+        self._forget_finished()
+        self.start()
+        self.queue.put(message)
+        return message.id
+
+    def _forget_finished(self):
+        # messages keeps insertion order, unfinished messages are never dropped
+        finished = [m.id for m in list(self.messages.values()) if m.status in ("sent", "failed")]
+        for message_id in finished[:max(len(finished) - self.keep, 0)]:
+            self.messages.pop(message_id, None)
+
+    def status(self, message_id):
+        message = self.messages.get(message_id)
+        if message is None:
+            raise ValueError(f"Unknown message id {message_id}")
+        return message.to_dict()
+
+    def flush(self, timeout=10.0):
+        """Wait until nothing is queued or retrying (used by tests and on shutdown)"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if all(m.status in ("sent", "failed") for m in list(self.messages.values())):
+                return True
+            time.sleep(0.01)
+        return False
+
+    def close(self, timeout=None):
+        """Deliver what is still queued or retrying, then stop the worker. Registered at exit by the server,
+        the worker is a daemon thread and would otherwise be killed with queued mail.
+        timeout defaults to MAIL_FLUSH_TIMEOUT (seconds, 10)."""
+        if timeout is None:
+            timeout = float(os.getenv("MAIL_FLUSH_TIMEOUT", "10"))
+        delivered = self.flush(timeout)
+        if not delivered:
+            pending = [m.id for m in list(self.messages.values()) if m.status not in ("sent", "failed")]
+            mcp_server_logger.info("Mail queue closed with %s undelivered messages: %s", len(pending), pending)
+        self.stopping.set()
+        worker = self.worker
+        if worker is not None and worker.is_alive():
+            # Wake the worker so it closes the connection itself
+            self.queue.put(None)
+            worker.join(timeout=1.0)
+        return delivered
+
+    def _connect(self):
+        cfg = self.config
+        if cfg.use_ssl:
+            connection = smtplib.SMTP_SSL(cfg.host, cfg.port, timeout=30)
+        else:
+            connection = smtplib.SMTP(cfg.host, cfg.port, timeout=30)
+        if cfg.user and cfg.password:
+            connection.login(cfg.user, cfg.password)
+        mcp_server_logger.info("Connected to SMTP server %s:%s", cfg.host, cfg.port)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            try:
+                self.connection.quit()
+            except Exception:
+                pass
+            self.connection = None
+
+    def _ensure_connection(self):
+        if self.connection is not None:
+            try:
+                # The server may have dropped an idle connection
+                if self.connection.noop()[0] == 250:
+                    return self.connection
+            except Exception:
+                pass
+            self._close()
+        self.connection = self._connect()
+        return self.connection
+
+    def _build(self, message):
+        msg = MIMEMultipart()
+        msg["From"] = self.config.sender
+        msg["To"] = ", ".join(message.recipients)
+        msg["Subject"] = message.subject
+        msg["Message-ID"] = f"<{message.id}@mail-queue>"
+        msg.attach(MIMEText(f"Hello, this is final answer to your question: {message.text}", "plain"))
+        return msg
+
+    def _next_batch(self):
+        now = time.monotonic()
+        due = [m for m in self.retries if m.next_try <= now]
+        self.retries = [m for m in self.retries if m.next_try > now]
+        batch = due[:self.batch_size]
+        self.retries.extend(due[self.batch_size:])
+        if not batch:
+            # Sleep until new mail arrives or the next retry is due
+            wait = min((m.next_try for m in self.retries), default=now + self.idle_timeout) - now
+            try:
+                batch.append(self.queue.get(timeout=max(wait, 0.01)))
+            except queue.Empty:
+                return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        # None only wakes the worker up for close()
+        return [m for m in batch if m is not None]
+
+    def _run(self):
+        while not self.stopping.is_set():
+            batch = self._next_batch()
+            if not batch:
+                if self.connection is not None and time.monotonic() - self.last_used > self.idle_timeout:
+                    self._close()
+                continue
+            for message in batch:
+                self._deliver(message)
+            self.last_used = time.monotonic()
+        self._close()
+
+    def _deliver(self, message):
+        message.status = "sending"
+        message.attempts += 1
+        try:
+            self._ensure_connection().send_message(self._build(message))
+            message.status = "sent"
+            message.error = None
+            message.sent_at = time.time()
+            mcp_server_logger.info("Email %s sent to %s", message.id, message.recipients)
+        except Exception as e:
+            self._close()
+            message.error = str(e)
+            if message.attempts >= self.max_attempts:
+                message.status = "failed"
+                mcp_server_logger.info("Email %s failed after %s attempts: %s", message.id, message.attempts, e)
+            else:
+                message.status = "retrying"
+                message.next_try = time.monotonic() + self.backoff * 2 ** (message.attempts - 1)
+                self.retries.append(message)
+                mcp_server_logger.info("Email %s attempt %s failed, retrying: %s", message.id, message.attempts, e)
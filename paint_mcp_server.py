@@ -1,30 +1,76 @@
 # basic import 
 from mcp.server.fastmcp import FastMCP, Image
 from mcp.server.fastmcp.prompts import base
-from mcp.types import TextContent
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from mcp.types import TextContent, ToolAnnotations
 from mcp import types
-from PIL import Image as PILImage
+import thumbnails
 import math
+import atexit
+import signal
 import sys
-import os
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from pywinauto.application import Application
-import win32gui
-import win32con
-import time
-from win32api import GetSystemMetrics
 from logger import mcp_server_logger
+from tool_executor import offload
+import tool_executor
+import cpu_tools
+from tool_cache import pure
+import tool_cache
+from canvas import make_canvas
+from ui_wait import step_histogram
+from mail_queue import MailQueue
+import metrics
+import tracing
 
 load_dotenv()
 
-# Initalize google app password from environment variable
-g_app_password = os.getenv("G_APP_PASS")
+# Outbound mail goes through a background queue, SMTP settings come from the environment
+mail_queue = MailQueue()
+# The client closes stdin right after send_email returns, deliver what is queued before exiting
+atexit.register(mail_queue.close)
+
+class MeteredFastMCP(FastMCP):
+    """FastMCP that times every tool call into the metrics registry and records a span for it.
+    The client passes its traceparent in the request _meta so both sides share one trace."""
+
+    async def call_tool(self, name, arguments):
+        try:
+            meta = self.get_context().request_context.meta
+        except ValueError:
+            meta = None
+        parent = getattr(meta, "traceparent", None)
+        with metrics.timer("mcp_tool_call", tool=name), \
+                tracing.span(f"tool {name}", parent=parent, kind="server", tool=name):
+            return await super().call_tool(name, arguments)
+
+    def tool(self, *args, **kwargs):
+        """mcp.tool(), and @pure tools tell clients they are read-only and safe to repeat"""
+        def decorator(fn):
+            options = dict(kwargs)
+            if getattr(fn, "pure", False) and options.get("annotations") is None:
+                options["annotations"] = ToolAnnotations(readOnlyHint=True, idempotentHint=True)
+            return FastMCP.tool(self, *args, **options)(fn)
+        return decorator
+
+
+metrics.REGISTRY.describe("mcp_tool_call_seconds", "Time spent in each tool body, seen by the server")
+metrics.REGISTRY.describe("mcp_tool_call_total", "Tool calls by tool and status")
+metrics.REGISTRY.describe("tool_cache_total", "Pure tool lookups by tool and result: hit, disk_hit or miss")
+
+@asynccontextmanager
+async def server_lifespan(server):
+    """Stop the tool worker processes with the server, they exit on their own if it dies first"""
+    try:
+        yield {}
+    finally:
+        await tool_executor.shutdown()
+
 
 # instantiate an MCP server client
-mcp = FastMCP("Calculator")
+mcp = MeteredFastMCP("Calculator", lifespan=server_lifespan)
+
+# mspaint on Windows, in-memory Pillow canvas elsewhere (CANVAS_BACKEND overrides)
+canvas = make_canvas()
 
 # DEFINE TOOLS
 
@@ -41,172 +87,14 @@ def show_reasoning(steps: list) -> TextContent:
         text="Reasoning shown"
     )
 
-@mcp.tool()
-def calculate(expression: str) -> TextContent:
-    """Calculate the result of an expression"""
-    mcp_server_logger.info("FUNCTION CALL: calculate()")
-    mcp_server_logger.info(f"Expression: {expression}")
-    try:
-        result = eval(expression)
-        mcp_server_logger.info(f"Result: {result}")
-        return TextContent(
-            type="text",
-            text=str(result)
-        )
-    except Exception as e:
-        mcp_server_logger.info(f"Error: {str(e)}")
-        return TextContent(
-            type="text",
-            text=f"Error: {str(e)}"
-        )
-
-@mcp.tool()
-def verify(expression: str, expected: float) -> TextContent:
-    """Verify if a calculation is correct"""
-    mcp_server_logger.info("FUNCTION CALL: verify()")
-    mcp_server_logger.info(f"Verifying: {expression} = {expected}")
-    try:
-        actual = float(eval(expression))
-        is_correct = abs(actual - float(expected)) < 1e-10
-        
-        if is_correct:
-            mcp_server_logger.info(f"✓ Correct! {expression} = {expected}")
-        else:
-            mcp_server_logger.info(f"✗ Incorrect! {expression} should be {actual}, got {expected}")
-            
-        return TextContent(
-            type="text",
-            text=str(is_correct)
-        )
-    except Exception as e:
-        mcp_server_logger.info(f"Error: {str(e)}")
-        return TextContent(
-            type="text",
-            text=f"Error: {str(e)}"
-        )
-
-@mcp.tool()
-def check_consistency(steps: list) -> TextContent:
-    """Check if calculation steps are consistent with each other"""
-    mcp_server_logger.info("FUNCTION CALL: check_consistency()")
-    
-    try:
-        # Create a table for step analysis
-        infos = []
-        issues = []
-        warnings = []
-        insights = []
-        previous = None
-        
-        for i, (expression, result) in enumerate(steps, 1):
-            checks = []
-            
-            # 1. Basic Calculation Verification
-            try:
-                expected = eval(expression)
-                if abs(float(expected) - float(result)) < 1e-10:
-                    checks.append("✓ Calculation verified")
-                else:
-                    issues.append(f"Step {i}: Calculation mismatch")
-                    checks.append("✗ Calculation error")
-            except:
-                warnings.append(f"Step {i}: Couldn't verify calculation")
-                checks.append("! Verification failed")
-
-            # 2. Dependency Analysis
-            if previous:
-                prev_expr, prev_result = previous
-                if str(prev_result) in expression:
-                    checks.append("✓ Uses previous result")
-                    insights.append(f"Step {i} builds on step {i-1}")
-                else:
-                    checks.append("○ Independent step")
-
-            # 3. Magnitude Check
-            if previous and result != 0 and previous[1] != 0:
-                ratio = abs(result / previous[1])
-                if ratio > 1000:
-                    warnings.append(f"Step {i}: Large increase ({ratio:.2f}x)")
-                    checks.append("! Large magnitude increase")
-                elif ratio < 0.001:
-                    warnings.append(f"Step {i}: Large decrease ({1/ratio:.2f}x)")
-                    checks.append("! Large magnitude decrease")
-
-            # 4. Pattern Analysis
-            operators = re.findall(r'[\+\-\*\/\(\)]', expression)
-            if '(' in operators and ')' not in operators:
-                warnings.append(f"Step {i}: Mismatched parentheses")
-                checks.append("✗ Invalid parentheses")
-
-            # 5. Result Range Check
-            if abs(result) > 1e6:
-                warnings.append(f"Step {i}: Very large result")
-                checks.append("! Large result")
-            elif abs(result) < 1e-6 and result != 0:
-                warnings.append(f"Step {i}: Very small result")
-                checks.append("! Small result")
-
-            # Add row to table
-            infos.append(
-                f"Step {i}" +
-                expression +
-                f"{result}" +
-                "\n".join(checks)
-            )
-            
-            previous = (expression, result)
-
-        # Display Analysis
-        mcp_server_logger.info("\nConsistency Analysis Report")
-        mcp_server_logger.info("\n".join(infos))
-
-        if issues:
-            mcp_server_logger.info(
-                "\n".join(f"• {issue}" for issue in issues)
-            )
-
-        if warnings:
-            mcp_server_logger.info(
-                "\n".join(f"• {warning}" for warning in warnings),
-            )
-
-        if insights:
-            mcp_server_logger.info(
-                "\n".join(f"• {insight}" for insight in insights),
-            )
-
-        # Final Consistency Score
-        total_checks = len(steps) * 5  # 5 types of checks per step
-        passed_checks = total_checks - (len(issues) * 2 + len(warnings))
-        consistency_score = (passed_checks / total_checks) * 100
-
-        mcp_server_logger.info(
-            f"[bold]Consistency Score: {consistency_score:.1f}%[/bold]\n" +
-            f"Passed Checks: {passed_checks}/{total_checks}\n" +
-            f"Critical Issues: {len(issues)}\n" +
-            f"Warnings: {len(warnings)}\n" +
-            f"Insights: {len(insights)}"
-        )
-
-        return TextContent(
-            type="text",
-            text=str({
-                "consistency_score": consistency_score,
-                "issues": issues,
-                "warnings": warnings,
-                "insights": insights
-            })
-        )
-    except Exception as e:
-        mcp_server_logger.info(f"Error in consistency check: {str(e)}")
-        return TextContent(
-            type="text",
-            text=f"Error: {str(e)}"
-        )
-
+# CPU bound tools run in worker processes, their code is in cpu_tools.py
+mcp.tool()(pure(cpu_tools.calculate))
+mcp.tool()(pure(cpu_tools.verify))
+mcp.tool()(cpu_tools.check_consistency)
 
 #addition tool
 @mcp.tool()  
+@pure
 def add(a: int, b: int) -> int:
     """Add two numbers"""
     mcp_server_logger.info("CALLED: add(a: int, b: int) -> int:")
@@ -227,6 +115,7 @@ def subtract(a: int, b: int) -> int:
 
 # multiplication tool
 @mcp.tool()
+@pure
 def multiply(a: int, b: int) -> int:
     """Multiply two numbers"""
     mcp_server_logger.info("CALLED: multiply(a: int, b: int) -> int:")
@@ -240,11 +129,7 @@ def divide(a: int, b: int) -> float:
     return float(a / b)
 
 # power tool
-@mcp.tool()
-def power(a: int, b: int) -> int:
-    """Power of two numbers"""
-    mcp_server_logger.info("CALLED: power(a: int, b: int) -> int:")
-    return int(a ** b)
+mcp.tool()(pure(cpu_tools.power))
 
 # square root tool
 @mcp.tool()
@@ -261,11 +146,7 @@ def cbrt(a: int) -> float:
     return float(a ** (1/3))
 
 # factorial tool
-@mcp.tool()
-def factorial(a: int) -> int:
-    """factorial of a number"""
-    mcp_server_logger.info("CALLED: factorial(a: int) -> int:")
-    return int(math.factorial(a))
+mcp.tool()(pure(cpu_tools.factorial))
 
 # log tool
 @mcp.tool()
@@ -310,49 +191,55 @@ def mine(a: int, b: int) -> int:
     return int(a - b - b)
 
 @mcp.tool()
-def create_thumbnail(image_path: str) -> Image:
-    """Create a thumbnail from an image"""
-    mcp_server_logger.info("CALLED: create_thumbnail(image_path: str) -> Image:")
-    img = PILImage.open(image_path)
-    img.thumbnail((100, 100))
-    return Image(data=img.tobytes(), format="png")
+@offload("io", timeout=30)
+def create_thumbnail(image_path: str, size: int = 100, format: str = "png") -> Image:
+    """Create a thumbnail (at most size x size pixels) from an image, encoded as png, webp or jpeg"""
+    mcp_server_logger.info("CALLED: create_thumbnail(image_path: str, size: int, format: str) -> Image:")
+    data = thumbnails.make_thumbnail(image_path, (size, size), format)
+    return Image(data=data, format=format)
+
+@mcp.tool()
+@offload("io", timeout=120)
+def create_thumbnails(paths: list, size: int = 100, format: str = "png") -> list:
+    """Create thumbnails for many images (or every image in a folder) in parallel"""
+    mcp_server_logger.info("CALLED: create_thumbnails(paths: list, size: int, format: str) for %s paths", len(paths))
+    results = []
+    for path, data, error in thumbnails.make_thumbnails(paths, (size, size), format):
+        if error:
+            results.append(TextContent(type="text", text=f"{path}: Error: {error}"))
+        else:
+            results.append(TextContent(type="text", text=path))
+            results.append(Image(data=data, format=format))
+    return results
 
 @mcp.tool()
+@pure
 def strings_to_chars_to_int(string: str) -> list[int]:
     """Return the ASCII values of the characters in a word"""
     mcp_server_logger.info("CALLED: strings_to_chars_to_int(string: str) -> list[int]:")
     return [int(ord(char)) for char in string]
 
-@mcp.tool()
-def int_list_to_exponential_sum(int_list: list) -> float:
-    """Return sum of exponentials of numbers in a list"""
-    mcp_server_logger.info("CALLED: int_list_to_exponential_sum(int_list: list) -> float:")
-    return sum(math.exp(i) for i in int_list)
+mcp.tool()(pure(cpu_tools.int_list_to_exponential_sum))
 
-@mcp.tool()
-def int_list_to_power_sum(int_list: list) -> float:
-    """Return sum of powers of numbers in a list"""
-    mcp_server_logger.info("CALLED: int_list_to_power_sum(int_list: list) -> float:")
-    return sum(i ** 2 for i in int_list)
+mcp.tool()(pure(cpu_tools.int_list_to_power_sum))
 
-@mcp.tool()
-def fibonacci_numbers(n: int) -> list:
-    """Return the first n Fibonacci Numbers"""
-    mcp_server_logger.info("CALLED: fibonacci_numbers(n: int) -> list:")
-    if n <= 0:
-        return []
-    fib_sequence = [0, 1]
-    for _ in range(2, n):
-        fib_sequence.append(fib_sequence[-1] + fib_sequence[-2])
-    return fib_sequence[:n]
+mcp.tool()(cpu_tools.text_to_power_sum)
+mcp.tool()(pure(cpu_tools.fibonacci_numbers))
+mcp.tool()(pure(cpu_tools.fibonacci_nth))
+mcp.tool()(pure(cpu_tools.fibonacci_range))
+
+# batch tools, one call works on a whole array instead of one number per round-trip
+mcp.tool()(cpu_tools.batch_apply)
+mcp.tool()(cpu_tools.batch_unary)
+mcp.tool()(cpu_tools.batch_reduce)
 
 
 @mcp.tool()
-async def draw_rectangle(x1: int, y1: int, x2: int, y2: int) -> dict:
+@offload("io", timeout=60)
+def draw_rectangle(x1: int, y1: int, x2: int, y2: int) -> dict:
     """Draw a rectangle in Paint from (x1,y1) to (x2,y2)"""
-    global paint_app
     try:
-        if not paint_app:
+        if not canvas.is_open():
             return {
                 "content": [
                     TextContent(
@@ -361,81 +248,8 @@ async def draw_rectangle(x1: int, y1: int, x2: int, y2: int) -> dict:
                     )
                 ]
             }
-        
-        # Get the Paint window
-        paint_window = paint_app.window(class_name='MSPaintApp')
-        
-        # Get primary monitor width to adjust coordinates
-        # primary_width = GetSystemMetrics(0)
-        # print(primary_width)
-        
-        # Ensure Paint window is active
-        if not paint_window.has_focus():
-            paint_window.set_focus()
-            time.sleep(1.5)
-        
-        # paint_window.type_keys('r')  # Select rectangle tool 
-        # paint_window.type_keys('r')  # Select rectangle tool
-        # time.sleep(0.8)
-        # Click on the Rectangle tool using the correct coordinates for secondary screen
-
-        paint_window.click_input(coords=(661, 102 ))
-        time.sleep(1.9)
-        
-
-        
-        # print({"message": "input clicked"})
-
-        # Get the canvas area
-        canvas = paint_window.child_window(class_name='MSPaintView')
-
-        # paint_window.click_input(coords=(607, 102 ))
-        # time.sleep(1.9)
-
-        canvas_rect = canvas.rectangle()
-        # print(canvas_rect)
-        # Draw within canvas bounds
-
-        canvas.press_mouse_input(coords=(x1, y1))
-        time.sleep(1.9)
-
-        # start = (canvas_rect.left + 607, canvas_rect.top + 425)
-        # end = (canvas_rect.left + 940, canvas_rect.top + 619)
-
-
-        # canvas.press_mouse_input(coords=start)
-        # time.sleep(0.3)
-        # canvas.move_mouse_input(coords=end)
-        # time.sleep(0.3)
-        # canvas.release_mouse_input(coords=end)
-        # sys.stdout.flush()
-
-        # # Use relative coordinates within canvas
-        canvas.press_mouse_input(coords=(x1, y1))
-        time.sleep(1.9)
-        canvas.move_mouse_input(coords=(x2, y2))
-        time.sleep(1.9)
-        canvas.release_mouse_input(coords=(x2, y2))
-        time.sleep(1.9)
-
-        # 607, 425, 940, 619
-        # 780|380|1140|700
-        # canvas.press_mouse_input(coords=(x1+607, y1+425))
-        # canvas.move_mouse_input(coords=(x2+940, y2+619))
-        # canvas.release_mouse_input(coords=(x2+940, y2+619))
-
-        # canvas.drag_input(coords=(x1+607, y1+425), end_coords=(x2+940, y2+619))
-        
-        # Draw rectangle - coordinates should already be relative to the Paint window
-        # No need to add primary_width since we're clicking within the Paint window
-        # 495,278
-        # 976,634
-        # canvas.press_mouse_input(coords=(x1, y1))
-        # canvas.move_mouse_input(coords=(x2, y2))
-        # canvas.release_mouse_input(coords=(x2, y2))
-
-        # print({"input": [x1,y1,x2,y2, "select corrdinates"]})
-        # sys.stdout.flush()
+
+        canvas.apply([{"op": "rect", "x1": x1, "y1": y1, "x2": x2, "y2": y2}])
         return {
             "content": [
                 TextContent(
@@ -455,11 +269,11 @@ async def draw_rectangle(x1: int, y1: int, x2: int, y2: int) -> dict:
         }
 
 @mcp.tool()
-async def add_text_in_paint(text: str) -> dict:
+@offload("io", timeout=60)
+def add_text_in_paint(text: str) -> dict:
     """Add text in Paint"""
-    global paint_app
     try:
-        if not paint_app:
+        if not canvas.is_open():
             return {
                 "content": [
                     TextContent(
@@ -468,40 +282,8 @@ async def add_text_in_paint(text: str) -> dict:
                     )
                 ]
             }
-        
-        # Get the Paint window
-        paint_window = paint_app.window(class_name='MSPaintApp')
-        
-        # Ensure Paint window is active
-        if not paint_window.has_focus():
-            paint_window.set_focus()
-            time.sleep(0.5)
-        
-        # Click on the Rectangle tool
-        # paint_window.click_input(coords=(528, 92))
-        # time.sleep(0.5)
-        
-        # Get the canvas area
-        canvas = paint_window.child_window(class_name='MSPaintView')
-        
-        # Select text tool using keyboard shortcuts
-        paint_window.type_keys('t')
-        time.sleep(0.5)
-        paint_window.type_keys('x')
-        time.sleep(0.5)
-        
-        # Click where to start typing
-        canvas.click_input(coords=(627, 435))
-        time.sleep(1.5)
-        
-        # Type the text passed from client
-        paint_window.type_keys(text)
-        time.sleep(1.5)
-        
-        # Click to exit text mode
-        canvas.click_input(coords=(827, 435))
-        time.sleep(1.5)
 
+        canvas.apply([{"op": "text", "text": text}])
         return {
             "content": [
                 TextContent(
@@ -521,38 +303,16 @@ async def add_text_in_paint(text: str) -> dict:
         }
 
 @mcp.tool()
-async def open_paint() -> dict:
-    """Open Microsoft Paint maximized on primary monitor"""
-    global paint_app
+@offload("io", timeout=30)
+def open_paint() -> dict:
+    """Open Microsoft Paint maximized on primary monitor (an in-memory canvas on servers without Paint)"""
     try:
-        paint_app = Application().start('mspaint.exe')
-        time.sleep(0.2)
-        
-        # Get the Paint window
-        paint_window = paint_app.window(class_name='MSPaintApp')
-        
-        # Get primary monitor width
-        # primary_width = GetSystemMetrics(0)
-        primary_width = 0
-        
-        # First move to secondary monitor without specifying size
-        win32gui.SetWindowPos(
-            paint_window.handle,
-            win32con.HWND_TOP,
-            primary_width + 1, 0,  # Position it on secondary monitor
-            0, 0,  # Let Windows handle the size
-            win32con.SWP_NOSIZE  # Don't change the size
-        )
-        
-        # Now maximize the window
-        win32gui.ShowWindow(paint_window.handle, win32con.SW_MAXIMIZE)
-        time.sleep(0.2)
-        
+        canvas.open()
         return {
             "content": [
                 TextContent(
                     type="text",
-                    text="Paint opened successfully on primary monitor and maximized"
+                    text=f"Paint opened successfully ({canvas.name} canvas)"
                 )
             ]
         }
@@ -565,38 +325,46 @@ async def open_paint() -> dict:
                 )
             ]
         }
-# DEFINE RESOURCES
 
 @mcp.tool()
-async def send_email(text: str) -> dict:
-    """Send email with the text content"""
-    try:
+@offload("io", timeout=60)
+def draw_batch(ops: list) -> Image:
+    """Run many drawing ops in one call and return the canvas as PNG. Each op is a dict: {"op": "rect", "x1", "y1", "x2", "y2", "color", "width", "fill"}, {"op": "text", "text", "x", "y", "color", "size"}, {"op": "line", "x1", "y1", "x2", "y2", "color", "width"} or {"op": "fill", "color", "x", "y"}"""
+    mcp_server_logger.info("CALLED: draw_batch(ops: list) with %s ops", len(ops))
+    if not canvas.is_open():
+        canvas.open()
+    canvas.apply(ops)
+    png = canvas.snapshot()
+    if png is None:
+        raise ValueError(f"The {canvas.name} canvas cannot return an image")
+    return Image(data=png, format="png")
 
-        # Gmail account details
-        sender_email = "inocajith21.5@gmail.com"
-        receiver_email = "inocajith21.5@gmail.com"
-
-        # Create email
-        msg = MIMEMultipart()
-        msg["From"] = sender_email
-        msg["To"] = receiver_email
-        msg["Subject"] = "EAG V1 Assignment 5 Result"
+@mcp.tool()
+def paint_step_timings() -> dict:
+    """Per UI step timing histogram of the Paint automation waits"""
+    mcp_server_logger.info("CALLED: paint_step_timings() -> dict:")
+    return step_histogram()
 
-        # Body of the email
-        body = f"Hello, this is final answer to your question: {text}"
-        msg.attach(MIMEText(body, "plain"))
+@mcp.tool()
+def tool_cache_stats() -> dict:
+    """Hits, misses and hit rate per pure tool, plus the result cache size"""
+    mcp_server_logger.info("CALLED: tool_cache_stats() -> dict:")
+    return tool_cache.CACHE.stats()
 
-        # Send email via Gmail's SMTP server
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
-            server.login(sender_email, g_app_password)
-            server.send_message(msg)
+# DEFINE RESOURCES
 
-        mcp_server_logger.info(f"Email sent successfully with content {text}")
+@mcp.tool()
+def send_email(text: str) -> dict:
+    """Queue an email with the text content to the configured recipients (MAIL_TO) and return its message id right away.
+    Delivery is confirmed by email_status, queued mail is still sent when the server exits"""
+    try:
+        message_id = mail_queue.send(text)
+        mcp_server_logger.info("Email %s queued with content %s", message_id, text)
         return {
             "content": [
                 TextContent(
                     type="text",
-                    text="Email sent successfully!"
+                    text=f"Email queued with message id {message_id}"
                 )
             ]
         }
@@ -610,6 +378,19 @@ async def send_email(text: str) -> dict:
             ]
         }
 
+@mcp.tool()
+def email_status(message_id: str) -> dict:
+    """Delivery status of a queued email: queued, sending, retrying, sent or failed"""
+    mcp_server_logger.info("CALLED: email_status(message_id: str) -> dict:")
+    return mail_queue.status(message_id)
+
+# Tool latency metrics for the client or a scraper
+@mcp.resource("metrics://server")
+def get_metrics() -> str:
+    """Per tool call counts and latency histograms in Prometheus text format"""
+    mcp_server_logger.info("CALLED: get_metrics() -> str:")
+    return metrics.render()
+
 # Add a dynamic greeting resource
 @mcp.resource("greeting://{name}")
 def get_greeting(name: str) -> str:
@@ -636,6 +417,8 @@ def debug_error(error: str) -> list[base.Message]:
 if __name__ == "__main__":
     # Check if running with mcp dev command
     print("STARTING")
+    # The client sends SIGTERM if the server is still flushing mail after stdin closed, exit through atexit
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
     if len(sys.argv) > 1 and sys.argv[1] == "dev":
         mcp.run()  # Run without transport for dev server
     else:
@@ -0,0 +1,192 @@
+import random
+import threading
+from PIL import Image as PILImage, ImageDraw
+
+
+class _Later:
+    """Runs UI state changes after a random delay, like a real window redrawing"""
+
+    def __init__(self, min_delay, max_delay):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+
+    def __call__(self, func):
+        timer = threading.Timer(random.uniform(self.min_delay, self.max_delay), func)
+        timer.daemon = True
+        timer.start()
+
+
+class SimulatedCanvas:
+    """Stand-in for the MSPaintView control"""
+
+    def __init__(self, window, later):
+        self.window = window
+        self.later = later
+        self.image = PILImage.new("RGB", (1280, 720), "white")
+        self.lock = threading.Lock()
+        self.press = None
+        self.text_box = None
+
+    def exists(self):
+        return True
+
+    def capture_as_image(self):
+        with self.lock:
+            return self.image.copy()
+
+    def _draw(self, func):
+        def apply():
+            with self.lock:
+                func(ImageDraw.Draw(self.image))
+        self.later(apply)
+
+    def press_mouse_input(self, coords):
+        self.press = coords
+
+    def move_mouse_input(self, coords):
+        pass
+
+    def release_mouse_input(self, coords):
+        if self.window.tool == "rectangle" and self.press:
+            (x1, y1), (x2, y2) = self.press, coords
+            box = [min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)]
+            self._draw(lambda d: d.rectangle(box, outline="black", width=2))
+        self.press = None
+
+    def click_input(self, coords):
+        if self.window.tool != "text":
+            return
+        if self.text_box is None:
+            # First click opens a text box with a dashed border
+            x, y = coords
+            self.text_box = [x - 2, y - 2, x + 180, y + 30]
+            box = self.text_box
+            self._draw(lambda d: d.rectangle(box, outline=(0, 120, 215)))
+        else:
+            # Clicking outside commits the text and removes the border
+            box = self.text_box
+            self.text_box = None
+            self.window.tool = None
+            self._draw(lambda d: d.rectangle(box, outline="white"))
+
+    def type_text(self, text):
+        if self.text_box:
+            x, y = self.text_box[0] + 4, self.text_box[1] + 4
+            self._draw(lambda d: d.text((x, y), text, fill="black"))
+
+
+class SimulatedWindow:
+    """Stand-in for the MSPaintApp window wrapper (the pywinauto methods the canvas uses)"""
+
+    handle = 1
+
+    def __init__(self, later):
+        self.later = later
+        self.visible = False
+        self.maximized = False
+        self.focused = False
+        self.tool = None
+        self.pending_keys = ""
+        # Key presses and clicks not processed yet, the window reacts to them after a delay.
+        # Timer threads handle them, so the count is only changed under input_lock
+        self.pending_input = 0
+        self.input_lock = threading.Lock()
+        self.canvas = SimulatedCanvas(self, later)
+        self.later(self._show)
+
+    def _show(self):
+        self.visible = True
+        self.focused = True
+
+    def exists(self):
+        return True
+
+    def is_visible(self):
+        return self.visible
+
+    def is_maximized(self):
+        return self.maximized
+
+    def has_focus(self):
+        return self.focused
+
+    def set_focus(self):
+        self.later(lambda: setattr(self, "focused", True))
+
+    def _input(self, func):
+        # Like the real window, input is handled asynchronously and each event after its own delay,
+        # so two events sent back to back may be handled in either order
+        with self.input_lock:
+            self.pending_input += 1
+
+        def handle():
+            func()
+            with self.input_lock:
+                self.pending_input -= 1
+        self.later(handle)
+
+    def click_input(self, coords):
+        # (661, 102) is the rectangle tool in the ribbon
+        if coords == (661, 102):
+            self._input(lambda: setattr(self, "tool", "rectangle"))
+
+    def type_keys(self, keys):
+        if self.canvas.text_box:
+            self.canvas.type_text(keys)
+            return
+        self._input(lambda: self._shortcut(keys))
+
+    def _shortcut(self, keys):
+        # 't' then 'x' is the keyboard shortcut for the text tool
+        self.pending_keys = (self.pending_keys + keys)[-2:]
+        if self.pending_keys == "tx":
+            self.tool = "text"
+
+    def child_window(self, class_name):
+        return self.canvas
+
+
+class SimulatedApp:
+    def __init__(self, later):
+        self.main_window = SimulatedWindow(later)
+
+    def window(self, class_name):
+        return self.main_window
+
+
+class SimulatedPaintDriver:
+    """Driver for MSPaintCanvas that needs no Windows, every UI reaction takes min_delay..max_delay seconds"""
+
+    def __init__(self, min_delay=0.005, max_delay=0.05):
+        self.later = _Later(min_delay, max_delay)
+
+    def start(self):
+        return SimulatedApp(self.later)
+
+    def place_window(self, paint_window):
+        self.later(lambda: setattr(paint_window, "maximized", True))
+
+    def tool_selected(self, paint_window, tool):
+        return paint_window.tool == tool
+
+    def input_idle(self, paint_window):
+        with paint_window.input_lock:
+            return paint_window.pending_input == 0
+
+
+if __name__ == "__main__":
+    # Run the INDIA drawing steps against the simulated window and compare with the old fixed sleeps
+    import time
+    from canvas import MSPaintCanvas
+    from ui_wait import step_histogram
+
+    canvas = MSPaintCanvas(driver=SimulatedPaintDriver())
+    start = time.perf_counter()
+    canvas.open()
+    canvas.rectangle(607, 425, 940, 619)
+    canvas.text("25591")
+    elapsed = time.perf_counter() - start
+    for step, stats in step_histogram().items():
+        print(f"{step:18} count={stats['count']} total={stats['total']:.3f}s max={stats['max']:.3f}s")
+    # open_paint 0.4s, draw_rectangle up to 11s, add_text_in_paint 6s of sleeps before
+    print(f"event driven: {elapsed:.3f}s, fixed sleeps: 17.4s")
@@ -0,0 +1,280 @@
+import re
+import time
+import asyncio
+from functools import lru_cache
+from logger import client_logger
+from conversation import ConversationState
+from tool_calls import validate_calls, run_calls
+from json_extract import JSONExtractError
+from talk2mcp import AgentRun, generate_with_timeout, parse_llm_json, token_budget, complete_after_email
+import metrics
+import tracing
+
+# LLM calls per run: the first plan plus at most this many replans
+MAX_REPLANS = 2
+
+# "$s1" or "$s1.0.name" as a whole value keeps the output's type, "${s1}" inside a string is replaced by its text
+REF = re.compile(r"^\$([A-Za-z_]\w*)((?:\.\w+)*)$")
+INLINE_REF = re.compile(r"\$\{([A-Za-z_]\w*)((?:\.\w+)*)\}")
+
+
+class PlanError(ValueError):
+    """The model's plan cannot run: unknown tool, schema mismatch, bad $ref or a dependency cycle"""
+
+
+@lru_cache(maxsize=8)
+def build_plan_prompt(tools_description):
+    """System prompt for plan mode, reused while the tool list is unchanged"""
+    return f"""You are a mathematical reasoning agent. Plan the whole solution up front as tool calls, they are run for you.
+Available tools:
+{tools_description}
+
+Respond with EXACTLY ONE line of JSON in one of these formats:
+1. {{"message_type": "PLAN", "steps": [{{"id": "s1", "name": function_name, "params": {{"param1": value1, ...}}, "depends_on": ["s0"]}}, ...], "final_answer": "$s1"}}
+2. {{"message_type": "FINAL_ANSWER", "name": "result", "params": "answer"}}
+
+Rules:
+- A parameter value "$s1" is replaced by the output of step s1, "$s1.0" by its first item, and "${{s1}}" inside a longer string by its text
+- Steps run in parallel as soon as the steps they reference are done. Use "depends_on" for order without data, e.g. draw only after opening paint
+- Show the reasoning steps and verify the results as part of the plan
+- final_answer is usually a $ref to the step holding the answer
+- If you are given the results of an earlier plan, plan only the steps that did not complete, with new step ids. You can reference completed steps
+- Incase if you are not able to answer tell `I dont have the capability for it, check the tools description`
+
+Example:
+User: Show reasonings, find the ASCII values of AB and the sum of their squares, then verify it
+Assistant: {{"message_type": "PLAN", "steps": [{{"id": "s1", "name": "show_reasoning", "params": {{"steps": ["1. [Lookup] ASCII values of AB", "2. [Arithmetic] Sum of their squares", "3. [Logic] Verify the sum"]}}}}, {{"id": "s2", "name": "strings_to_chars_to_int", "params": {{"string": "AB"}}}}, {{"id": "s3", "name": "int_list_to_power_sum", "params": {{"int_list": "$s2"}}}}, {{"id": "s4", "name": "verify", "params": {{"expression": "65**2 + 66**2", "expected": "$s3"}}}}], "final_answer": "$s3"}}"""
+
+
+def find_refs(value):
+    """Step ids referenced anywhere in a param value"""
+    if isinstance(value, str):
+        match = REF.match(value)
+        if match:
+            return {match.group(1)}
+        return {m.group(1) for m in INLINE_REF.finditer(value)}
+    if isinstance(value, dict):
+        return set().union(*(find_refs(v) for v in value.values())) if value else set()
+    if isinstance(value, list):
+        return set().union(*(find_refs(v) for v in value)) if value else set()
+    return set()
+
+
+def _lookup(values, step_id, path):
+    if step_id not in values:
+        raise PlanError(f"${step_id}{path}: step {step_id} has no output")
+    value = values[step_id]
+    for part in path.split(".")[1:]:
+        try:
+            value = value[int(part)] if isinstance(value, list) else value[part]
+        except (KeyError, IndexError, TypeError, ValueError):
+            raise PlanError(f"${step_id}{path}: the output of {step_id} has no item {part}") from None
+    return value
+
+
+def resolve(value, values):
+    """Replace $refs in a param value with step outputs, raises PlanError for a ref the outputs do not have"""
+    if isinstance(value, str):
+        match = REF.match(value)
+        if match:
+            return _lookup(values, match.group(1), match.group(2))
+        return INLINE_REF.sub(lambda m: str(_lookup(values, m.group(1), m.group(2))), value)
+    if isinstance(value, dict):
+        return {k: resolve(v, values) for k, v in value.items()}
+    if isinstance(value, list):
+        return [resolve(v, values) for v in value]
+    return value
+
+
+def compile_plan(plan, registry, completed=()):
+    """Validate a PLAN message against the tool schemas and turn it into calls for run_calls.
+    completed holds the ids of steps finished by earlier plans, they can be referenced but not reused."""
+    steps = plan.get("steps")
+    if not isinstance(steps, list) or not steps:
+        raise PlanError("steps must be a non-empty list")
+    ids = {str(step.get("id")) for step in steps if isinstance(step, dict)}
+    reused = sorted(ids & set(completed))
+    if reused:
+        raise PlanError(f"Step ids {', '.join(reused)} were used by an earlier plan")
+
+    calls = []
+    for i, step in enumerate(steps):
+        if not isinstance(step, dict) or "name" not in step:
+            raise PlanError(f"Step {i} needs a name")
+        step_id = str(step.get("id", f"s{i + 1}"))
+        params = step.get("params") or {}
+        if not isinstance(params, dict):
+            raise PlanError(f"Step {step_id}: params must be an object")
+        refs = find_refs(params)
+        unknown = sorted(refs - ids - set(completed))
+        if unknown:
+            raise PlanError(f"Step {step_id} references unknown step {', '.join(unknown)}")
+        try:
+            registry.validate(step["name"], params, placeholders={k for k, v in params.items() if find_refs(v)})
+        except ValueError as e:
+            raise PlanError(f"Step {step_id}: {e}") from None
+        depends_on = step.get("depends_on") or []
+        if isinstance(depends_on, str):
+            depends_on = [depends_on]
+        # Data dependencies are implied by the refs, steps of earlier plans are already done
+        depends_on = sorted((set(map(str, depends_on)) | refs) - set(completed))
+        calls.append({"id": step_id, "name": step["name"], "params": params, "depends_on": depends_on})
+
+    final_refs = find_refs(plan.get("final_answer"))
+    if final_refs - ids - set(completed):
+        raise PlanError(f"final_answer references unknown step {', '.join(sorted(final_refs - ids))}")
+    try:
+        return validate_calls(calls)
+    except ValueError as e:
+        raise PlanError(str(e)) from None
+
+
+def describe_results(results):
+    lines = []
+    for entry in results:
+        if entry["status"] == "ok":
+            lines.append(f"{entry['id']}: {entry['name']} with {entry['arguments']} returned {entry['result']}")
+        else:
+            lines.append(f"{entry['id']}: {entry['name']} {entry['status']}: {entry['error']}")
+    return "\n".join(lines)
+
+
+async def run_plan_agent(session, registry, query, backend, run_id=0, max_replans=MAX_REPLANS):
+    """Ask for a whole plan, run it locally with maximum parallelism, go back to the model only to replan"""
+    run = AgentRun(query, run_id=run_id)
+    # The span also ends when the run is cancelled or raises
+    with tracing.span("agent_run", run_id=run_id, query=query, mode="plan") as root_span:
+        run.trace_id = root_span.trace_id
+        conversation = ConversationState(build_plan_prompt(registry.description), query, token_budget=token_budget)
+        run.conversation = conversation
+        # Outputs of completed steps of every plan so far, for $refs
+        values = {}
+
+        def prepare(call, results):
+            # Earlier plans' outputs plus the steps of this plan finished so far
+            current = dict(values)
+            current.update((step_id, entry["value"]) for step_id, entry in results.items() if entry["status"] == "ok")
+            return resolve(call["params"], current)
+
+        while run.iteration <= max_replans:
+            with metrics.timer("agent_iteration"), tracing.span("plan", attempt=run.iteration + 1):
+                client_logger.info("\n--- [run %s] Plan %s ---", run_id, run.iteration + 1)
+                try:
+                    content = await generate_with_timeout(backend, conversation.build_prompt())
+                except Exception as e:
+                    client_logger.info("Failed to get LLM response: %s", e)
+                    run.status = "llm_error"
+                    run.error = str(e)
+                    break
+                run.iteration += 1
+
+                try:
+                    response_json = parse_llm_json(content)
+                except JSONExtractError as e:
+                    client_logger.info("Unusable LLM response: %s", e.to_dict())
+                    metrics.inc("llm_parse_errors_total", kind=e.kind)
+                    run.error = str(e)
+                    conversation.add_turn(f"Your response could not be used: {e}. Send the PLAN as one JSON line.")
+                    continue
+
+                if response_json.get("message_type") == "FINAL_ANSWER":
+                    run.final_answer = response_json.get("params", response_json.get("result"))
+                    run.status = "completed"
+                    run.error = None
+                    break
+                if response_json.get("message_type") != "PLAN":
+                    conversation.add_turn("Reply with a PLAN or FINAL_ANSWER message.")
+                    continue
+
+                try:
+                    calls = compile_plan(response_json, registry, completed=values)
+                except PlanError as e:
+                    client_logger.info("[run %s] Invalid plan: %s", run_id, e)
+                    run.error = str(e)
+                    conversation.add_turn(f"Your plan could not run: {e}. Send a corrected PLAN.")
+                    continue
+
+                results = await run_calls(session, registry, calls, prepare=prepare, strict=True)
+                for entry in results:
+                    run.calls.append({"id": entry["id"], "name": entry["name"], "arguments": entry["arguments"],
+                                      "result": entry["result"], "error": entry["error"]})
+                    if entry["status"] == "ok":
+                        values[entry["id"]] = entry["value"]
+                        run.last_response = entry["iteration_result"]
+
+                failed = [entry for entry in results if entry["status"] != "ok"]
+                if not failed:
+                    final_answer = response_json.get("final_answer")
+                    try:
+                        answer = resolve(final_answer, values) if final_answer is not None else run.last_response
+                    except PlanError as e:
+                        client_logger.info("[run %s] Invalid final_answer: %s", run_id, e)
+                        run.error = str(e)
+                        conversation.add_turn(
+                            f"Plan {run.iteration} results:\n{describe_results(results)}\n"
+                            f"The final_answer could not be resolved: {e}. Send FINAL_ANSWER."
+                        )
+                        continue
+                    sent = [entry for entry in results if entry["name"] == "send_email"]
+                    run.status = "completed"
+                    run.error = None
+                    if sent:
+                        await complete_after_email(session, registry, run, sent[-1]["result"])
+                    run.final_answer = answer
+                    break
+
+                # Only failures cost another LLM call
+                run.error = "; ".join(f"{e['id']}: {e['error']}" for e in failed)
+                conversation.add_turn(
+                    f"Plan {run.iteration} results:\n{describe_results(results)}\n"
+                    "Send a new PLAN for the steps that did not complete, or FINAL_ANSWER."
+                )
+
+        if run.status == "running":
+            run.status = "max_iterations"
+        metrics.inc("agent_runs_total", status=run.status)
+        root_span.set("status", run.status)
+        root_span.set("iterations", run.iteration)
+        root_span.error = run.error if run.status != "completed" else None
+    return run
+
+
+if __name__ == "__main__":
+    # Same INDIA tool calls in both modes against the real server, with a simulated LLM latency:
+    # python planner.py [llm_latency_seconds] [runs]
+    import sys
+    from mcp import ClientSession
+    from mcp.client.stdio import stdio_client
+    from llm_backend import ScriptedBackend
+    from tool_registry import ToolRegistry
+    from session_pool import make_server_params
+    from talk2mcp import QUERY, run_agent
+
+    latency = float(sys.argv[1]) if len(sys.argv) > 1 else 0.5
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    async def bench():
+        server_params = make_server_params()
+        async with stdio_client(server_params) as (read, write):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                registry = ToolRegistry.for_tools((await session.list_tools()).tools)
+                modes = {
+                    "loop": ScriptedBackend.from_file("assets/llm_script.jsonl", latency),
+                    "plan": ScriptedBackend.from_file("assets/llm_plan_script.jsonl", latency),
+                }
+                # Warm up the server's worker pools so neither mode pays their start-up
+                await run_agent(session, registry, QUERY, modes["loop"].fork(), mode="loop")
+                for mode, backend in modes.items():
+                    elapsed, llm_calls, tool_calls = [], 0, 0
+                    for _ in range(runs):
+                        forked = backend.fork()
+                        start = time.perf_counter()
+                        run = await run_agent(session, registry, QUERY, forked, mode=mode)
+                        elapsed.append(time.perf_counter() - start)
+                        llm_calls += forked.calls
+                        tool_calls += len(run.calls)
+                    print(f"{mode}: {run.status}, answer {run.final_answer}, {llm_calls / runs:.1f} LLM calls, "
+                          f"{tool_calls / runs:.1f} tool calls, {sum(elapsed) / runs:.3f}s per run")
+
+    asyncio.run(bench())
@@ -0,0 +1,232 @@
+import ast
+import math
+import time
+import operator
+from functools import lru_cache
+
+# Limits so a single expression like 9**9**9 cannot hang the server
+MAX_INT_BITS = 100_000
+MAX_FACTORIAL = 5_000
+MAX_EXPRESSION_LENGTH = 1_000
+TIME_LIMIT = 0.5  # seconds per evaluation
+
+
+class UnsafeExpressionError(ValueError):
+    """Raised when an expression uses something outside the arithmetic whitelist"""
+
+
+class ExpressionLimitError(ValueError):
+    """Raised when an expression would exceed the size or time limits"""
+
+
+def _int_bits(value):
+    return value.bit_length() if isinstance(value, int) else 0
+
+
+def _check_size(value):
+    if isinstance(value, int) and value.bit_length() > MAX_INT_BITS:
+        raise ExpressionLimitError(f"Result is larger than {MAX_INT_BITS} bits")
+    return value
+
+
+def check_pow(base, exp):
+    """Raise ExpressionLimitError if the int base ** exp would be larger than MAX_INT_BITS, without computing it"""
+    if isinstance(base, int) and isinstance(exp, int) and exp > 0 and abs(base) > 1:
+        # base >= 2**(bits - 1), so the result has at least this many bits, _check_size catches the rest
+        if (_int_bits(base) - 1) * exp + 1 > MAX_INT_BITS:
+            raise ExpressionLimitError(f"{base} ** {exp} is larger than {MAX_INT_BITS} bits")
+
+
+def _safe_pow(base, exp):
+    # Estimate the result size before computing it
+    check_pow(base, exp)
+    return _check_size(operator.pow(base, exp))
+
+
+def _safe_lshift(a, b):
+    if isinstance(b, int) and _int_bits(a) + b > MAX_INT_BITS:
+        raise ExpressionLimitError(f"{a} << {b} is larger than {MAX_INT_BITS} bits")
+    return a << b
+
+
+def _safe_mul(a, b):
+    if isinstance(a, int) and isinstance(b, int) and _int_bits(a) + _int_bits(b) > MAX_INT_BITS:
+        raise ExpressionLimitError(f"Product is larger than {MAX_INT_BITS} bits")
+    # "x" * 10**9 or [1] * 10**9 would allocate gigabytes
+    for seq, count in ((a, b), (b, a)):
+        if isinstance(seq, (str, list)) and isinstance(count, int) and len(seq) * count > MAX_INT_BITS:
+            raise ExpressionLimitError("Repeated sequence is too long")
+    return a * b
+
+
+def _safe_factorial(n):
+    if n > MAX_FACTORIAL:
+        raise ExpressionLimitError(f"factorial is limited to n <= {MAX_FACTORIAL}")
+    return math.factorial(n)
+
+
+BINARY_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: _safe_mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: _safe_pow,
+    ast.LShift: _safe_lshift,
+    ast.RShift: operator.rshift,
+    ast.BitAnd: operator.and_,
+    ast.BitOr: operator.or_,
+    ast.BitXor: operator.xor,
+}
+
+UNARY_OPS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+    ast.Invert: operator.invert,
+}
+
+COMPARE_OPS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+}
+
+# Same math the server exposes as tools
+FUNCTIONS = {
+    "abs": abs,
+    "round": round,
+    "min": min,
+    "max": max,
+    "sum": sum,
+    "int": int,
+    "float": float,
+    "ord": ord,
+    "pow": _safe_pow,
+    "sqrt": math.sqrt,
+    "cbrt": lambda a: a ** (1 / 3),
+    "exp": math.exp,
+    "log": math.log,
+    "log10": math.log10,
+    "log2": math.log2,
+    "sin": math.sin,
+    "cos": math.cos,
+    "tan": math.tan,
+    "factorial": _safe_factorial,
+}
+
+CONSTANTS = {
+    "pi": math.pi,
+    "e": math.e,
+    "tau": math.tau,
+}
+
+
+def _compile(node):
+    """Turn a whitelisted AST node into a closure taking the evaluation deadline"""
+    if isinstance(node, ast.Expression):
+        return _compile(node.body)
+
+    if isinstance(node, ast.Constant):
+        if not isinstance(node.value, (int, float, complex, str)) or isinstance(node.value, bool):
+            raise UnsafeExpressionError(f"Unsupported constant: {node.value!r}")
+        value = node.value
+        return lambda deadline: value
+
+    if isinstance(node, ast.Name):
+        if node.id not in CONSTANTS:
+            raise UnsafeExpressionError(f"Unknown name: {node.id}")
+        value = CONSTANTS[node.id]
+        return lambda deadline: value
+
+    if isinstance(node, ast.BinOp):
+        op = BINARY_OPS.get(type(node.op))
+        if op is None:
+            raise UnsafeExpressionError(f"Unsupported operator: {type(node.op).__name__}")
+        left, right = _compile(node.left), _compile(node.right)
+
+        def binop(deadline):
+            a, b = left(deadline), right(deadline)
+            if time.perf_counter() > deadline:
+                raise ExpressionLimitError("Expression took too long to evaluate")
+            return op(a, b)
+        return binop
+
+    if isinstance(node, ast.UnaryOp):
+        op = UNARY_OPS.get(type(node.op))
+        if op is None:
+            raise UnsafeExpressionError(f"Unsupported operator: {type(node.op).__name__}")
+        operand = _compile(node.operand)
+        return lambda deadline: op(operand(deadline))
+
+    if isinstance(node, ast.Compare):
+        ops = []
+        for op_node in node.ops:
+            op = COMPARE_OPS.get(type(op_node))
+            if op is None:
+                raise UnsafeExpressionError(f"Unsupported comparison: {type(op_node).__name__}")
+            ops.append(op)
+        left = _compile(node.left)
+        comparators = [_compile(c) for c in node.comparators]
+
+        def compare(deadline):
+            a = left(deadline)
+            for op, comparator in zip(ops, comparators):
+                b = comparator(deadline)
+                if not op(a, b):
+                    return False
+                a = b
+            return True
+        return compare
+
+    if isinstance(node, ast.Call):
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS or node.keywords:
+            raise UnsafeExpressionError(f"Unsupported function call: {ast.dump(node.func)}")
+        func = FUNCTIONS[node.func.id]
+        args = [_compile(a) for a in node.args]
+
+        def call(deadline):
+            values = [a(deadline) for a in args]
+            if time.perf_counter() > deadline:
+                raise ExpressionLimitError("Expression took too long to evaluate")
+            return _check_size(func(*values))
+        return call
+
+    if isinstance(node, (ast.List, ast.Tuple)):
+        items = [_compile(e) for e in node.elts]
+        return lambda deadline: [item(deadline) for item in items]
+
+    raise UnsafeExpressionError(f"Unsupported syntax: {type(node).__name__}")
+
+
+@lru_cache(maxsize=1024)
+def compile_expression(expression):
+    """Parse and compile an expression once, later calls reuse the closure"""
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise ExpressionLimitError(f"Expression is longer than {MAX_EXPRESSION_LENGTH} characters")
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except SyntaxError as e:
+        raise UnsafeExpressionError(f"Invalid expression: {e.msg}") from None
+    return _compile(tree)
+
+
+def safe_eval(expression, time_limit=TIME_LIMIT):
+    """Evaluate an arithmetic expression without eval()"""
+    return compile_expression(expression)(time.perf_counter() + time_limit)
+
+
+if __name__ == "__main__":
+    # Benchmark against eval() on the kind of expressions the agent sends
+    import timeit
+    expressions = ["73**2 + 78**2 + 68**2 + 73**2 + 65**2", "(2 + 3) * 4", "sqrt(16) + log(10) * sin(pi / 2)"]
+    namespace = {**FUNCTIONS, **CONSTANTS}
+    for expression in expressions:
+        n = 20000
+        t_eval = timeit.timeit(lambda: eval(expression, {"__builtins__": {}}, namespace), number=n)
+        t_safe = timeit.timeit(lambda: safe_eval(expression), number=n)
+        print(f"{expression!r:45} eval: {t_eval / n * 1e6:7.2f} us  safe_eval: {t_safe / n * 1e6:7.2f} us")
+    print(compile_expression.cache_info())
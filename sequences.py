@@ -0,0 +1,139 @@
+import os
+import sys
+import math
+import shelve
+from contextlib import contextmanager
+from functools import lru_cache
+
+# Limits so one request cannot keep the server busy for seconds
+MAX_FIB_N = 1_000_000
+MAX_FACTORIAL_N = 100_000
+MAX_PAGE = 1_000
+# Integers longer than this are summarized instead of printed in full
+MAX_DIGITS = 4_000
+
+# Set SEQUENCE_MEMO_PATH to share computed values across server restarts
+MEMO_PATH = os.getenv("SEQUENCE_MEMO_PATH")
+# Only values that were expensive to compute are worth a disk round-trip
+PERSIST_MIN_N = 10_000
+
+
+def _check_n(n, limit, name):
+    if n < 0:
+        raise ValueError(f"{name} is not defined for negative numbers")
+    if n > limit:
+        raise ValueError(f"{name} is limited to n <= {limit}")
+
+
+@contextmanager
+def _memo_lock():
+    """Exclusive lock on MEMO_PATH.lock, every tool worker process opens the same shelve file"""
+    with open(MEMO_PATH + ".lock", "a+b") as f:
+        f.seek(0)
+        if sys.platform == "win32":
+            import msvcrt
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if sys.platform == "win32":
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _disk_memo(kind, n, compute):
+    if not MEMO_PATH or n < PERSIST_MIN_N:
+        return compute(n)
+    key = f"{kind}:{n}"
+    with _memo_lock(), shelve.open(MEMO_PATH) as db:
+        if key in db:
+            return db[key]
+    # Computed outside the lock, two workers may both compute n but never write at the same time
+    value = compute(n)
+    with _memo_lock(), shelve.open(MEMO_PATH) as db:
+        db[key] = value
+    return value
+
+
+def fib_pair(n):
+    """(F(n), F(n+1)) by fast doubling, O(log n) big-int multiplications"""
+    a, b = 0, 1
+    for bit in bin(n)[2:]:
+        # F(2k) = F(k) * (2F(k+1) - F(k)),  F(2k+1) = F(k)^2 + F(k+1)^2
+        c = a * (2 * b - a)
+        d = a * a + b * b
+        a, b = (d, c + d) if bit == "1" else (c, d)
+    return a, b
+
+
+@lru_cache(maxsize=256)
+def fibonacci_nth(n):
+    _check_n(n, MAX_FIB_N, "fibonacci")
+    return _disk_memo("fib", n, lambda k: fib_pair(k)[0])
+
+
+def fibonacci_range(start, count):
+    """One page of the sequence: F(start) .. F(start + count - 1)"""
+    _check_n(start, MAX_FIB_N, "fibonacci")
+    if count > MAX_PAGE:
+        raise ValueError(f"At most {MAX_PAGE} Fibonacci numbers per page")
+    a, b = fib_pair(start)
+    page = []
+    for _ in range(max(count, 0)):
+        page.append(a)
+        a, b = b, a + b
+    return page
+
+
+@lru_cache(maxsize=256)
+def factorial(n):
+    _check_n(n, MAX_FACTORIAL_N, "factorial")
+    return _disk_memo("fact", n, math.factorial)
+
+
+_last_pow10 = (0, 1)
+
+
+def pow10(k):
+    """10**k. A page of big ints asks for neighbouring powers, so step from the last one when it is close:
+    one multiplication or exact division instead of a fresh 10**k per value"""
+    global _last_pow10
+    last_k, last = _last_pow10
+    if 0 <= k - last_k <= 64:
+        value = last * 10 ** (k - last_k)
+    elif 0 < last_k - k <= 64:
+        value = last // 10 ** (last_k - k)
+    else:
+        value = 10 ** k
+    _last_pow10 = (k, value)
+    return value
+
+
+def digit_count(value):
+    """Number of decimal digits without converting the whole integer to a string"""
+    value = abs(value)
+    if value < 10:
+        return 1
+    digits = int((value.bit_length() - 1) * math.log10(2)) + 1
+    return digits + 1 if value >= pow10(digits) else digits
+
+
+def format_big_int(value, max_digits=MAX_DIGITS):
+    """Small ints stay ints, long ones become decimal strings, huge ones a digit summary"""
+    if abs(value) < 2 ** 53:
+        return value
+    digits = digit_count(value)
+    if digits <= max_digits:
+        return str(value)
+    head = abs(value) // pow10(digits - 20)
+    return {
+        "digits": digits,
+        "leading_digits": str(head),
+        "trailing_digits": str(abs(value) % 10 ** 20).zfill(20),
+        "negative": value < 0,
+    }
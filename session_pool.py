@@ -0,0 +1,151 @@
+import os
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+from logger import client_logger
+from tool_registry import ToolRegistry
+
+
+def make_server_params(command="python", args=None):
+    """How to start paint_mcp_server.py. The SDK passes only HOME, PATH and a few other variables
+    to the server, the whole environment goes along so settings like SMTP_HOST reach it."""
+    return StdioServerParameters(command=command, args=args or ["paint_mcp_server.py"], env=dict(os.environ))
+
+
+class PooledSession:
+    """An initialized MCP session owned by its own background task"""
+
+    def __init__(self, slot):
+        self.slot = slot
+        self.session = None
+        self.tools = []
+        self.registry = None
+        self.ready = asyncio.Event()
+        self.stop = asyncio.Event()
+        self.task = None
+        self.error = None
+        self.uses = 0
+
+
+class SessionPool:
+    """Keeps a fixed number of MCP server sessions warm and hands them out to callers"""
+
+    def __init__(self, size=4, server_params=None, ping_timeout=5.0):
+        self.size = size
+        self.server_params = server_params or make_server_params()
+        self.ping_timeout = ping_timeout
+        self.idle = asyncio.Queue()
+        self.slots = {}
+        self.cold_start_times = []
+        self.warm_acquire_times = []
+        self.restarts = 0
+
+    async def _own_session(self, pooled):
+        # Context managers of stdio_client must be entered and exited in the same task,
+        # so every session lives inside this task until it is asked to stop
+        try:
+            async with stdio_client(self.server_params) as (read, write):
+                async with ClientSession(read, write) as session:
+                    await session.initialize()
+                    pooled.tools = (await session.list_tools()).tools
+                    pooled.registry = ToolRegistry.for_tools(pooled.tools)
+                    pooled.session = session
+                    pooled.ready.set()
+                    await pooled.stop.wait()
+        except Exception as e:
+            pooled.error = e
+            client_logger.info("Session %s stopped with error: %s", pooled.slot, e)
+        finally:
+            pooled.ready.set()
+
+    async def _start_slot(self, slot):
+        start = time.perf_counter()
+        pooled = PooledSession(slot)
+        pooled.task = asyncio.create_task(self._own_session(pooled))
+        await pooled.ready.wait()
+        if pooled.session is None:
+            raise RuntimeError(f"Could not start MCP session {slot}: {pooled.error}")
+        elapsed = time.perf_counter() - start
+        self.cold_start_times.append(elapsed)
+        self.slots[slot] = pooled
+        client_logger.info("Session %s cold start took %.3fs", slot, elapsed)
+        return pooled
+
+    async def _stop_slot(self, pooled):
+        pooled.stop.set()
+        try:
+            await asyncio.wait_for(pooled.task, timeout=self.ping_timeout)
+        except Exception as e:
+            client_logger.info("Session %s did not stop cleanly: %s", pooled.slot, e)
+            pooled.task.cancel()
+
+    async def start(self):
+        """Start all sessions up front so the first callers get warm ones"""
+        started = await asyncio.gather(*(self._start_slot(slot) for slot in range(self.size)))
+        for pooled in started:
+            self.idle.put_nowait(pooled)
+        return self
+
+    async def is_healthy(self, pooled):
+        if pooled.task.done():
+            return False
+        try:
+            await asyncio.wait_for(pooled.session.send_ping(), timeout=self.ping_timeout)
+            return True
+        except Exception as e:
+            client_logger.info("Session %s failed ping: %s", pooled.slot, e)
+            return False
+
+    async def acquire(self):
+        start = time.perf_counter()
+        pooled = await self.idle.get()
+        if not await self.is_healthy(pooled):
+            # Replace the dead server process before handing it out
+            self.restarts += 1
+            await self._stop_slot(pooled)
+            try:
+                pooled = await self._start_slot(pooled.slot)
+            except Exception:
+                self.idle.put_nowait(pooled)
+                raise
+        else:
+            self.warm_acquire_times.append(time.perf_counter() - start)
+        pooled.uses += 1
+        return pooled
+
+    def release(self, pooled):
+        self.idle.put_nowait(pooled)
+
+    @asynccontextmanager
+    async def session(self):
+        """async with pool.session() as pooled: pooled.session.call_tool(...)"""
+        pooled = await self.acquire()
+        try:
+            yield pooled
+        finally:
+            self.release(pooled)
+
+    async def close(self):
+        await asyncio.gather(*(self._stop_slot(p) for p in self.slots.values()))
+        self.slots.clear()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def stats(self):
+        """Cold start versus warm acquire latency, in seconds"""
+        def avg(values):
+            return sum(values) / len(values) if values else 0.0
+        return {
+            "size": self.size,
+            "cold_starts": len(self.cold_start_times),
+            "avg_cold_start": avg(self.cold_start_times),
+            "warm_acquires": len(self.warm_acquire_times),
+            "avg_warm_acquire": avg(self.warm_acquire_times),
+            "restarts": self.restarts,
+        }
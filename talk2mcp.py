@@ -1,127 +1,151 @@
 import os
 from dotenv import load_dotenv
 import traceback
-from mcp import ClientSession, StdioServerParameters, types
+from mcp import ClientSession, types
 from mcp.client.stdio import stdio_client
 import asyncio
-from google import genai
 from concurrent.futures import TimeoutError
-from functools import partial
-from logger import mcp_server_logger
-import re
-import json
+from functools import partial, lru_cache
+from logger import client_logger
+from conversation import ConversationState
+from llm_backend import make_backend
+from llm_stream import StreamedResponse
+from tool_registry import ToolRegistry
+from session_pool import make_server_params
+from tool_calls import call_tool, validate_calls, run_calls, confirm_email
+from json_extract import extract_json, JSONExtractError
+import metrics
+import tracing
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Access your API key and initialize Gemini client correctly
-api_key = os.getenv("GEMINI_API_KEY")
-client = genai.Client(api_key=api_key)
-
 max_iterations = 14
-last_response = None 
-iteration = 0
-iteration_response = []
-
-async def generate_with_timeout(client, prompt, timeout=10):
-    """Generate content with a timeout"""
-    mcp_server_logger.info("Starting LLM generation...")
+# Malformed responses in a row before a run is given up, each one is sent back to the model
+max_parse_errors = 3
+token_budget = 6000
+# loop asks the model before every tool call, plan asks once for a DAG of calls (see planner.py)
+AGENT_MODE = os.getenv("AGENT_MODE", "loop")
+# Stream responses and start a tool call as soon as its JSON object is complete, LLM_STREAM=0 waits for the whole text
+LLM_STREAM = os.getenv("LLM_STREAM", "1") != "0"
+METRICS_FILE = os.getenv("METRICS_FILE", os.path.join("logs", "metrics.txt"))
+
+QUERY = """Find the ASCII values of characters in INDIA and then return sum of squares of those values. Show reasonings for calculations, verify the calculation and
+                After that, Open Microsoft paint, then draw a rectangle with 607, 425, 940, 619 coordinates, then use the final answer to add text in paint.
+                then finally send me the final answer as email """
+# QUERY = """Add two numbers 8 and 9, then multiply the result by 2."""
+
+
+class AgentRun:
+    """State of one agent run, so concurrent runs never share variables"""
+
+    def __init__(self, query, run_id=0):
+        self.run_id = run_id
+        self.query = query
+        self.iteration = 0
+        self.last_response = None
+        self.final_answer = None
+        self.status = "running"
+        self.error = None
+        self.calls = []
+        self.conversation = None
+        self.trace_id = None
+
+    def to_dict(self):
+        return {
+            "run_id": self.run_id,
+            "query": self.query,
+            "status": self.status,
+            "final_answer": self.final_answer,
+            "iterations": self.iteration,
+            "calls": self.calls,
+            "prompt_sizes": self.conversation.prompt_sizes if self.conversation else [],
+            "error": self.error,
+            "trace_id": self.trace_id,
+        }
+
+
+async def generate_with_timeout(backend, prompt):
+    """Generate content, the backend's limiter times the call out after LLM_TIMEOUT once it has a slot"""
+    client_logger.info("Starting LLM generation...")
     try:
-        # Convert the synchronous generate_content call to run in a thread
-        loop = asyncio.get_event_loop()
-        response = await asyncio.wait_for(
-            loop.run_in_executor(
-                None, 
-                lambda: client.models.generate_content(
-                    model="gemini-2.0-flash",
-                    contents=prompt
-                )
-            ),
-            timeout=timeout
-        )
-        mcp_server_logger.info("LLM generation completed")
+        with metrics.timer("llm_generate"), tracing.span("llm_generate", kind="client"):
+            response = await backend.generate(prompt)
+        client_logger.info("LLM generation completed")
         return response
     except TimeoutError:
-        mcp_server_logger.info("LLM generation timed out!")
+        client_logger.info("LLM generation timed out!")
         raise
     except Exception as e:
-        mcp_server_logger.info(f"Error in LLM generation: {e}")
+        client_logger.info("Error in LLM generation: %s", e)
         raise
 
-def reset_state():
-    """Reset all global variables to their initial state"""
-    global last_response, iteration, iteration_response
-    last_response = None
-    iteration = 0
-    iteration_response = []
 
-async def main():
-    reset_state()  # Reset at the start of main
-    mcp_server_logger.info("Starting main execution...")
+def parse_llm_json(content):
+    """The agent message (the last JSON object with a message_type) in a model response.
+    Raises JSONExtractError, single quotes and trailing commas are repaired on the way."""
+    client_logger.info("RAW CONTENT: >>>%s<<<", content)
+    response_json = extract_json(content, require_key="message_type")
+    client_logger.info("LLM Response: %s", response_json)
+    return response_json
+
+
+def check_message(response_json):
+    """Reject agent messages the loop cannot act on, as a JSONExtractError the model can be told about"""
+    message_type = response_json.get("message_type")
+    if message_type == "FUNCTION_CALL" and ("name" not in response_json or "params" not in response_json):
+        raise JSONExtractError("invalid", "FUNCTION_CALL needs a name and params")
+    if message_type not in ("FUNCTION_CALL", "FUNCTION_CALLS", "FINAL_ANSWER"):
+        raise JSONExtractError("invalid", f"Unknown message_type {message_type!r}")
+
+
+async def next_message(backend, prompt):
+    """The agent message for prompt and, when it was taken from an unfinished stream, the StreamedResponse.
+    A streamed message is returned once its JSON object is complete, the rest keeps arriving in the background.
+    Raises JSONExtractError for an unusable response."""
+    if not LLM_STREAM:
+        return parse_llm_json(await generate_with_timeout(backend, prompt)), None
+    client_logger.info("Starting LLM stream...")
+    response = StreamedResponse(backend, prompt)
+    message = await response.message()
+    if message is not None:
+        try:
+            check_message(message)
+            client_logger.info("LLM Response after %.3fs (first token %.3fs): %s",
+                               response.dispatch, response.first_token, message)
+            return message, response
+        except JSONExtractError:
+            # Not a message the loop can act on, let the whole response decide
+            pass
+    return parse_llm_json(await response.finish()), None
+
+
+async def finish_stream(response):
+    """Wait for the rest of a stream whose message was already dispatched, its errors no longer matter"""
     try:
-        # Create a single MCP server connection
-        mcp_server_logger.info("Establishing connection to MCP server...")
-        server_params = StdioServerParameters(
-            command="python",
-            args=["paint_mcp_server.py"]
-        )
-
-        async with stdio_client(server_params) as (read, write):
-            mcp_server_logger.info("Connection established, creating session...")
-            async with ClientSession(read, write) as session:
-                mcp_server_logger.info("Session created, initializing...")
-                await session.initialize()
-                
-                # Get available tools
-                mcp_server_logger.info("Requesting tool list...")
-                tools_result = await session.list_tools()
-                tools = tools_result.tools
-                mcp_server_logger.info(f"Successfully retrieved {len(tools)} tools")
-
-                # Create system prompt with available tools
-                mcp_server_logger.info("Creating system prompt...")
-                mcp_server_logger.info(f"Number of tools: {len(tools)}")
-                
-                try:
-                    # First, let's inspect what a tool object looks like
-                    # if tools:
-                    #     mcp_server_logger.info(f"First tool properties: {dir(tools[0])}")
-                    #     mcp_server_logger.info(f"First tool example: {tools[0]}")
-                    
-                    tools_description = []
-                    for i, tool in enumerate(tools):
-                        try:
-                            # Get tool properties
-                            params = tool.inputSchema
-                            desc = getattr(tool, 'description', 'No description available')
-                            name = getattr(tool, 'name', f'tool_{i}')
-                            
-                            # Format the input schema in a more readable way
-                            if 'properties' in params:
-                                param_details = []
-                                for param_name, param_info in params['properties'].items():
-                                    param_type = param_info.get('type', 'unknown')
-                                    param_details.append(f"{param_name}: {param_type}")
-                                params_str = ', '.join(param_details)
-                            else:
-                                params_str = 'no parameters'
-
-                            tool_desc = f"{i+1}. {name}({params_str}) - {desc}"
-                            tools_description.append(tool_desc)
-                            mcp_server_logger.info(f"Added description for tool: {tool_desc}")
-                        except Exception as e:
-                            mcp_server_logger.info(f"Error processing tool {i}: {e}")
-                            tools_description.append(f"{i+1}. Error processing tool")
-                    
-                    tools_description = "\n".join(tools_description)
-                    mcp_server_logger.info("Successfully created tools description")
-                except Exception as e:
-                    mcp_server_logger.info(f"Error creating tools description: {e}")
-                    tools_description = "Error loading tools"
-                
-                mcp_server_logger.info("Created system prompt...")
-                
-                system_prompt = f"""You are a mathematical reasoning agent that solves problems step by step.
+        content = await response.finish()
+        client_logger.info("RAW CONTENT: >>>%s<<<", content)
+    except Exception as e:
+        client_logger.info("LLM stream failed after its message was dispatched: %s", e)
+
+
+async def complete_after_email(session, registry, run, result_str):
+    """A successful send_email ends the run, once the server reports the mail as delivered"""
+    delivery = await confirm_email(session, registry, result_str)
+    client_logger.info("Email delivery: %s", delivery)
+    run.final_answer = run.last_response
+    if delivery.get("status") == "sent":
+        client_logger.info("\n=== Agent Execution Complete ===")
+        run.status = "completed"
+    else:
+        run.status = "email_error"
+        run.error = f"Email {delivery.get('status')}: {delivery.get('error')}"
+
+
+@lru_cache(maxsize=8)
+def build_system_prompt(tools_description):
+    """Create system prompt with available tools, reused while the tool list is unchanged"""
+    return f"""You are a mathematical reasoning agent that solves problems step by step.
 You have access to these mathematical tools:
 Available tools:
 {tools_description}
@@ -129,23 +153,27 @@ Available tools:
 Follow this process
 - Before solving, identify the type of reasoning needed: Arithmetic, Logic, Lookup, Planning and Tag each step with its reasoning type. show the reasoning steps
 - solve the steps
-- Use verify tool to check the results of each step 
+- Use verify tool to check the results of each step
 - finally provide final answer
 
 Important:
 - When a function returns multiple values, you need to process all of them
 - Only give FINAL_ANSWER when you have completed all necessary calculations
 - Do not repeat function calls with the same parameters
-- Call one function at a time
+- Call functions that do not need each other's results together in one FUNCTION_CALLS message, they run in parallel
+- Give a call "depends_on" with the ids of calls in the same message it must wait for, otherwise call one function at a time
 - Incase if you are not able to answer tell `I dont have the capability for it, check the tools description`
 
 Respond with EXACTLY ONE line in one of these formats:
 1. {{"message_type": "FUNCTION_CALL", "name" : function_name, "params": {{"param1": value1, "param2": value2, ...}}}}
-2. {{"message_type": "FINAL_ANSWER", "name" : "result", "params": "answer"}}
+2. {{"message_type": "FUNCTION_CALLS", "calls": [{{"id": "c1", "name": function_name, "params": {{...}}}}, {{"id": "c2", "name": function_name, "params": {{...}}, "depends_on": ["c1"]}}]}}
+3. {{"message_type": "FINAL_ANSWER", "name" : "result", "params": "answer"}}
 
 Example:
 User: Can you add 5 and 3
 Assistant: {{"message_type": "FUNCTION_CALL", "name": "add", "params": {{"a": 5, "b": 3}}}}
+User: Show reasonings and convert "AB" to a list of ASCII values
+Assistant: {{"message_type": "FUNCTION_CALLS", "calls": [{{"id": "c1", "name": "show_reasoning", "params": {{"steps": ["1. [Lookup] Convert AB to ASCII values"]}}}}, {{"id": "c2", "name": "strings_to_chars_to_int", "params": {{"string": "AB"}}}}]}}
 User: Convert "INDIA" to a list of ASCII values
 Assistant: FUNCTION_CALL: {{"message_type": "FUNCTION_CALL", "name": "strings_to_chars_to_int", "params": {{"string": "INDIA"}}}}
 User: Please multiply 2 and 3
@@ -161,215 +189,180 @@ Assistant: FUNCTION_CALL: {{"message_type": "FUNCTION_CALL", "name": "verify", "
 User: Verified correct.
 Assistant: FINAL_ANSWER: {{"message_type": "FINAL_ANSWER", "result": 20}}
 
-Your entire response should be in json format with message type parameter either FUNCTION_CALL or FINAL_ANSWER"""
+Your entire response should be in json format with message type parameter FUNCTION_CALL, FUNCTION_CALLS or FINAL_ANSWER"""
+
+
+async def run_agent(session, registry, query, backend, run_id=0, mode=None):
+    """Run the agent loop for one query on an initialized session"""
+    if (mode or AGENT_MODE) == "plan":
+        from planner import run_plan_agent
+        return await run_plan_agent(session, registry, query, backend, run_id=run_id)
+
+    run = AgentRun(query, run_id=run_id)
+    # The span also ends when the run is cancelled or raises
+    with tracing.span("agent_run", run_id=run_id, query=query) as root_span:
+        run.trace_id = root_span.trace_id
+        system_prompt = build_system_prompt(registry.description)
+        client_logger.info("[run %s] Starting iteration loop...", run_id)
+
+        # Each tool result is appended once, older turns get summarized past the budget
+        conversation = ConversationState(system_prompt, query, token_budget=token_budget)
+        run.conversation = conversation
+
+        parse_errors = 0
+        # Streams whose message was dispatched early, their tails keep arriving while the run goes on
+        pending = []
+        while run.iteration < max_iterations:
+            with metrics.timer("agent_iteration"), tracing.span("iteration", iteration=run.iteration + 1):
+                client_logger.info("\n--- [run %s] Iteration %s ---", run_id, run.iteration + 1)
+
+                # Get model's response with timeout
+                client_logger.info("Preparing to generate LLM response...")
+                prompt = conversation.build_prompt()
+                client_logger.info("Prompt size for iteration %s: %s tokens", run.iteration + 1, conversation.prompt_sizes[-1])
+                try:
+                    response_json, stream = await next_message(backend, prompt)
+                    if stream is not None:
+                        pending.append(stream)
+                    check_message(response_json)
+                    parse_errors = 0
+                except JSONExtractError as e:
+                    # A malformed line costs one iteration, not the whole run
+                    parse_errors += 1
+                    client_logger.info("Unusable LLM response: %s", e.to_dict())
+                    metrics.inc("llm_parse_errors_total", kind=e.kind)
+                    if parse_errors >= max_parse_errors:
+                        run.status = "parse_error"
+                        run.error = str(e)
+                        break
+                    conversation.add_turn(
+                        f"Your response in iteration {run.iteration + 1} could not be used: {e}. "
+                        "Reply with exactly one JSON line in one of the formats above."
+                    )
+                    run.iteration += 1
+                    continue
+                except Exception as e:
+                    client_logger.info("Failed to get LLM response: %s", e)
+                    run.status = "llm_error"
+                    run.error = str(e)
+                    break
+
+                if response_json['message_type'] == "FUNCTION_CALL":
+                    func_name = response_json["name"]
+                    params = response_json["params"]
 
-                query = """Find the ASCII values of characters in INDIA and then return sum of squares of those values. Show reasonings for calculations, verify the calculation and 
-                After that, Open Microsoft paint, then draw a rectangle with 607, 425, 940, 619 coordinates, then use the final answer to add text in paint.
-                then finally send me the final answer as email """
-                # query = """Add two numbers 8 and 9, then multiply the result by 2."""
-                mcp_server_logger.info("Starting iteration loop...")
-                
-                # Use global iteration variables
-                global iteration, last_response
-                
-                while iteration < max_iterations:
-                    mcp_server_logger.info(f"\n--- Iteration {iteration + 1} ---")
-                    if last_response is None:
-                        current_query = query
-                    else:
-                        current_query = current_query + "\n\n" + " ".join(iteration_response)
-                        current_query = current_query + "  What should I do next?"
-
-                    # Get model's response with timeout
-                    mcp_server_logger.info("Preparing to generate LLM response...")
-                    prompt = f"{system_prompt}\n\nQuery: {current_query}"
                     try:
-                        response = await generate_with_timeout(client, prompt)
-                        mcp_server_logger.info(f"type(response_text): {type(response)}")
-                        content = response.candidates[0].content.parts[0].text.strip()
-                        mcp_server_logger.info(f"RAW CONTENT: >>>{content}<<<") 
-                        # Remove markdown fences if they exist
-                        cleaned = re.sub(r"^```(?:json)?\s*|\s*```$", "", content, flags=re.DOTALL).strip()
-
-                        # Try to extract the last {...} JSON object in the string
-                        match = re.search(r"\{.*\}", cleaned, re.DOTALL)
-                        if not match:
-                            raise ValueError("No JSON object found in LLM response")
-                        mcp_server_logger.info("match")
-                        mcp_server_logger.info(match)
-                        json_str = match.group(0)
-                        mcp_server_logger.info(f"EXTRACTED JSON: >>>{json_str}<<<")
-
-                        response_json = json.loads(json_str)
-                        # raw_text = json.loads(response.text.strip())
-
-
-                        # cleaned = re.sub(r"^```(?:json)?\s*|\s*```$", "", content, flags=re.DOTALL).strip()
-                        # mcp_server_logger.info(f"CLEANED CONTENT: >>>{cleaned}<<<")
-                        # response_json = json.loads(cleaned)
-                        mcp_server_logger.info(f"type(response_text): {type(response_json)}")
-                        mcp_server_logger.info(f"LLM Response: {response_json}")
-                        mcp_server_logger.info(f"LLM Response: {response_json['message_type']}")
-                        # mcp_server_logger.info(f"LLM Response: {response_json['params']}")
-                        
-                        # Find the FUNCTION_CALL line in the response
-                        # for line in response_json.split('\n'):
-                        #     line = line.strip()
-                        #     if line.startswith("FUNCTION_CALL:"):
-                        #         response_text = line
-                        #         break
-                        
+                        arguments, iteration_result, result_str, _ = await call_tool(session, registry, func_name, params)
+
+                        conversation.add_turn(
+                            f"In the {run.iteration + 1} iteration you called {func_name} with {arguments} parameters, "
+                            f"and the function returned {result_str}."
+                        )
+                        run.calls.append({"name": func_name, "arguments": arguments, "result": result_str})
+                        run.last_response = iteration_result
+
                     except Exception as e:
-                        mcp_server_logger.info(f"Failed to get LLM response: {e}")
+                        client_logger.debug("Error details: %s", e)
+                        client_logger.debug("Error type: %s", type(e))
+                        traceback.print_exc()
+                        conversation.add_turn(f"Error in iteration {run.iteration + 1}: {str(e)}")
+                        run.status = "tool_error"
+                        run.error = str(e)
                         break
 
+                    if func_name == "send_email":
+                        await complete_after_email(session, registry, run, result_str)
+                        break
 
-                    if response_json['message_type'] == "FUNCTION_CALL":
-                        # _, function_info = response_text.split(":", 1)
-                        # match = re.search(r'FUNCTION_CALL:\s*(\{.*\})', response_text)
-                        # func_name = None 
-                        # params = {}
-                        # if match:
-                        #     data = json.loads(match.group(1))
-                        func_name = response_json["name"]
-                        params = response_json["params"]
-
-                        mcp_server_logger.info(f"Function: {func_name}")
-                        mcp_server_logger.info(f"Params: {params}")
-                        # parts = [p.strip() for p in function_info.split("|")]
-                        # func_name, params = parts[0], parts[1:]
-                        
-                        # mcp_server_logger.info(f"\nDEBUG: Raw function info: {function_info}")
-                        # mcp_server_logger.info(f"DEBUG: Split parts: {parts}")
-                        mcp_server_logger.info(f"DEBUG: Function name: {func_name}")
-                        mcp_server_logger.info(f"DEBUG: Raw parameters: {params}")
-                        
-                        try:
-                            # Find the matching tool to get its input schema
-                            tool = next((t for t in tools if t.name == func_name), None)
-                            if not tool:
-                                mcp_server_logger.info(f"DEBUG: Available tools: {[t.name for t in tools]}")
-                                raise ValueError(f"Unknown tool: {func_name}")
-
-                            mcp_server_logger.info(f"DEBUG: Found tool: {tool.name}")
-                            mcp_server_logger.info(f"DEBUG: Tool schema: {tool.inputSchema}")
-
-                            # Prepare arguments according to the tool's input schema
-                            arguments = {}
-                            schema_properties = tool.inputSchema.get('properties', {})
-                            mcp_server_logger.info(f"DEBUG: Schema properties: {schema_properties}")
-
-                            for param_name, param_info in schema_properties.items():
-                                if not params:  # Check if we have enough parameters
-                                    raise ValueError(f"Not enough parameters provided for {func_name}")
-                                    
-                                value = params[param_name]  # Get and remove the first parameter
-                                param_type = param_info.get('type', 'string')
-                                
-                                mcp_server_logger.info(f"DEBUG: Converting parameter {param_name} with value {value} to type {param_type}")
-                                
-                                # Convert the value to the correct type based on the schema
-                                if param_type == 'integer':
-                                    arguments[param_name] = int(value)
-                                elif param_type == 'number':
-                                    arguments[param_name] = float(value)
-                                elif param_type == 'array':
-                                    # Handle array input
-                                    if isinstance(value, str):
-                                        value = value.strip('[]').split(',')
-                                        arguments[param_name] = [int(x.strip()) for x in value]
-                                    else:
-                                        arguments[param_name] = value
-                                else:
-                                    arguments[param_name] = str(value)
-
-                            mcp_server_logger.info(f"DEBUG: Final arguments: {arguments}")
-                            mcp_server_logger.info(f"DEBUG: Calling tool {func_name}")
-                            
-                            result = await session.call_tool(func_name, arguments=arguments)
-                            mcp_server_logger.info(f"DEBUG: Raw result: {result}")
-                            
-                            # Get the full result content
-                            if hasattr(result, 'content'):
-                                mcp_server_logger.info(f"DEBUG: Result has content attribute")
-                                # Handle multiple content items
-                                if isinstance(result.content, list):
-                                    iteration_result = [
-                                        item.text if hasattr(item, 'text') else str(item)
-                                        for item in result.content
-                                    ]
-                                else:
-                                    iteration_result = str(result.content)
-                            else:
-                                mcp_server_logger.info(f"DEBUG: Result has no content attribute")
-                                iteration_result = str(result)
-                                
-                            mcp_server_logger.info(f"DEBUG: Final iteration result: {iteration_result}")
-                            
-                            # Format the response based on result type
-                            if isinstance(iteration_result, list):
-                                result_str = f"[{', '.join(iteration_result)}]"
-                            else:
-                                result_str = str(iteration_result)
-                            
-                            iteration_response.append(
-                                f"In the {iteration + 1} iteration you called {func_name} with {arguments} parameters, "
-                                f"and the function returned {result_str}."
-                            )
-                            last_response = iteration_result
-
-                        except Exception as e:
-                            mcp_server_logger.info(f"DEBUG: Error details: {str(e)}")
-                            mcp_server_logger.info(f"DEBUG: Error type: {type(e)}")
-                            traceback.print_exc()
-                            iteration_response.append(f"Error in iteration {iteration + 1}: {str(e)}")
-                            break
-                        
-                        if func_name == "send_email":
-                            mcp_server_logger.info("\n=== Agent Execution Complete ===")
-                            break
-
-                    elif response_json['message_type'] == "FINAL_ANSWER":
-                        mcp_server_logger.info(response_json)
-                        mcp_server_logger.info("\n=== Final answer got ===")
-                        # break
-                        # result = await session.call_tool("open_paint")
-                        # mcp_server_logger.info(result.content[0].text)
-
-                        # # Wait longer for Paint to be fully maximized
-                        # await asyncio.sleep(1)
-
-                        # # Draw a rectangle
-                        # result = await session.call_tool(
-                        #     "draw_rectangle",
-                        #     arguments={
-                        #         "x1": 780,
-                        #         "y1": 380,
-                        #         "x2": 1140,
-                        #         "y2": 700
-                        #     }
-                        # )
-                        # mcp_server_logger.info(result.content[0].text)
-
-                        # # Draw rectangle and add text
-                        # result = await session.call_tool(
-                        #     "add_text_in_paint",
-                        #     arguments={
-                        #         "text": response_text
-                        #     }
-                        # )
-                        # mcp_server_logger.info(result.content[0].text)
-                        # break
-
-                    iteration += 1
+                elif response_json['message_type'] == "FUNCTION_CALLS":
+                    try:
+                        calls = validate_calls(response_json.get("calls"))
+                    except ValueError as e:
+                        # Let the model fix the batch instead of ending the run
+                        conversation.add_turn(f"Error in iteration {run.iteration + 1}: invalid FUNCTION_CALLS, {e}")
+                        run.iteration += 1
+                        continue
+
+                    # Independent calls run concurrently, all results go back to the model in one turn
+                    results = await run_calls(session, registry, calls)
+                    lines = []
+                    for entry in results:
+                        if entry["status"] == "ok":
+                            lines.append(f"{entry['id']}: {entry['name']} with {entry['arguments']} parameters "
+                                         f"returned {entry['result']}")
+                            run.last_response = entry["iteration_result"]
+                        else:
+                            lines.append(f"{entry['id']}: {entry['name']} {entry['status']}: {entry['error']}")
+                        run.calls.append({"id": entry["id"], "name": entry["name"], "arguments": entry["arguments"],
+                                          "result": entry["result"], "error": entry["error"]})
+                    conversation.add_turn(
+                        f"In the {run.iteration + 1} iteration you called {len(results)} functions in parallel:\n"
+                        + "\n".join(lines)
+                    )
+
+                    sent = [e for e in results if e["name"] == "send_email" and e["status"] == "ok"]
+                    if sent:
+                        await complete_after_email(session, registry, run, sent[-1]["result"])
+                        break
+
+                elif response_json['message_type'] == "FINAL_ANSWER":
+                    client_logger.info(response_json)
+                    client_logger.info("\n=== Final answer got ===")
+                    run.final_answer = response_json.get("params", response_json.get("result"))
+                    run.status = "completed"
+                    break
+
+                run.iteration += 1
+
+        await asyncio.gather(*(finish_stream(stream) for stream in pending))
+        if run.status == "running":
+            run.status = "max_iterations"
+        metrics.inc("agent_runs_total", status=run.status)
+        root_span.set("status", run.status)
+        root_span.set("iterations", run.iteration)
+        root_span.error = run.error
+    return run
+
+
+async def fetch_server_metrics(session):
+    """Text of the server's metrics://server resource"""
+    result = await session.read_resource("metrics://server")
+    return "".join(getattr(item, "text", "") for item in result.contents)
+
+
+async def main():
+    client_logger.info("Starting main execution...")
+    try:
+        backend = make_backend()
+
+        # Create a single MCP server connection
+        client_logger.info("Establishing connection to MCP server...")
+        server_params = make_server_params()
+
+        async with stdio_client(server_params) as (read, write):
+            client_logger.info("Connection established, creating session...")
+            async with ClientSession(read, write) as session:
+                client_logger.info("Session created, initializing...")
+                await session.initialize()
+
+                # Get available tools
+                client_logger.info("Requesting tool list...")
+                tools_result = await session.list_tools()
+                registry = ToolRegistry.for_tools(tools_result.tools)
+                client_logger.info("Successfully retrieved %s tools", len(registry.tools))
+
+                run = await run_agent(session, registry, QUERY, backend)
+                client_logger.info("Run finished: %s", run.to_dict())
+
+                metrics.dump(METRICS_FILE, [("client", metrics.render()),
+                                            ("server", await fetch_server_metrics(session))])
+                client_logger.info("Metrics written to %s", METRICS_FILE)
 
     except Exception as e:
-        mcp_server_logger.info(f"Error in main execution: {e}")
+        client_logger.info("Error in main execution: %s", e)
         traceback.print_exc()
-    finally:
-        reset_state()  # Reset at the end of main
 
 if __name__ == "__main__":
     asyncio.run(main())
-    
-    
+
+
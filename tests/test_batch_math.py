@@ -0,0 +1,30 @@
+import math
+
+import pytest
+
+from batch_math import batch_apply, batch_reduce, batch_unary
+
+
+def test_integer_ops_switch_to_float_instead_of_wrapping():
+    assert batch_apply("multiply", [2**40, 3], [2**40, 3]) == [float(2**80), 9.0]
+    assert batch_apply("add", [2**62], [2**62]) == [float(2**63)]
+    assert batch_apply("subtract", [-2**62], [2**62]) == [float(-2**63)]
+    assert batch_unary("square", [2**40]) == [float(2**80)]
+    assert batch_reduce("prod", list(range(1, 30))) == pytest.approx(math.factorial(29))
+    assert batch_reduce("sum", [2**62, 2**62]) == float(2**63)
+
+
+def test_small_integer_results_stay_exact():
+    assert batch_apply("multiply", [3, 4], [5, 6]) == [15, 24]
+    assert batch_apply("power", [2], [10]) == [1024]
+    assert batch_reduce("prod", [1, 2, 3, 4]) == 24
+    assert batch_reduce("sum", [[1, 2], [3, 4]], axis=0) == [4, 6]
+    assert batch_unary("square", [-3]) == [9]
+
+
+def test_integers_past_int64_are_refused_with_a_clear_error():
+    for value in ([2**70], [2**63], 2**70):
+        with pytest.raises(ValueError, match="outside the int64 range"):
+            batch_apply("add", value, [1])
+    with pytest.raises(ValueError, match="only numbers"):
+        batch_unary("abs", ["a"])
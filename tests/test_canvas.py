@@ -0,0 +1,52 @@
+import pytest
+
+from canvas import CanvasBackend, MSPaintCanvas, PillowCanvas
+from paint_sim import SimulatedPaintDriver
+
+RECT = {"op": "rect", "x1": 10, "y1": 10, "x2": 50, "y2": 50}
+
+
+@pytest.fixture
+def canvas():
+    canvas = PillowCanvas(width=200, height=100)
+    canvas.open()
+    return canvas
+
+
+@pytest.mark.parametrize("bad_op, message", [
+    ({"op": "fill", "color": "notacolor"}, "unknown color"),
+    ({"op": "text", "text": "25591", "x": "a", "y": 3}, "x must be an integer"),
+    ({"op": "line", "x1": 0, "y1": 0, "x2": 5, "y2": 5, "width": 0}, "width must be at least 1"),
+    ({"op": "rect", "x1": 0, "y1": 0, "x2": 5, "y2": 5, "fill": [255, 0]}, "fill must be a color"),
+    ({"op": "circle"}, "unknown op"),
+])
+def test_invalid_op_leaves_the_canvas_untouched(canvas, bad_op, message):
+    before = canvas.snapshot()
+    with pytest.raises(ValueError, match=message):
+        canvas.apply([RECT, bad_op])
+    assert canvas.snapshot() == before
+
+
+def test_colors_from_json_lists(canvas):
+    canvas.apply([dict(RECT, color=[255, 0, 0], fill=[0, 0, 255])])
+    assert canvas.image.getpixel((30, 30)) == (0, 0, 255)
+    assert canvas.image.getpixel((10, 30)) == (255, 0, 0)
+
+
+def test_mspaint_refuses_arguments_it_cannot_draw():
+    canvas = MSPaintCanvas(driver=SimulatedPaintDriver(min_delay=0, max_delay=0))
+    with pytest.raises(ValueError, match="color"):
+        canvas.apply([dict(RECT, color="red")])
+    with pytest.raises(ValueError, match="size"):
+        canvas.apply([{"op": "text", "text": "x", "size": 40}])
+    with pytest.raises(ValueError, match="not supported"):
+        canvas.apply([{"op": "fill", "color": "red"}])
+
+
+def test_backends_must_implement_every_op():
+    class RectOnly(CanvasBackend):
+        def rectangle(self, x1, y1, x2, y2, color="black", width=2, fill=None):
+            pass
+
+    with pytest.raises(TypeError):
+        RectOnly()
@@ -0,0 +1,20 @@
+from conversation import ConversationState, cap_turn, estimate_tokens
+
+
+def test_prompt_size_stays_bounded_with_huge_tool_results():
+    state = ConversationState("system " * 200, "query", token_budget=2000, keep_last=4)
+    pinned = estimate_tokens(state.system_prompt) + estimate_tokens(state.query)
+    for i in range(20):
+        state.add_turn(f"In iteration {i} the tool returned " + "x" * 100_000)
+        state.build_prompt()
+    # Kept turns take at most half of the budget and the summary a quarter, plus the joining text
+    assert max(state.prompt_sizes) <= pinned + state.token_budget
+    assert len(state.turns) == state.keep_last
+
+
+def test_cap_turn_keeps_head_and_tail():
+    text = "head" + "x" * 10_000 + "tail"
+    capped = cap_turn(text, 300)
+    assert capped.startswith("head") and capped.endswith("tail")
+    assert f"{len(text) - 300} chars elided" in capped
+    assert cap_turn("short", 300) == "short"
@@ -0,0 +1,45 @@
+import math
+from decimal import Decimal
+
+import pytest
+
+from exp_sum import DECIMAL_EXP_LIMIT, DECIMAL_PRECISION, exponential_sum
+
+
+def test_float_mode_for_small_values():
+    result = exponential_sum([1, 2, 2])
+    assert result["mode"] == "float"
+    assert result["value"] == pytest.approx(math.e + 2 * math.e ** 2)
+    assert result["log_value"] == pytest.approx(math.log(result["value"]))
+
+
+def test_auto_switches_to_decimal_past_float64():
+    result = exponential_sum([1000, 1000])
+    assert result["mode"] == "decimal"
+    assert result["log_value"] == pytest.approx(1000 + math.log(2))
+    # 50 significant digits, not the exact value
+    assert len(Decimal(result["value"]).as_tuple().digits) == DECIMAL_PRECISION
+
+
+def test_auto_falls_back_to_logsumexp_past_the_decimal_context():
+    result = exponential_sum([DECIMAL_EXP_LIMIT + 10, 1])
+    assert result == {"mode": "logsumexp", "value": None, "log_value": pytest.approx(DECIMAL_EXP_LIMIT + 10)}
+
+
+def test_counts_weight_each_value():
+    weighted = exponential_sum([0, 1], counts=[3, 2])
+    assert weighted["value"] == pytest.approx(3 + 2 * math.e)
+    assert exponential_sum([1000], counts=[5], mode="logsumexp")["log_value"] == pytest.approx(1000 + math.log(5))
+
+
+def test_forced_modes_refuse_overflow():
+    with pytest.raises(ValueError, match="overflows float64"):
+        exponential_sum([710], mode="float")
+    with pytest.raises(ValueError, match="decimal context"):
+        exponential_sum([DECIMAL_EXP_LIMIT + 1], mode="decimal")
+    with pytest.raises(ValueError, match="mode must be"):
+        exponential_sum([1], mode="exact")
+
+
+def test_empty_input():
+    assert exponential_sum([])["value"] == 0.0
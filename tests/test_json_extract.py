@@ -0,0 +1,51 @@
+import pytest
+
+from json_extract import JSONExtractError, JSONStreamExtractor, extract_json, loads_lenient, repair
+
+ANSWER = '{"message_type": "FINAL_ANSWER", "name": "result", "params": "25591"}'
+
+
+@pytest.mark.parametrize("text", [
+    ANSWER,
+    f"```json\n{ANSWER}\n```",
+    f"Here is my answer:\n{ANSWER}\nLet me know if you need anything else.",
+    f'For example {{"message_type": "FUNCTION_CALL", "name": "add"}} would call a tool, but:\n{ANSWER}',
+    f"Use a {{ to start an object, so:\n{ANSWER}",
+    f"I don't {{ know, it's\n{ANSWER}",
+])
+def test_the_last_message_is_found(text):
+    assert extract_json(text, require_key="message_type")["params"] == "25591"
+
+
+def test_braces_inside_strings_are_ignored():
+    text = '{"message_type": "FUNCTION_CALL", "params": {"expression": "}{", "steps": ["a {b}"]}}'
+    assert extract_json(text, require_key="message_type")["params"]["expression"] == "}{"
+
+
+def test_repaired_quotes_trailing_commas_and_python_literals():
+    assert repair("{'a': 'it\\'s', 'b': [1, 2,], 'c': True,}") == '{"a": "it\'s", "b": [1, 2], "c": true}'
+    assert loads_lenient("{'steps': ['1. say \"hi\"'], 'done': None}") == {"steps": ['1. say "hi"'], "done": None}
+    assert extract_json("{'message_type': 'FINAL_ANSWER', 'params': 5,}", "message_type")["params"] == 5
+
+
+@pytest.mark.parametrize("text, kind", [
+    ("no json here", "no_object"),
+    ('{"message_type": "FINAL_ANSWER", "params": ', "unbalanced"),
+    ('{"name": "add"}', "missing_key"),
+    ('{"message_type": FINAL_ANSWER}', "invalid"),
+])
+def test_errors_say_what_went_wrong(text, kind):
+    with pytest.raises(JSONExtractError) as error:
+        extract_json(text, require_key="message_type")
+    assert error.value.kind == kind
+
+
+def test_streamed_chunks_find_the_same_objects():
+    text = f"prose {{ stray, then {ANSWER} and {{\"b\": 1}}"
+    extractor = JSONStreamExtractor()
+    for i in range(0, len(text), 3):
+        extractor.feed(text[i:i + 3])
+    objects, unfinished = extractor.finish()
+    assert [body for _, body in objects] == [ANSWER, '{"b": 1}']
+    assert unfinished.startswith("{ stray")
+    assert all(text[position:position + len(body)] == body for position, body in objects)
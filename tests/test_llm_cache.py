@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+import llm_cache
+from llm_backend import ScriptedBackend
+from llm_cache import CacheMissError, CachedBackend, ResponseCache, cache_key
+
+
+class Clock:
+    """Stands in for the time module, so TTL and last_used order do not depend on the wall clock"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        self.now += 1
+        return self.now
+
+
+class Backend(ScriptedBackend):
+    def cache_identity(self):
+        return {"backend": "scripted", "model": "test"}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(llm_cache, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    cache = ResponseCache(path=str(tmp_path / "llm_cache.sqlite3"), ttl=100, max_bytes=10)
+    yield cache
+    cache.close()
+
+
+def test_cache_key_depends_on_identity_and_prompt_only():
+    identity = {"backend": "gemini", "model": "m", "config": {"temperature": 0}}
+    key = cache_key(identity, "prompt")
+    assert key == cache_key(dict(reversed(identity.items())), "prompt")
+    assert key != cache_key(identity, "prompt ")
+    assert key != cache_key(dict(identity, model="other"), "prompt")
+
+
+def test_entries_expire_after_the_ttl(cache, clock):
+    cache.put("k", "m", "response")
+    assert cache.get("k") == "response"
+    clock.now += 200
+    assert cache.get("k", ignore_ttl=True) == "response"
+    assert cache.get("k") is None
+    # An expired entry is deleted, not just skipped
+    assert cache.get("k", ignore_ttl=True) is None
+
+
+def test_least_recently_used_entries_are_evicted_past_max_bytes(cache):
+    cache.put("a", "m", "aaaa")
+    cache.put("b", "m", "bbbb")
+    assert cache.get("a") == "aaaa"
+    cache.put("c", "m", "cccc")
+    assert cache.get("b") is None
+    assert cache.get("a") == "aaaa"
+    stats = cache.stats()
+    assert (stats["entries"], stats["bytes"], stats["evictions"]) == (2, 8, 1)
+
+
+def test_cached_backend_serves_repeated_prompts(cache):
+    backend = Backend(["first", "second"])
+    cached = CachedBackend(backend, cache)
+
+    async def scenario():
+        return [await cached.generate("p"), await cached.generate("p"), await cached.generate("q")]
+
+    assert asyncio.run(scenario()) == ["first", "first", "second"]
+    assert backend.calls == 2
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_replay_mode_never_calls_the_backend(cache, clock):
+    cache.put(cache_key(Backend([]).cache_identity(), "p"), "test", "stored")
+    backend = Backend(["live"])
+    replay = CachedBackend(backend, cache, mode="replay")
+    # Replay ignores the TTL, an old recording still counts
+    clock.now += 1000
+    assert asyncio.run(replay.generate("p")) == "stored"
+    with pytest.raises(CacheMissError):
+        asyncio.run(replay.generate("q"))
+    assert backend.calls == 0
+
+
+def test_unknown_mode_is_refused(cache):
+    with pytest.raises(ValueError, match="mode must be"):
+        CachedBackend(Backend([]), cache, mode="write")
@@ -0,0 +1,113 @@
+import os
+import sys
+import time
+import socket
+import asyncio
+import subprocess
+import pytest
+
+aiosmtpd = pytest.importorskip("aiosmtpd.controller")
+
+from mail_queue import MailConfig, MailQueue
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Sink:
+    """Collects delivered messages, EHLO answers after a delay like a slow relay"""
+
+    def __init__(self, ehlo_delay=0.0):
+        self.ehlo_delay = ehlo_delay
+        self.messages = []
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        await asyncio.sleep(self.ehlo_delay)
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        return "250 OK"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_sink():
+    sink = Sink(ehlo_delay=0.3)
+    sink.port = free_port()
+    controller = aiosmtpd.Controller(sink, hostname="127.0.0.1", port=sink.port)
+    controller.start()
+    yield sink
+    controller.stop()
+
+
+def make_config(port):
+    return MailConfig(host="127.0.0.1", port=port, use_ssl=False, user="", password="",
+                      sender="agent@example.com", recipients=["me@example.com"])
+
+
+def test_flush_delivers_queued_mail(smtp_sink):
+    mail_queue = MailQueue(make_config(smtp_sink.port))
+    ids = [mail_queue.send(f"answer {i}") for i in range(3)]
+    assert mail_queue.flush(timeout=10)
+    assert [mail_queue.status(i)["status"] for i in ids] == ["sent"] * 3
+    assert len(smtp_sink.messages) == 3
+    assert b"answer 0" in smtp_sink.messages[0].original_content
+    mail_queue.close(timeout=1)
+
+
+def test_queued_mail_is_sent_at_exit(smtp_sink):
+    # The server process exits right after send_email returns, the atexit hook must still deliver
+    script = (
+        "import atexit\n"
+        "from mail_queue import MailConfig, MailQueue\n"
+        f"queue = MailQueue(MailConfig(host='127.0.0.1', port={smtp_sink.port}, use_ssl=False, user='',"
+        " password='', sender='agent@example.com', recipients=['me@example.com']))\n"
+        "atexit.register(queue.close)\n"
+        "queue.send('25591')\n"
+    )
+    subprocess.run([sys.executable, "-c", script], cwd=ROOT, check=True, timeout=30)
+    deadline = time.monotonic() + 5
+    while not smtp_sink.messages and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert len(smtp_sink.messages) == 1
+    assert b"25591" in smtp_sink.messages[0].original_content
+
+
+def test_retry_after_temporary_failure(smtp_sink):
+    attempts = []
+    handle_data = smtp_sink.handle_DATA
+
+    async def flaky(server, session, envelope):
+        attempts.append(1)
+        if len(attempts) == 1:
+            return "451 Try again later"
+        return await handle_data(server, session, envelope)
+
+    smtp_sink.handle_DATA = flaky
+    mail_queue = MailQueue(make_config(smtp_sink.port), backoff=0.1)
+    message_id = mail_queue.send("retried")
+    assert mail_queue.flush(timeout=10)
+    assert mail_queue.status(message_id)["status"] == "sent"
+    assert mail_queue.status(message_id)["attempts"] == 2
+    mail_queue.close(timeout=1)
+
+
+def test_only_the_last_finished_messages_are_kept(smtp_sink):
+    mail_queue = MailQueue(make_config(smtp_sink.port), keep=2)
+    ids = []
+    for i in range(4):
+        ids.append(mail_queue.send(f"answer {i}"))
+        assert mail_queue.flush(timeout=10)
+    ids.append(mail_queue.send("answer 4"))
+    assert mail_queue.flush(timeout=10)
+    for old in ids[:2]:
+        with pytest.raises(ValueError, match="Unknown message id"):
+            mail_queue.status(old)
+    assert [mail_queue.status(i)["status"] for i in ids[2:]] == ["sent"] * 3
+    mail_queue.close(timeout=1)
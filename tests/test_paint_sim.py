@@ -0,0 +1,35 @@
+from canvas import MSPaintCanvas
+from paint_sim import SimulatedPaintDriver
+from ui_wait import reset_timings, step_histogram, wait_until
+
+
+def open_canvas():
+    # Every UI reaction of the simulated Paint window takes 20 to 80 ms
+    canvas = MSPaintCanvas(driver=SimulatedPaintDriver(min_delay=0.02, max_delay=0.08), timeout=5)
+    canvas.open()
+    return canvas
+
+
+def paint_window(canvas):
+    return canvas.app.window(class_name="MSPaintApp")
+
+
+def test_tool_selection_is_asynchronous():
+    canvas = open_canvas()
+    window = paint_window(canvas)
+    window.click_input(coords=(661, 102))
+    assert window.tool is None
+    wait_until(lambda: canvas.driver.tool_selected(window, "rectangle"), "test_rectangle_tool", timeout=5)
+
+
+def test_rectangle_and_text_with_ui_delays():
+    reset_timings()
+    canvas = open_canvas()
+    canvas.rectangle(100, 100, 300, 200)
+    canvas.text("25591", 120, 120)
+
+    image = paint_window(canvas).child_window(class_name="MSPaintView").capture_as_image().convert("L")
+    # Left edge of the rectangle, and the text inside it
+    assert image.getpixel((100, 150)) == 0
+    assert image.crop((122, 122, 200, 140)).getextrema()[0] < 128
+    assert {"rectangle_tool", "shortcut_key", "text_tool"} <= set(step_histogram())
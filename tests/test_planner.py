@@ -0,0 +1,68 @@
+import pytest
+from mcp.types import Tool
+
+import tool_registry
+from planner import PlanError, compile_plan, resolve
+from tool_calls import result_value
+
+
+def tool(name, properties, required=()):
+    return Tool(name=name, description=name,
+                inputSchema={"type": "object", "properties": properties, "required": list(required)})
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    monkeypatch.setattr(tool_registry, "CACHE_DIR", str(tmp_path))
+    return tool_registry.ToolRegistry([
+        tool("strings_to_chars_to_int", {"string": {"type": "string"}}, ["string"]),
+        tool("int_list_to_power_sum", {"int_list": {"type": "array", "items": {"type": "integer"}}}, ["int_list"]),
+        tool("open_paint", {}),
+    ])
+
+
+def test_compile_plan_adds_data_dependencies(registry):
+    plan = {"steps": [
+        {"id": "s1", "name": "strings_to_chars_to_int", "params": {"string": "AB"}},
+        {"id": "s2", "name": "int_list_to_power_sum", "params": {"int_list": "$s1"}},
+        {"id": "s3", "name": "open_paint", "depends_on": "s2"},
+    ], "final_answer": "$s2"}
+    calls = compile_plan(plan, registry)
+    assert [call["depends_on"] for call in calls] == [[], ["s1"], ["s2"]]
+
+
+@pytest.mark.parametrize("steps, message", [
+    ([{"id": "s1", "name": "nope"}], "Unknown tool"),
+    ([{"id": "s1", "name": "int_list_to_power_sum", "params": {}}], "Missing parameter"),
+    ([{"id": "s1", "name": "int_list_to_power_sum", "params": {"int_list": "$s9"}}], "unknown step s9"),
+    ([{"id": "s1", "name": "open_paint", "depends_on": ["s2"]},
+      {"id": "s2", "name": "open_paint", "depends_on": ["s1"]}], "Dependency cycle"),
+    ([{"id": "s1", "name": "open_paint"}, {"id": "s1", "name": "open_paint"}], "Duplicate call id"),
+])
+def test_compile_plan_rejects_invalid_plans(registry, steps, message):
+    with pytest.raises(PlanError, match=message):
+        compile_plan({"steps": steps}, registry)
+
+
+def test_compile_plan_refuses_step_ids_of_earlier_plans(registry):
+    plan = {"steps": [{"id": "s1", "name": "int_list_to_power_sum", "params": {"int_list": "$s1"}}]}
+    with pytest.raises(PlanError, match="earlier plan"):
+        compile_plan(plan, registry, completed={"s1": [65]})
+
+
+def test_resolve_refs():
+    values = {"s1": [65, 66], "s2": {"name": "x"}}
+    assert resolve({"a": "$s1", "b": "$s1.1", "c": "$s2.name", "d": "sum ${s1.0} and ${s2.name}"}, values) == \
+        {"a": [65, 66], "b": 66, "c": "x", "d": "sum 65 and x"}
+
+
+@pytest.mark.parametrize("ref", ["$s1.5", "$s2.missing", "$s1.x", "$s3", "${s1.5}"])
+def test_resolve_bad_refs_raise_plan_error(ref):
+    with pytest.raises(PlanError):
+        resolve(ref, {"s1": [65, 66], "s2": {"name": "x"}})
+
+
+def test_result_value_keeps_one_item_lists():
+    assert result_value(["65"], {"result": [65]}) == [65]
+    assert result_value(["3"], {"result": 3}) == 3
+    assert result_value(["65"]) == 65
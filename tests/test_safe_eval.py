@@ -0,0 +1,68 @@
+import pytest
+
+from safe_eval import (MAX_EXPRESSION_LENGTH, MAX_INT_BITS, ExpressionLimitError, UnsafeExpressionError,
+                       check_pow, safe_eval)
+
+
+@pytest.mark.parametrize("expression, expected", [
+    ("73**2 + 78**2 + 68**2 + 73**2 + 65**2", 25591),
+    ("(2 + 3) * 4 - 7 // 2 % 3", 20),
+    ("sqrt(16) + factorial(5)", 124.0),
+    ("max([1, 5, 3]) == 5", True),
+    ("1 < 2 < 3", True),
+    ("pow(2, 10) << 2", 4096),
+])
+def test_arithmetic(expression, expected):
+    assert safe_eval(expression) == expected
+
+
+@pytest.mark.parametrize("expression", [
+    "().__class__",
+    "(1).real",
+    "__import__('os')",
+    "open('/etc/passwd')",
+    "__builtins__",
+    "x",
+    "lambda: 1",
+    "[x for x in [1, 2]]",
+    "{x: 1 for x in [1]}",
+    "sqrt(x=4)",
+    "sum.__call__([1])",
+    "1 if True else 2",
+    "True",
+    "import os",
+])
+def test_everything_outside_the_whitelist_is_rejected(expression):
+    with pytest.raises(UnsafeExpressionError):
+        safe_eval(expression)
+
+
+def test_check_pow_limits():
+    # 2 ** (MAX_INT_BITS - 1) has exactly MAX_INT_BITS bits
+    check_pow(2, MAX_INT_BITS - 1)
+    check_pow(-1, 10**12)
+    check_pow(10, -5)
+    with pytest.raises(ExpressionLimitError):
+        check_pow(2, MAX_INT_BITS)
+    with pytest.raises(ExpressionLimitError):
+        check_pow(-3, MAX_INT_BITS)
+
+
+@pytest.mark.parametrize("expression", [
+    "9**9**9",
+    "2**100000",
+    "pow(10, 40000)",
+    "1 << 100001",
+    "factorial(5001)",
+    "'x' * 10**9",
+    "2**60000 * 2**60000",
+    "1+" * MAX_EXPRESSION_LENGTH + "1",
+])
+def test_size_limits(expression):
+    with pytest.raises(ExpressionLimitError):
+        safe_eval(expression)
+
+
+def test_time_limit():
+    with pytest.raises(ExpressionLimitError, match="too long"):
+        safe_eval("factorial(3000) % 7 + 1", time_limit=0)
@@ -0,0 +1,66 @@
+import math
+
+import pytest
+
+import sequences
+from sequences import digit_count, factorial, fibonacci_nth, fibonacci_range, format_big_int, pow10
+
+
+def test_fibonacci():
+    assert [fibonacci_nth(n) for n in range(10)] == [0, 1, 1, 2, 3, 5, 8, 13, 21, 34]
+    assert fibonacci_nth(100) == 354224848179261915075
+    page = fibonacci_range(500, 5)
+    assert page == [fibonacci_nth(n) for n in range(500, 505)]
+    assert page[2] == page[0] + page[1]
+
+
+def test_limits():
+    with pytest.raises(ValueError, match="negative"):
+        fibonacci_nth(-1)
+    with pytest.raises(ValueError, match="limited"):
+        fibonacci_nth(sequences.MAX_FIB_N + 1)
+    with pytest.raises(ValueError, match="per page"):
+        fibonacci_range(0, sequences.MAX_PAGE + 1)
+    with pytest.raises(ValueError, match="limited"):
+        factorial(sequences.MAX_FACTORIAL_N + 1)
+
+
+def test_factorial():
+    assert factorial(0) == 1
+    assert factorial(30) == math.factorial(30)
+
+
+@pytest.mark.parametrize("value", [0, 9, 10, 99, 100, 10**20 - 1, 10**20, 10**300, 10**300 - 1, -10**50])
+def test_digit_count(value):
+    assert digit_count(value) == len(str(abs(value)))
+
+
+def test_pow10_steps_up_and_down():
+    for k in [5, 40, 39, 100, 20, 2000, 1990, 0]:
+        assert pow10(k) == 10**k
+
+
+def test_format_big_int():
+    assert format_big_int(2**53 - 1) == 2**53 - 1
+    assert format_big_int(2**53) == str(2**53)
+    huge = 7 * 10**5000 + 12345
+    summary = format_big_int(huge)
+    assert summary == {"digits": 5001, "leading_digits": "7" + "0" * 19,
+                       "trailing_digits": "0" * 15 + "12345", "negative": False}
+    assert format_big_int(-huge)["negative"] is True
+
+
+def test_disk_memo_survives_the_in_memory_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(sequences, "MEMO_PATH", str(tmp_path / "memo"))
+    monkeypatch.setattr(sequences, "PERSIST_MIN_N", 10)
+    calls = []
+
+    def compute(n):
+        calls.append(n)
+        return n * 2
+
+    assert sequences._disk_memo("test", 20, compute) == 40
+    assert sequences._disk_memo("test", 20, compute) == 40
+    assert sequences._disk_memo("test", 5, compute) == 10
+    # 20 came from the shelve the second time, 5 is below PERSIST_MIN_N
+    assert calls == [20, 5]
@@ -0,0 +1,79 @@
+import asyncio
+import pickle
+
+import pytest
+from mcp.types import TextContent
+
+import tool_cache
+from tool_cache import DiskStore, ResultCache, canonical_key, pure
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = ResultCache(max_entries=8)
+    monkeypatch.setattr(tool_cache, "CACHE", cache)
+    return cache
+
+
+def test_canonical_key_ignores_argument_order():
+    assert canonical_key("add", {"a": 1, "b": 2}) == canonical_key("add", {"b": 2, "a": 1}) == 'add:{"a":1,"b":2}'
+    assert canonical_key("add", {"a": 1}) != canonical_key("subtract", {"a": 1})
+
+
+def test_pure_memoizes_on_bound_arguments(cache):
+    calls = []
+
+    @pure
+    def add(a: int, b: int = 0) -> int:
+        calls.append((a, b))
+        return a + b
+
+    assert add(1, 2) == add(a=1, b=2) == add(b=2, a=1) == 3
+    assert add(1) == add(1, 0) == 1
+    assert calls == [(1, 2), (1, 0)]
+    assert cache.stats()["tools"]["add"]["hit"] == 3
+
+
+def test_error_results_are_not_cached(cache):
+    calls = []
+
+    @pure
+    async def divide(a: int, b: int):
+        calls.append((a, b))
+        if b == 0:
+            return TextContent(type="text", text="Error: division by zero")
+        return [TextContent(type="text", text=str(a // b))]
+
+    async def scenario():
+        return [await divide(1, 0), await divide(1, 0), await divide(4, 2), await divide(4, 2)]
+
+    results = asyncio.run(scenario())
+    assert results[0].text.startswith("Error")
+    assert results[3][0].text == "2"
+    assert calls == [(1, 0), (1, 0), (4, 2)]
+
+
+def test_memory_is_bounded_by_bytes():
+    size = len(pickle.dumps("x" * 100))
+    cache = ResultCache(max_entries=100, max_bytes=3 * size, max_item_bytes=2 * size)
+    for key in "abc":
+        cache.put("t", key, "x" * 100)
+    assert cache.get("t", "a") == (True, "x" * 100)
+    cache.put("t", "d", "x" * 100)
+    # b was the least recently used
+    assert cache.get("t", "b") == (False, None)
+    assert list(cache.entries) == ["c", "a", "d"]
+    assert cache.bytes == 3 * size
+    # Too big for memory, and it must not push anything else out
+    cache.put("t", "big", "x" * 1000)
+    assert "big" not in cache.entries
+    assert cache.bytes == 3 * size
+
+
+def test_disk_store_is_shared_across_caches(tmp_path):
+    path = str(tmp_path / "tool_cache.sqlite3")
+    ResultCache(store=DiskStore(path)).put("add", "add:{}", 3)
+    other = ResultCache(store=DiskStore(path))
+    assert other.get("add", "add:{}") == (True, 3)
+    assert other.get("add", "add:{}") == (True, 3)
+    assert other.stats()["tools"]["add"] == {"hit": 1, "disk_hit": 1, "miss": 0, "hit_rate": 1.0}
@@ -0,0 +1,47 @@
+import pytest
+
+from tool_calls import result_value, validate_calls
+
+
+def test_calls_are_normalized():
+    calls = validate_calls([
+        {"name": "add", "params": {"a": 1, "b": 2}},
+        {"id": 7, "name": "strings_to_chars_to_int", "depends_on": "c1"},
+    ])
+    assert calls == [
+        {"id": "c1", "name": "add", "params": {"a": 1, "b": 2}, "depends_on": []},
+        {"id": "7", "name": "strings_to_chars_to_int", "params": {}, "depends_on": ["c1"]},
+    ]
+
+
+@pytest.mark.parametrize("calls, message", [
+    ([], "non-empty list"),
+    ({"name": "add"}, "non-empty list"),
+    ([{"params": {}}], "Call 0 needs a name"),
+    ([{"id": "a", "name": "add"}, {"id": "a", "name": "subtract"}], "Duplicate call id a"),
+    ([{"id": "a", "name": "add", "depends_on": ["b"]}], "Call a depends on unknown id b"),
+    ([{"id": "a", "name": "add", "depends_on": ["a"]}], "Dependency cycle: a -> a"),
+    ([{"id": "a", "name": "add", "depends_on": ["b"]}, {"id": "b", "name": "add", "depends_on": ["a"]}],
+     "Dependency cycle: a -> b -> a"),
+])
+def test_invalid_calls_are_refused(calls, message):
+    with pytest.raises(ValueError, match=message):
+        validate_calls(calls)
+
+
+def test_a_shared_dependency_is_not_a_cycle():
+    calls = validate_calls([
+        {"id": "a", "name": "add"},
+        {"id": "b", "name": "add", "depends_on": ["a"]},
+        {"id": "c", "name": "add", "depends_on": ["a", "b"]},
+    ])
+    assert [call["depends_on"] for call in calls] == [[], ["a"], ["a", "b"]]
+
+
+def test_result_value():
+    assert result_value(["[1, 2]"]) == [1, 2]
+    assert result_value(["5", "six"]) == [5, "six"]
+    assert result_value("plain text") == "plain text"
+    # Structured output keeps a one-item list a list
+    assert result_value(["7"], structured={"result": [7]}) == [7]
+    assert result_value([], structured={"sum": 3, "count": 2}) == {"sum": 3, "count": 2}
@@ -0,0 +1,92 @@
+import os
+import time
+import asyncio
+
+import pytest
+
+import tool_executor
+from tool_executor import WorkerPool, offload
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+
+
+# Workers import this module by name, like cpu_tools
+@offload("cpu", timeout=0.5)
+def sleep_for(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+@offload("cpu", timeout=5)
+def worker_pid():
+    return os.getpid()
+
+
+@offload("cpu", timeout=5)
+def crash():
+    os._exit(3)
+
+
+@offload("cpu", timeout=5)
+def fail():
+    raise ValueError("boom")
+
+
+@pytest.fixture
+def run(monkeypatch):
+    # The workers find this module on PYTHONPATH, each test gets its own single worker pool
+    monkeypatch.setenv("PYTHONPATH", TESTS)
+    monkeypatch.setattr(tool_executor, "_process_pool", WorkerPool(1))
+
+    def run(coro):
+        async def main():
+            try:
+                return await coro
+            finally:
+                await tool_executor.shutdown()
+        return asyncio.run(main())
+    return run
+
+
+async def settle(pool):
+    # Wait for the background replacement of a killed worker
+    await asyncio.gather(*pool.background)
+
+
+def test_timeout_kills_the_worker_and_starts_a_warm_replacement(run):
+    async def scenario():
+        pool = tool_executor.get_process_pool()
+        first = await worker_pid()
+        killed = pool.idle[0]
+        with pytest.raises(TimeoutError, match="timed out after 0.5s"):
+            await sleep_for(2)
+        await settle(pool)
+        assert not killed.alive
+        assert len(pool.idle) == 1
+        assert await worker_pid() != first
+    run(scenario())
+
+
+def test_crashed_worker_is_replaced(run):
+    async def scenario():
+        with pytest.raises(RuntimeError, match="exited with code 3"):
+            await crash()
+        await settle(tool_executor.get_process_pool())
+        assert await worker_pid() > 0
+    run(scenario())
+
+
+def test_tool_errors_are_raised_and_the_worker_is_reused(run):
+    async def scenario():
+        first = await worker_pid()
+        with pytest.raises(ValueError, match="boom"):
+            await fail()
+        assert await worker_pid() == first
+    run(scenario())
+
+
+def test_waiting_for_a_free_worker_does_not_count_against_the_timeout(run):
+    async def scenario():
+        # One worker, two calls of 0.3s each, the second one waits but stays within its 0.5s
+        return await asyncio.gather(sleep_for(0.3), sleep_for(0.3))
+    assert run(scenario()) == [0.3, 0.3]
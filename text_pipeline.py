@@ -0,0 +1,72 @@
+from collections import Counter
+import numpy as np
+from exp_sum import exponential_sum
+from safe_eval import check_pow
+
+CHUNK_SIZE = 1 << 20  # characters (or bytes) per chunk
+
+
+def iter_chunks(text=None, path=None, mode="unicode", encoding="utf-8", chunk_size=CHUNK_SIZE):
+    """Yield the input as chunks of str (unicode mode) or bytes (bytes mode)"""
+    if path:
+        if mode == "bytes":
+            with open(path, "rb") as f:
+                while chunk := f.read(chunk_size):
+                    yield chunk
+        else:
+            with open(path, encoding=encoding) as f:
+                while chunk := f.read(chunk_size):
+                    yield chunk
+        return
+    text = text or ""
+    for start in range(0, len(text), chunk_size):
+        chunk = text[start:start + chunk_size]
+        yield chunk.encode(encoding) if mode == "bytes" else chunk
+
+
+def chunk_to_codes(chunk):
+    """Code points of a str chunk, or byte values of a bytes chunk, as a NumPy buffer"""
+    if isinstance(chunk, bytes):
+        return np.frombuffer(chunk, dtype=np.uint8)
+    # utf-32 gives exactly one 4 byte unit per code point, i.e. ord() of every character
+    return np.frombuffer(chunk.encode("utf-32-le"), dtype="<u4")
+
+
+def code_histogram(chunks):
+    """Count how often every code appears, one chunk at a time"""
+    counts = Counter()
+    for chunk in chunks:
+        values, freq = np.unique(chunk_to_codes(chunk), return_counts=True)
+        counts.update(dict(zip(values.tolist(), freq.tolist())))
+    return counts
+
+
+def power_sum(counts, power=2):
+    """Exact sum of code ** power, using the histogram so each distinct code is raised once"""
+    return sum(count * code ** power for code, count in counts.items())
+
+
+def aggregate_text(text=None, path=None, reduction="power_sum", power=2, mode="unicode",
+                   encoding="utf-8", chunk_size=CHUNK_SIZE, exp_mode="auto"):
+    """Stream text through code point -> power/exp -> sum and return only the aggregate"""
+    if mode not in ("unicode", "bytes"):
+        raise ValueError("mode must be 'unicode' or 'bytes'")
+    counts = code_histogram(iter_chunks(text, path, mode, encoding, chunk_size))
+    if reduction == "power_sum":
+        if counts:
+            # The largest code gives the largest power, refused before any of them is computed
+            check_pow(max(counts), power)
+        result = power_sum(counts, power)
+    elif reduction == "exponential_sum":
+        # Code points above ~709 overflow float64, exp_sum picks a safe mode
+        result = exponential_sum(list(counts), list(counts.values()), mode=exp_mode)
+    elif reduction == "sum":
+        result = power_sum(counts, 1)
+    else:
+        raise ValueError("reduction must be 'power_sum', 'exponential_sum' or 'sum'")
+    return {
+        "count": sum(counts.values()),
+        "distinct": len(counts),
+        "reduction": reduction,
+        "result": result,
+    }
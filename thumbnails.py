@@ -0,0 +1,140 @@
+import io
+import os
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image as PILImage
+
+CACHE_DIR = os.path.join(".cache", "thumbnails")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp", ".tif", ".tiff")
+FORMATS = {"png": "PNG", "webp": "WEBP", "jpeg": "JPEG"}
+# Least recently used thumbnails are deleted past this size
+CACHE_MAX_BYTES = int(float(os.getenv("THUMBNAIL_CACHE_MAX_MB", "100")) * 1024 * 1024)
+
+# Bytes in CACHE_DIR as far as this process knows, None until the first write scans it
+_cache_bytes = None
+_cache_lock = threading.Lock()
+
+
+def _cache_path(path, size, fmt):
+    # mtime and file size change whenever the image is rewritten
+    stat = os.stat(path)
+    key = f"{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}|{size[0]}x{size[1]}|{fmt}"
+    return os.path.join(CACHE_DIR, hashlib.sha1(key.encode("utf-8")).hexdigest() + "." + fmt)
+
+
+def _to_8bit(img, fmt):
+    """img in a mode the resampler and the target format handle: L, LA, RGB or RGBA (RGB or L for JPEG)"""
+    if img.mode.startswith("I;16"):
+        # 16-bit grayscale PNGs, scale to 8 bits instead of clipping every value above 255
+        img = img.convert("I").point(lambda v: v * (1 / 256)).convert("L")
+    elif img.mode in ("I", "F"):
+        img = img.convert("L")
+    if fmt == "jpeg":
+        return img if img.mode in ("RGB", "L") else img.convert("RGB")
+    if img.mode in ("RGB", "RGBA", "L", "LA"):
+        return img
+    # P keeps its transparency as RGBA, CMYK, YCbCr and the rest become RGB(A)
+    return img.convert("RGBA")
+
+
+def _render(path, size, fmt):
+    with PILImage.open(path) as img:
+        # For JPEGs the decoder downscales while decoding, much faster than a full decode
+        img.draft("RGB", size)
+        # Convert before resizing, thumbnail() cannot resample every mode (e.g. I;16)
+        img = _to_8bit(img, fmt)
+        img.thumbnail(size)
+        buffer = io.BytesIO()
+        img.save(buffer, format=FORMATS[fmt])
+        return buffer.getvalue()
+
+
+def make_thumbnail(path, size=(100, 100), fmt="png", use_cache=True):
+    """Encoded thumbnail bytes for one image, served from the disk cache when unchanged"""
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {sorted(FORMATS)}")
+    size = (int(size[0]), int(size[1]))
+    cache_path = _cache_path(path, size, fmt) if use_cache else None
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with open(cache_path, "rb") as f:
+                data = f.read()
+            # The modification time is the last use for the LRU sweep
+            os.utime(cache_path)
+            return data
+        except FileNotFoundError:
+            # Swept by another thread or process in between
+            pass
+    data = _render(path, size, fmt)
+    if cache_path:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # Write then rename, so a parallel reader never sees half a file
+        tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, cache_path)
+        _account(len(data))
+    return data
+
+
+def _sweep_cache(target_bytes):
+    """Delete the least recently used thumbnails until at most target_bytes are left, returns the bytes left"""
+    entries = []
+    for entry in os.scandir(CACHE_DIR):
+        # Files still being written by another thread are left alone
+        if entry.is_file() and not entry.name.endswith(".tmp"):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= target_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+    return total
+
+
+def _account(nbytes):
+    global _cache_bytes
+    with _cache_lock:
+        if _cache_bytes is None:
+            _cache_bytes = _sweep_cache(CACHE_MAX_BYTES)
+        else:
+            _cache_bytes += nbytes
+        if _cache_bytes > CACHE_MAX_BYTES:
+            # Down to 90%, so the next writes do not each rescan the directory
+            _cache_bytes = _sweep_cache(CACHE_MAX_BYTES * 9 // 10)
+
+
+def expand_paths(paths):
+    """Directories expand to the images directly inside them"""
+    expanded = []
+    for path in paths:
+        if os.path.isdir(path):
+            expanded.extend(
+                os.path.join(path, name) for name in sorted(os.listdir(path))
+                if name.lower().endswith(IMAGE_EXTENSIONS)
+            )
+        else:
+            expanded.append(path)
+    return expanded
+
+
+def make_thumbnails(paths, size=(100, 100), fmt="png", workers=4):
+    """Thumbnail many images in a thread pool, returns (path, bytes or None, error or None) in order"""
+    def one(path):
+        try:
+            return path, make_thumbnail(path, size, fmt), None
+        except Exception as e:
+            return path, None, str(e)
+
+    paths = expand_paths(paths)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(one, paths))
@@ -0,0 +1,217 @@
+import os
+import json
+import time
+import pickle
+import sqlite3
+import inspect
+import threading
+import functools
+from collections import OrderedDict
+from logger import mcp_server_logger
+import metrics
+
+
+def canonical_key(name, arguments):
+    """Tool name plus its arguments as sorted, compact JSON, so argument order never splits an entry"""
+    return name + ":" + json.dumps(arguments, sort_keys=True, separators=(",", ":"), default=repr)
+
+
+class DiskStore:
+    """SQLite table of pickled tool results shared by every server process, least recently used go past max_bytes.
+    Pure results never go stale, so there is no TTL."""
+
+    def __init__(self, path, max_bytes=50 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, tool TEXT, value BLOB, size INTEGER, last_used REAL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+
+    def get(self, key):
+        with self.lock:
+            row = self.db.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return False, None
+            self.db.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+        # The file is local and only ever written by these servers, so its pickles are trusted
+        return True, pickle.loads(row[0])
+
+    def put(self, key, tool, value, data=None):
+        if data is None:
+            data = pickle.dumps(value)
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO results (key, tool, value, size, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, tool, data, len(data), time.time()),
+            )
+            total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            for old_key, size in self.db.execute("SELECT key, size FROM results ORDER BY last_used").fetchall():
+                self.db.execute("DELETE FROM results WHERE key = ?", (old_key,))
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+
+def is_error(value):
+    """Tools report most failures as a TextContent (or a list of them) whose text starts with Error"""
+    items = value if isinstance(value, (list, tuple)) else [value]
+    return any(isinstance(getattr(item, "text", None), str) and item.text.startswith("Error") for item in items)
+
+
+class ResultCache:
+    """In-memory LRU of tool results in front of an optional DiskStore, with hit counts per tool.
+    Bounded by max_entries and by max_bytes of pickled results, a result above max_item_bytes is not kept in memory."""
+
+    def __init__(self, max_entries=512, store=None, max_bytes=32 * 1024 * 1024, max_item_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes or max_bytes // 8
+        self.store = store
+        # key -> (value, size in bytes)
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.counts = {}
+
+    def _count(self, tool, result):
+        counts = self.counts.setdefault(tool, {"hit": 0, "disk_hit": 0, "miss": 0})
+        counts[result] += 1
+        metrics.inc("tool_cache_total", tool=tool, result=result)
+
+    def get(self, tool, key):
+        """(found, value)"""
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self._count(tool, "hit")
+                return True, self.entries[key][0]
+        if self.store is not None:
+            try:
+                found, value = self.store.get(key)
+            except Exception as e:
+                mcp_server_logger.info("Tool cache store read failed: %s", e)
+                found, value = False, None
+            if found:
+                with self.lock:
+                    self._remember(key, value, _pickled_size(value))
+                    self._count(tool, "disk_hit")
+                return True, value
+        with self.lock:
+            self._count(tool, "miss")
+        return False, None
+
+    def put(self, tool, key, value):
+        try:
+            data = pickle.dumps(value)
+        except Exception as e:
+            # An unpicklable result is kept in memory only, at its repr size
+            mcp_server_logger.info("Tool cache cannot pickle the result of %s: %s", tool, e)
+            data = None
+        with self.lock:
+            self._remember(key, value, len(data) if data is not None else len(repr(value)))
+        if self.store is not None and data is not None:
+            try:
+                self.store.put(key, tool, value, data)
+            except Exception as e:
+                # A locked file only costs the shared copy
+                mcp_server_logger.info("Tool cache store write failed for %s: %s", tool, e)
+
+    def _remember(self, key, value, size):
+        if key in self.entries:
+            self.bytes -= self.entries.pop(key)[1]
+        if size > self.max_item_bytes:
+            return
+        self.entries[key] = (value, size)
+        self.bytes += size
+        while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+            self.bytes -= self.entries.popitem(last=False)[1][1]
+
+    def stats(self):
+        with self.lock:
+            tools = {}
+            for tool, counts in sorted(self.counts.items()):
+                lookups = sum(counts.values())
+                hits = counts["hit"] + counts["disk_hit"]
+                tools[tool] = dict(counts, hit_rate=hits / lookups if lookups else 0.0)
+            return {"entries": len(self.entries), "max_entries": self.max_entries,
+                    "bytes": self.bytes, "max_bytes": self.max_bytes,
+                    "store": self.store.path if self.store is not None else None, "tools": tools}
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+            self.counts.clear()
+
+
+def _pickled_size(value):
+    try:
+        return len(pickle.dumps(value))
+    except Exception:
+        return len(repr(value))
+
+
+def make_cache():
+    """ResultCache from TOOL_CACHE_SIZE (entries), TOOL_CACHE_MEMORY_MB, TOOL_CACHE_PATH (SQLite file,
+    unset keeps results in memory only) and TOOL_CACHE_MAX_MB"""
+    path = os.getenv("TOOL_CACHE_PATH", "")
+    store = None
+    if path:
+        store = DiskStore(path, max_bytes=int(float(os.getenv("TOOL_CACHE_MAX_MB", "50")) * 1024 * 1024))
+    return ResultCache(max_entries=int(os.getenv("TOOL_CACHE_SIZE", "512")), store=store,
+                       max_bytes=int(float(os.getenv("TOOL_CACHE_MEMORY_MB", "32")) * 1024 * 1024))
+
+
+# One cache per server process, shared by all pure tools
+CACHE = make_cache()
+
+
+def pure(func):
+    """Memoize a deterministic tool on its name and canonical arguments. Put it below @mcp.tool() and above
+    @offload, so a hit never reaches the worker pool. Neither raised errors nor "Error: ..." results are cached.
+    Only for tools without side effects, never send_email or the Paint tools."""
+    name = func.__name__
+    signature = inspect.signature(func)
+
+    def key_for(args, kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        return canonical_key(name, bound.arguments)
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = key_for(args, kwargs)
+            found, value = CACHE.get(name, key)
+            if found:
+                mcp_server_logger.debug("Tool cache hit: %s", key)
+                return value
+            value = await func(*args, **kwargs)
+            if not is_error(value):
+                CACHE.put(name, key, value)
+            return value
+    else:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = key_for(args, kwargs)
+            found, value = CACHE.get(name, key)
+            if found:
+                mcp_server_logger.debug("Tool cache hit: %s", key)
+                return value
+            value = func(*args, **kwargs)
+            if not is_error(value):
+                CACHE.put(name, key, value)
+            return value
+
+    wrapper.pure = True
+    return wrapper
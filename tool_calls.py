@@ -0,0 +1,180 @@
+import os
+import re
+import json
+import time
+import asyncio
+from logger import client_logger
+import metrics
+import tracing
+
+
+def result_to_text(result):
+    """MCP CallToolResult to (iteration_result, result_str) as the agent prompt shows it"""
+    if hasattr(result, 'content'):
+        # Handle multiple content items
+        if isinstance(result.content, list):
+            iteration_result = [
+                item.text if hasattr(item, 'text') else str(item)
+                for item in result.content
+            ]
+        else:
+            iteration_result = str(result.content)
+    else:
+        iteration_result = str(result)
+
+    if isinstance(iteration_result, list):
+        result_str = f"[{', '.join(iteration_result)}]"
+    else:
+        result_str = str(iteration_result)
+    return iteration_result, result_str
+
+
+class ToolCallError(RuntimeError):
+    """The server answered a tool call with isError set"""
+
+
+def result_value(iteration_result, structured=None):
+    """Python value of a tool result for $ref placeholders.
+    FastMCP's structured output {"result": value} keeps the value's type, a one-item list stays a list.
+    Without it JSON texts are decoded and one item is unwrapped."""
+    if isinstance(structured, dict):
+        return structured["result"] if set(structured) == {"result"} else structured
+    if not isinstance(iteration_result, list):
+        iteration_result = [iteration_result]
+    values = []
+    for text in iteration_result:
+        try:
+            values.append(json.loads(text))
+        except (TypeError, ValueError):
+            values.append(text)
+    return values[0] if len(values) == 1 else values
+
+
+async def call_tool(session, registry, func_name, params, strict=False):
+    """Coerce params with the tool's schema and call it, returns (arguments, iteration_result, result_str, value).
+    With strict=True an error result raises ToolCallError instead of being returned as text."""
+    client_logger.debug("Function name: %s", func_name)
+    client_logger.debug("Raw parameters: %s", params)
+
+    # O(1) lookup and precompiled coercion from the tool's input schema
+    arguments = registry.coerce(func_name, params)
+    client_logger.debug("Final arguments: %s", arguments)
+
+    with metrics.timer("mcp_round_trip", tool=func_name), \
+            tracing.span(f"call_tool {func_name}", kind="client", tool=func_name) as span:
+        # The server continues the trace from the traceparent in the request _meta
+        result = await session.call_tool(func_name, arguments=arguments,
+                                         meta={"traceparent": span.traceparent()})
+    client_logger.debug("Raw result: %s", result)
+
+    iteration_result, result_str = result_to_text(result)
+    if getattr(result, "isError", False):
+        metrics.inc("mcp_tool_errors_total", tool=func_name)
+        if strict:
+            raise ToolCallError(result_str)
+    client_logger.debug("Final iteration result: %s", iteration_result)
+    value = result_value(iteration_result, getattr(result, "structuredContent", None))
+    return arguments, iteration_result, result_str, value
+
+
+# send_email answers "Email queued with message id <id>"
+EMAIL_ID = re.compile(r"message id ([0-9a-f]+)")
+MAIL_CONFIRM_TIMEOUT = float(os.getenv("MAIL_CONFIRM_TIMEOUT", "30"))
+
+
+async def confirm_email(session, registry, result_str, timeout=MAIL_CONFIRM_TIMEOUT, interval=0.2):
+    """Poll email_status for the message a send_email result queued until it is sent or failed.
+    Returns the last status dict, {"status": "unknown"} if the result has no message id."""
+    match = EMAIL_ID.search(result_str or "")
+    if not match:
+        return {"status": "unknown", "error": result_str}
+    deadline = time.monotonic() + timeout
+    while True:
+        _, _, _, delivery = await call_tool(session, registry, "email_status", {"message_id": match.group(1)})
+        if not isinstance(delivery, dict):
+            return {"status": "unknown", "error": str(delivery)}
+        if delivery.get("status") in ("sent", "failed") or time.monotonic() >= deadline:
+            return delivery
+        await asyncio.sleep(interval)
+
+
+def validate_calls(calls):
+    """Normalize a FUNCTION_CALLS list to dicts with id, name, params and depends_on.
+    Raises ValueError on duplicate or unknown ids and on dependency cycles."""
+    if not isinstance(calls, list) or not calls:
+        raise ValueError("calls must be a non-empty list")
+    normalized = []
+    for i, call in enumerate(calls):
+        if not isinstance(call, dict) or "name" not in call:
+            raise ValueError(f"Call {i} needs a name")
+        depends_on = call.get("depends_on") or []
+        if isinstance(depends_on, str):
+            depends_on = [depends_on]
+        normalized.append({
+            "id": str(call.get("id", f"c{i + 1}")),
+            "name": call["name"],
+            "params": call.get("params") or {},
+            "depends_on": [str(d) for d in depends_on],
+        })
+
+    by_id = {}
+    for call in normalized:
+        if call["id"] in by_id:
+            raise ValueError(f"Duplicate call id {call['id']}")
+        by_id[call["id"]] = call
+    for call in normalized:
+        for dep in call["depends_on"]:
+            if dep not in by_id:
+                raise ValueError(f"Call {call['id']} depends on unknown id {dep}")
+
+    # Depth-first search for cycles, they would otherwise wait forever
+    state = {}
+
+    def visit(call_id, path):
+        if state.get(call_id) == "done":
+            return
+        if state.get(call_id) == "visiting":
+            raise ValueError(f"Dependency cycle: {' -> '.join(path + [call_id])}")
+        state[call_id] = "visiting"
+        for dep in by_id[call_id]["depends_on"]:
+            visit(dep, path + [call_id])
+        state[call_id] = "done"
+
+    for call in normalized:
+        visit(call["id"], [])
+    return normalized
+
+
+async def run_calls(session, registry, calls, prepare=None, strict=False):
+    """Run validated calls concurrently over one MCP session, each one once its dependencies finished.
+    prepare(call, results) may rewrite a call's params from earlier results just before it runs.
+    Returns one result dict per call in the given order, a failed call skips its dependents."""
+    tasks = {}
+    results = {}
+
+    async def run_one(call):
+        if call["depends_on"]:
+            await asyncio.gather(*(tasks[dep] for dep in call["depends_on"]))
+        failed = [dep for dep in call["depends_on"] if results[dep]["status"] != "ok"]
+        entry = {"id": call["id"], "name": call["name"], "arguments": call["params"],
+                 "result": None, "status": "ok", "error": None}
+        if failed:
+            entry["status"] = "skipped"
+            entry["error"] = f"dependency {', '.join(failed)} failed"
+        else:
+            try:
+                params = prepare(call, results) if prepare else call["params"]
+                entry["arguments"], entry["iteration_result"], entry["result"], entry["value"] = await call_tool(
+                    session, registry, call["name"], params, strict=strict)
+            except Exception as e:
+                client_logger.info("Call %s (%s) failed: %s", call["id"], call["name"], e)
+                entry["status"] = "error"
+                entry["error"] = str(e)
+        results[call["id"]] = entry
+        return entry
+
+    with tracing.span("parallel_calls", calls=len(calls)):
+        for call in calls:
+            tasks[call["id"]] = asyncio.ensure_future(run_one(call))
+        await asyncio.gather(*tasks.values())
+    return [results[call["id"]] for call in calls]
@@ -0,0 +1,214 @@
+import os
+import sys
+import pickle
+import struct
+import asyncio
+import logging
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from logger import mcp_server_logger
+import tracing
+
+PROCESS_WORKERS = int(os.getenv("TOOL_PROCESS_WORKERS", str(os.cpu_count() or 2)))
+THREAD_WORKERS = int(os.getenv("TOOL_THREAD_WORKERS", "8"))
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tool_worker.py")
+
+_process_pool = None
+_thread_pool = None
+# Modules with cpu tools, a new worker imports them before it reports ready
+_cpu_modules = set()
+
+# Frames between the server and a worker: 4-byte big-endian length, then a pickle
+_HEADER = struct.Struct("!I")
+
+
+class WorkerProcess:
+    """One `python tool_worker.py` process, serving one call at a time over its stdin and stdout.
+    The worker imports only the module of each tool, never the server, and sends its log records back."""
+
+    def __init__(self, process):
+        self.process = process
+
+    @classmethod
+    async def start(cls):
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, WORKER_SCRIPT, *sorted(_cpu_modules),
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+            env=dict(os.environ, LOG_FORWARD="1"),
+        )
+        worker = cls(process)
+        try:
+            # The worker says hello once its imports are done, so a started worker is a warm one
+            await worker.receive()
+        except BaseException:
+            worker.kill()
+            raise
+        return worker
+
+    @property
+    def alive(self):
+        return self.process.returncode is None
+
+    async def send(self, message):
+        data = pickle.dumps(message)
+        self.process.stdin.write(_HEADER.pack(len(data)) + data)
+        await self.process.stdin.drain()
+
+    async def receive(self):
+        try:
+            header = await self.process.stdout.readexactly(_HEADER.size)
+            return pickle.loads(await self.process.stdout.readexactly(_HEADER.unpack(header)[0]))
+        except asyncio.IncompleteReadError:
+            # stdout closes as the worker exits, its exit code follows shortly
+            try:
+                await asyncio.wait_for(self.process.wait(), 1.0)
+            except asyncio.TimeoutError:
+                pass
+            raise RuntimeError(f"Tool worker {self.process.pid} exited with code {self.process.returncode}") from None
+
+    async def call(self, module, qualname, args, kwargs):
+        await self.send((module, qualname, args, kwargs))
+        return await self.receive()
+
+    def kill(self):
+        if self.alive:
+            self.process.kill()
+
+    async def close(self):
+        # End of input makes the worker exit by itself
+        if self.alive:
+            self.process.stdin.close()
+            try:
+                await asyncio.wait_for(self.process.wait(), 1.0)
+            except asyncio.TimeoutError:
+                self.kill()
+
+
+class WorkerPool:
+    """Up to size worker processes. The timeout starts once a call has its worker, so waiting for a free one
+    does not count. A timed out or cancelled call kills only its own worker, other calls keep running,
+    and a replacement is started in the background."""
+
+    def __init__(self, size):
+        self.size = size
+        self.slots = asyncio.Semaphore(size)
+        self.idle = []
+        self.background = set()
+
+    async def run(self, module, qualname, args, kwargs, timeout):
+        async with self.slots:
+            worker = await self._acquire()
+            try:
+                status, value, records = await asyncio.wait_for(worker.call(module, qualname, args, kwargs), timeout)
+            except BaseException:
+                # Mid-call the worker's state is unknown, it cannot serve another call
+                worker.kill()
+                self._replace()
+                raise
+            self._release(worker)
+        for record in records:
+            logging.getLogger(record.name).handle(record)
+        if status == "error":
+            raise value
+        return value
+
+    async def _acquire(self):
+        while self.idle:
+            worker = self.idle.pop()
+            if worker.alive:
+                return worker
+        return await WorkerProcess.start()
+
+    def _replace(self):
+        task = asyncio.ensure_future(self._prewarm())
+        self.background.add(task)
+        task.add_done_callback(self.background.discard)
+
+    async def _prewarm(self):
+        try:
+            worker = await WorkerProcess.start()
+        except Exception as e:
+            mcp_server_logger.info("Could not start a tool worker: %s", e)
+            return
+        self._release(worker)
+
+    def _release(self, worker):
+        # A warm replacement may have arrived while this worker was busy, keep at most size idle
+        if len(self.idle) < self.size:
+            self.idle.append(worker)
+        else:
+            worker.kill()
+
+    async def close(self):
+        for task in list(self.background):
+            task.cancel()
+        await asyncio.gather(*self.background, return_exceptions=True)
+        idle, self.idle = self.idle, []
+        await asyncio.gather(*(worker.close() for worker in idle), return_exceptions=True)
+
+
+def get_process_pool():
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = WorkerPool(PROCESS_WORKERS)
+    return _process_pool
+
+
+def get_thread_pool():
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(max_workers=THREAD_WORKERS, thread_name_prefix="tool-io")
+    return _thread_pool
+
+
+def offload(kind="cpu", timeout=30.0):
+    """Run a sync tool off the event loop: kind="cpu" in a worker process, kind="io" in a thread pool.
+    Put it below @mcp.tool() so FastMCP sees an async tool with the original signature.
+    Workers import the function's module by name, so cpu tools must live in a module without
+    import side effects (see cpu_tools.py)."""
+    if kind not in ("cpu", "io"):
+        raise ValueError("kind must be 'cpu' or 'io'")
+
+    def decorator(func):
+        name = func.__qualname__
+        if kind == "cpu" and func.__module__ == "__main__":
+            raise ValueError(f"{name}: cpu tools must be importable by the workers, not defined in __main__")
+        if kind == "cpu":
+            _cpu_modules.add(func.__module__)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with tracing.span(f"offload.{kind} {name}", tool=name):
+                try:
+                    if kind == "cpu":
+                        return await get_process_pool().run(func.__module__, name, args, kwargs, timeout)
+                    # Copy the context so spans started in the thread join the current trace
+                    context = contextvars.copy_context()
+                    future = asyncio.get_running_loop().run_in_executor(
+                        get_thread_pool(), functools.partial(context.run, func, *args, **kwargs))
+                    return await asyncio.wait_for(future, timeout)
+                except asyncio.TimeoutError:
+                    mcp_server_logger.info("Tool %s timed out after %ss", name, timeout)
+                    # The pool killed only this call's worker, a stuck thread cannot be killed
+                    # but the bounded thread pool keeps it from leaking more
+                    raise TimeoutError(f"{name} timed out after {timeout}s") from None
+
+        # The worker resolves the wrapper by name and runs the plain function behind it
+        wrapper.offload_target = func
+        wrapper.offload_kind = kind
+        wrapper.offload_timeout = timeout
+        return wrapper
+
+    return decorator
+
+
+async def shutdown():
+    """Stop the worker processes and the thread pool, called when the server stops"""
+    global _process_pool, _thread_pool
+    if _process_pool is not None:
+        pool, _process_pool = _process_pool, None
+        await pool.close()
+    if _thread_pool is not None:
+        _thread_pool.shutdown(wait=False, cancel_futures=True)
+        _thread_pool = None
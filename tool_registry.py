@@ -0,0 +1,184 @@
+import os
+import json
+import hashlib
+from logger import client_logger
+
+CACHE_DIR = os.path.join(".cache", "tool_registry")
+
+
+def tools_hash(tools):
+    """Stable hash of the server's tool list (names, descriptions and schemas)"""
+    payload = [
+        {"name": t.name, "description": t.description, "inputSchema": t.inputSchema}
+        for t in tools
+    ]
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def _type_name(param_info):
+    if 'type' in param_info:
+        return param_info['type']
+    if 'anyOf' in param_info:
+        return '|'.join(option.get('type', 'unknown') for option in param_info['anyOf'])
+    return 'unknown'
+
+
+def describe_tools(tools):
+    """Format the tool list for the system prompt"""
+    tools_description = []
+    for i, tool in enumerate(tools):
+        try:
+            params = tool.inputSchema
+            desc = getattr(tool, 'description', 'No description available')
+            name = getattr(tool, 'name', f'tool_{i}')
+
+            # Format the input schema in a more readable way
+            if 'properties' in params:
+                params_str = ', '.join(
+                    f"{param_name}: {_type_name(param_info)}"
+                    for param_name, param_info in params['properties'].items()
+                )
+            else:
+                params_str = 'no parameters'
+            tools_description.append(f"{i+1}. {name}({params_str}) - {desc}")
+        except Exception as e:
+            client_logger.info("Error processing tool %s: %s", i, e)
+            tools_description.append(f"{i+1}. Error processing tool")
+    return "\n".join(tools_description)
+
+
+def _parse_array(value, item_type):
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            value = [x.strip() for x in value.strip('[]').split(',') if x.strip()]
+            # Untyped arrays sent as "1, 2, 3" were always integer lists
+            item_type = item_type or 'integer'
+    if item_type:
+        return [_SCALARS[item_type](x) for x in value]
+    return list(value)
+
+
+def _to_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ("true", "1", "yes")
+    return bool(value)
+
+
+_SCALARS = {
+    'integer': int,
+    'number': float,
+    'string': str,
+    'boolean': _to_bool,
+}
+
+
+def _compile_param(param_info):
+    """Build the converter for one parameter from its JSON schema"""
+    param_type = param_info.get('type')
+    if param_type is None:
+        # Union types (anyOf) are sent as they are and validated by the server
+        return lambda value: value
+    if param_type == 'array':
+        item_type = param_info.get('items', {}).get('type')
+        if item_type not in _SCALARS:
+            item_type = None
+        return lambda value: _parse_array(value, item_type)
+    if param_type == 'object':
+        return lambda value: json.loads(value) if isinstance(value, str) else value
+    return _SCALARS.get(param_type, str)
+
+
+def compile_coercer(tool):
+    """Precompile one function that turns raw LLM params into call arguments"""
+    properties = tool.inputSchema.get('properties', {})
+    required = set(tool.inputSchema.get('required', []))
+    converters = [
+        (name, _compile_param(info), name in required)
+        for name, info in properties.items()
+    ]
+
+    def coerce(params):
+        params = params or {}
+        arguments = {}
+        for name, convert, is_required in converters:
+            if name not in params:
+                if is_required:
+                    raise ValueError(f"Missing parameter '{name}' for {tool.name}")
+                continue
+            arguments[name] = convert(params[name])
+        return arguments
+
+    return coerce
+
+
+class ToolRegistry:
+    """Name to tool lookup with precompiled argument coercers, built once per tool list"""
+
+    _registries = {}
+
+    def __init__(self, tools, digest=None):
+        self.digest = digest or tools_hash(tools)
+        self.tools = {t.name: t for t in tools}
+        self.coercers = {t.name: compile_coercer(t) for t in tools}
+        self.description = self._load_description(tools)
+
+    @classmethod
+    def for_tools(cls, tools):
+        """Registries are shared by every session that serves the same tool list"""
+        digest = tools_hash(tools)
+        if digest not in cls._registries:
+            cls._registries[digest] = cls(tools, digest)
+        return cls._registries[digest]
+
+    def _load_description(self, tools):
+        path = os.path.join(CACHE_DIR, f"{self.digest}.json")
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)["description"]
+        except (OSError, ValueError, KeyError):
+            pass
+        description = describe_tools(tools)
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"description": description}, f)
+        except OSError as e:
+            client_logger.info("Could not write tool cache %s: %s", path, e)
+        return description
+
+    def get(self, name):
+        tool = self.tools.get(name)
+        if tool is None:
+            raise ValueError(f"Unknown tool: {name}")
+        return tool
+
+    def coerce(self, name, params):
+        """Validate and convert params for a tool call"""
+        self.get(name)
+        return self.coercers[name](params)
+
+    def validate(self, name, params, placeholders=()):
+        """Check a planned call against the tool's input schema before running it.
+        Values for the names in placeholders are only known later, so only their presence is checked."""
+        schema = self.get(name).inputSchema
+        properties = schema.get('properties', {})
+        if not isinstance(params, dict):
+            raise ValueError(f"params for {name} must be an object")
+        unknown = sorted(set(params) - set(properties))
+        if unknown:
+            raise ValueError(f"Unknown parameter {', '.join(unknown)} for {name}")
+        for param in schema.get('required', []):
+            if param not in params:
+                raise ValueError(f"Missing parameter '{param}' for {name}")
+        for param, value in params.items():
+            if param in placeholders:
+                continue
+            try:
+                _compile_param(properties[param])(value)
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"Bad value for {name}.{param}: {e}") from None
+
+    def names(self):
+        return list(self.tools)
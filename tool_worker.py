@@ -0,0 +1,57 @@
+"""Worker process for @offload(kind="cpu") tools, started by tool_executor.WorkerPool.
+python tool_worker.py [module ...] imports the modules, then reads (module, qualname, args, kwargs) frames on stdin and answers (status, value, log records) on stdout."""
+import sys
+import pickle
+import struct
+import importlib
+
+_HEADER = struct.Struct("!I")
+
+
+def read_frame(stream):
+    header = stream.read(_HEADER.size)
+    if len(header) < _HEADER.size:
+        return None
+    return pickle.loads(stream.read(_HEADER.unpack(header)[0]))
+
+
+def write_frame(stream, message):
+    data = pickle.dumps(message)
+    stream.write(_HEADER.pack(len(data)) + data)
+    stream.flush()
+
+
+def resolve(module, qualname):
+    """The plain function behind the @offload wrapper named module.qualname"""
+    target = importlib.import_module(module)
+    for part in qualname.split("."):
+        target = getattr(target, part)
+    return getattr(target, "offload_target", target)
+
+
+def main():
+    requests, replies = sys.stdin.buffer, sys.stdout.buffer
+    # stdout carries the frames, a stray print in a tool must not corrupt them
+    sys.stdout = sys.stderr
+    import logger
+    for module in sys.argv[1:]:
+        importlib.import_module(module)
+    write_frame(replies, ("ready",))
+    while True:
+        request = read_frame(requests)
+        if request is None:
+            break
+        module, qualname, args, kwargs = request
+        try:
+            reply = ("ok", resolve(module, qualname)(*args, **kwargs))
+        except Exception as e:
+            reply = ("error", e)
+        records = logger.take_forwarded()
+        try:
+            write_frame(replies, reply + (records,))
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            write_frame(replies, ("error", RuntimeError(f"{qualname} returned an unpicklable result: {e}"), records))
+
+
+if __name__ == "__main__":
+    main()
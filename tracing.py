@@ -0,0 +1,245 @@
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Spans of every process go to one file as OTLP-JSON lines (one ExportTraceServiceRequest per line)
+TRACE_FILE = os.getenv("TRACE_FILE", os.path.join("logs", "traces.jsonl"))
+TRACING = os.getenv("TRACING", "1") == "1"
+SERVICE_NAME = os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0] or "python"
+
+SPAN_KINDS = {"internal": 1, "server": 2, "client": 3}
+
+_current = contextvars.ContextVar("current_span", default=None)
+_write_lock = threading.Lock()
+# Ended spans wait here for the writer thread, so the event loop never touches the file
+_pending = queue.SimpleQueue()
+_writer = None
+_writer_lock = threading.Lock()
+_flushed = False
+
+
+def _new_id(nbytes):
+    return os.urandom(nbytes).hex()
+
+
+def _attribute(key, value):
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class Span:
+    def __init__(self, name, trace_id, parent_id=None, kind="internal", attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+        self.token = None
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def traceparent(self):
+        """W3C traceparent header value, pass it to another process to continue the trace"""
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def end(self, error=None):
+        """error (or one set on the span before) marks it failed"""
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        self.error = error or self.error
+        if self.token is not None:
+            _current.reset(self.token)
+            self.token = None
+        if TRACING:
+            _enqueue(self)
+
+    def to_otlp(self):
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": SPAN_KINDS.get(self.kind, 1),
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_attribute(k, v) for k, v in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def parse_traceparent(value):
+    """(trace_id, parent span_id) from a traceparent string, or None if it is missing or malformed"""
+    parts = (value or "").split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return parts[1], parts[2]
+
+
+def start_span(name, parent=None, kind="internal", **attributes):
+    """Start a span under parent (a traceparent string) or the current span, and make it current.
+    Call span.end() in the same task or thread."""
+    remote = parse_traceparent(parent) if parent else None
+    if remote:
+        trace_id, parent_id = remote
+    else:
+        current = _current.get()
+        trace_id, parent_id = (current.trace_id, current.span_id) if current else (_new_id(16), None)
+    span = Span(name, trace_id, parent_id, kind, attributes)
+    span.token = _current.set(span)
+    return span
+
+
+@contextmanager
+def span(name, parent=None, kind="internal", **attributes):
+    current = start_span(name, parent, kind, **attributes)
+    try:
+        yield current
+    except BaseException as e:
+        current.end(error=f"{type(e).__name__}: {e}")
+        raise
+    current.end()
+
+
+def current_span():
+    return _current.get()
+
+
+def current_traceparent():
+    current = _current.get()
+    return current.traceparent() if current else None
+
+
+def export(spans):
+    line = json.dumps({
+        "resourceSpans": [{
+            "resource": {"attributes": [_attribute("service.name", SERVICE_NAME)]},
+            "scopeSpans": [{"scope": {"name": "tracing"}, "spans": [s.to_otlp() for s in spans]}],
+        }]
+    })
+    directory = os.path.dirname(TRACE_FILE)
+    with _write_lock:
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # One write per line on an O_APPEND file, so client and server can share it
+        fd = os.open(TRACE_FILE, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, (line + "\n").encode("utf-8"))
+        finally:
+            os.close(fd)
+
+
+def _enqueue(span):
+    global _writer
+    if _flushed:
+        # Spans ended by later exit handlers, no thread can start any more
+        export([span])
+        return
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = threading.Thread(target=_write_pending, name="trace-writer", daemon=True)
+                _writer.start()
+    _pending.put(span)
+
+
+def _write_pending():
+    # Everything queued since the last write goes out as one line
+    while True:
+        spans = [_pending.get()]
+        while True:
+            try:
+                spans.append(_pending.get_nowait())
+            except queue.Empty:
+                break
+        batch = [span for span in spans if span is not None]
+        if batch:
+            try:
+                export(batch)
+            except OSError as e:
+                sys.stderr.write(f"Could not write {len(batch)} spans to {TRACE_FILE}: {e}\n")
+        if len(batch) < len(spans):
+            return
+
+
+def flush():
+    """Write every queued span and stop the writer thread, called at exit"""
+    global _flushed
+    _flushed = True
+    if _writer is not None:
+        _pending.put(None)
+        _writer.join(timeout=5)
+
+
+atexit.register(flush)
+
+
+def load_spans(path):
+    """Flatten an OTLP-JSON lines file into a list of span dicts with a service key"""
+    spans = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            for resource_spans in json.loads(line)["resourceSpans"]:
+                service = next((a["value"]["stringValue"] for a in resource_spans["resource"]["attributes"]
+                                if a["key"] == "service.name"), "")
+                for scope in resource_spans["scopeSpans"]:
+                    for s in scope["spans"]:
+                        spans.append(dict(s, service=service))
+    return spans
+
+
+def waterfall(spans, trace_id=None, width=60):
+    """Text waterfall of one trace (the latest one by default)"""
+    if trace_id is None:
+        trace_id = max(spans, key=lambda s: int(s["startTimeUnixNano"]))["traceId"]
+    spans = [s for s in spans if s["traceId"] == trace_id]
+    start = min(int(s["startTimeUnixNano"]) for s in spans)
+    end = max(int(s["endTimeUnixNano"]) for s in spans)
+    scale = width / max(end - start, 1)
+    children = {}
+    for s in sorted(spans, key=lambda s: int(s["startTimeUnixNano"])):
+        children.setdefault(s.get("parentSpanId"), []).append(s)
+    known = {s["spanId"] for s in spans}
+    lines = [f"trace {trace_id} {(end - start) / 1e6:.1f} ms"]
+
+    def walk(s, depth):
+        s_start, s_end = int(s["startTimeUnixNano"]), int(s["endTimeUnixNano"])
+        offset = int((s_start - start) * scale)
+        bar = "#" * max(1, int((s_end - s_start) * scale))
+        label = f"{'  ' * depth}{s['name']} [{s['service']}]"
+        lines.append(f"{label[:45]:45} {(s_end - s_start) / 1e6:9.1f} ms |{' ' * offset}{bar}")
+        for child in children.get(s["spanId"], []):
+            walk(child, depth + 1)
+
+    # Roots are spans whose parent is not in the file (or have no parent)
+    for parent, group in children.items():
+        if parent is None or parent not in known:
+            for s in group:
+                walk(s, 0)
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    # python tracing.py [logs/traces.jsonl] [trace_id]
+    path = sys.argv[1] if len(sys.argv) > 1 else TRACE_FILE
+    print(waterfall(load_spans(path), sys.argv[2] if len(sys.argv) > 2 else None))
@@ -0,0 +1,79 @@
+import time
+import threading
+from collections import defaultdict
+from logger import mcp_server_logger
+import tracing
+
+# Upper bounds (seconds) of the timing histogram buckets
+BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0)
+
+_timings = defaultdict(list)
+_timings_lock = threading.Lock()
+
+
+class UIWaitTimeout(TimeoutError):
+    """A UI step did not reach the expected state in time"""
+
+
+def record_step(step, elapsed):
+    with _timings_lock:
+        _timings[step].append(elapsed)
+
+
+def wait_until(predicate, step, timeout=5.0, interval=0.01, backoff=1.5, max_interval=0.2):
+    """Poll predicate() until it is true, starting fast and backing off, and record how long it took"""
+    start = time.perf_counter()
+    deadline = start + timeout
+    polls = 0
+    with tracing.span(f"ui_wait {step}", step=step) as span:
+        while True:
+            polls += 1
+            try:
+                if predicate():
+                    break
+            except Exception as e:
+                # Windows may not exist yet while the app is starting
+                mcp_server_logger.debug("wait_until(%s) predicate failed: %s", step, e)
+            if time.perf_counter() >= deadline:
+                record_step(step, time.perf_counter() - start)
+                raise UIWaitTimeout(f"UI step '{step}' not ready after {timeout}s")
+            time.sleep(interval)
+            interval = min(interval * backoff, max_interval)
+        span.set("polls", polls)
+    elapsed = time.perf_counter() - start
+    record_step(step, elapsed)
+    return elapsed
+
+
+def pixels_changed(capture, before):
+    """Predicate that is true once capture() returns something different from before"""
+    return lambda: capture().tobytes() != before
+
+
+def step_histogram():
+    """Per step: count, total and max seconds, and how many waits fell in each bucket"""
+    with _timings_lock:
+        timings = {step: list(values) for step, values in _timings.items()}
+    histogram = {}
+    for step, values in timings.items():
+        buckets = {f"<={b}s": 0 for b in BUCKETS}
+        buckets["slower"] = 0
+        for value in values:
+            for b in BUCKETS:
+                if value <= b:
+                    buckets[f"<={b}s"] += 1
+                    break
+            else:
+                buckets["slower"] += 1
+        histogram[step] = {
+            "count": len(values),
+            "total": sum(values),
+            "max": max(values),
+            "buckets": buckets,
+        }
+    return histogram
+
+
+def reset_timings():
+    with _timings_lock:
+        _timings.clear()